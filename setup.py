@@ -26,7 +26,7 @@ setup(
     install_requires=[
         "docopt>=0.6.2",
         "ruamel.yaml>=0.16.0",
-        "gitpython>=3.1.0",
+        "gitpython>=3.1.30",
         "packaging>=21.3",
     ],
     python_requires=">=3.8",
@@ -18,6 +18,10 @@ Commands:
     fetch    Fetch one or all Git repos
     init     Initialize a new subgit repo
     pull     Update one or all Git repos
+    lock     Write the exact commit of one or all Git repos to a lock file
+    plan     Show what a pull would do w/o changing any repo
+    optimize Turn on git performance features and run maintenance in all repos
+    cache    Manage the shared object cache used by all workspaces
     status   Show status of each configured repo
     delete   Delete one or more local Git repos
     inspect  Listing repos from github or gitlab
@@ -32,10 +36,20 @@ Options:
 
 sub_fetch_args = """
 Usage:
-    subgit fetch [<repo> ...] [options]
+    subgit fetch [<repo> ...] [-g <name>]... [--label <label>]... [options]
 
 Options:
     -y, --yes                  Answers yes to all questions (use with caution)
+    -j <n>, --jobs <n>         Number of repos to fetch in parallel. Defaults to the 'jobs'
+                               key in the config file or 2 per CPU core, at least 8
+    --timeout <seconds>        Kill the fetch of a repo that takes longer than this. Defaults
+                               to the 'timeout' key in the config file or no timeout
+    --all-refs                 Fetch all branches and tags instead of only the refs needed
+                               by the revision of each repo
+    -g <name>, --group <name>  Only repos in this group, can be given more than once to
+                               select the repos in any of the groups
+    --label <label>            Only repos with this label, as 'key' or 'key=value'. Can be
+                               given more than once to select the repos with all labels
     -c <file>, --conf <file>   For using optional config file (use if conf file is
                                something other than '.subgit.yml' or '.sgit.yml')
     -h, --help                 Show this help message and exit
@@ -56,23 +70,132 @@ Options:
 
 sub_pull_args = """
 Usage:
-    subgit pull [<repo> ...] [options]
+    subgit pull [<repo> ...] [-g <name>]... [--label <label>]... [options]
 
 Options:
     <repo>       Name of repo to pull
     -y, --yes                  Answers yes to all questions (use with caution)
+    -j <n>, --jobs <n>         Number of repos to pull in parallel. Defaults to the 'jobs'
+                               key in the config file or 2 per CPU core, at least 8
+    --locked                   Pull the exact commits from the lock file instead of resolving
+                               the revisions in the config file
+    --no-skip                  Fetch and checkout all repos, even the repos where the remote
+                               has not changed since the last pull
+    --all-refs                 Fetch all branches and tags instead of only the refs needed
+                               by the revision of each repo
+    --remote-tags              Select tag revisions from the tags in the remote repo and only
+                               fetch the selected tag instead of cloning the whole repo
+    --no-cache                 Do not use the tag cache, select tags from a fresh listing
+                               of all tags in each repo
+    -g <name>, --group <name>  Only repos in this group, can be given more than once to
+                               select the repos in any of the groups
+    --label <label>            Only repos with this label, as 'key' or 'key=value'. Can be
+                               given more than once to select the repos with all labels
     -c <file>, --conf <file>   For using optional config file (use if conf file is
                                something other than '.subgit.yml' or '.sgit.yml')
     -h, --help                 Show this help message and exit
 """
 
 
+sub_lock_args = """
+Usage:
+    subgit lock [<repo> ...] [-g <name>]... [--label <label>]... [options]
+
+Options:
+    <repo>       Name of repo to lock
+    -y, --yes                  Answers yes to all questions (use with caution)
+    -j <n>, --jobs <n>         Number of repos to resolve in parallel. Defaults to the 'jobs'
+                               key in the config file or 2 per CPU core, at least 8
+    -g <name>, --group <name>  Only repos in this group, can be given more than once to
+                               select the repos in any of the groups
+    --label <label>            Only repos with this label, as 'key' or 'key=value'. Can be
+                               given more than once to select the repos with all labels
+    -c <file>, --conf <file>   For using optional config file (use if conf file is
+                               something other than '.subgit.yml' or '.sgit.yml')
+    -h, --help                 Show this help message and exit
+"""
+
+
+sub_plan_args = """
+Usage:
+    subgit plan [<repo> ...] [-g <name>]... [--label <label>]... [options]
+
+Options:
+    <repo>       Name of repo to plan
+    -y, --yes                  Answers yes to all questions (use with caution)
+    -j <n>, --jobs <n>         Number of repos to resolve in parallel. Defaults to the 'jobs'
+                               key in the config file or 2 per CPU core, at least 8
+    --format <format>          Output format, 'table' or 'json' [default: table]
+    -g <name>, --group <name>  Only repos in this group, can be given more than once to
+                               select the repos in any of the groups
+    --label <label>            Only repos with this label, as 'key' or 'key=value'. Can be
+                               given more than once to select the repos with all labels
+    -c <file>, --conf <file>   For using optional config file (use if conf file is
+                               something other than '.subgit.yml' or '.sgit.yml')
+    -h, --help                 Show this help message and exit
+"""
+
+
+sub_optimize_args = """
+Usage:
+    subgit optimize [<repo> ...] [-g <name>]... [--label <label>]... [options]
+
+Options:
+    <repo>       Name of repo to optimize
+    -y, --yes                  Answers yes to all questions (use with caution)
+    -j <n>, --jobs <n>         Number of repos to optimize in parallel. Defaults to the 'jobs'
+                               key in the config file or 2 per CPU core, at least 8
+    -g <name>, --group <name>  Only repos in this group, can be given more than once to
+                               select the repos in any of the groups
+    --label <label>            Only repos with this label, as 'key' or 'key=value'. Can be
+                               given more than once to select the repos with all labels
+    -c <file>, --conf <file>   For using optional config file (use if conf file is
+                               something other than '.subgit.yml' or '.sgit.yml')
+    -h, --help                 Show this help message and exit
+"""
+
+
+sub_cache_args = """
+Usage:
+    subgit cache update [<repo> ...] [-g <name>]... [--label <label>]... [options]
+
+Commands:
+    update     Create or update the mirror of each repo in the object cache
+
+Options:
+    <repo>       Name of repo to update the mirror for
+    -y, --yes                  Answers yes to all questions (use with caution)
+    -j <n>, --jobs <n>         Number of mirrors to update in parallel. Defaults to the 'jobs'
+                               key in the config file or 2 per CPU core, at least 8
+    -g <name>, --group <name>  Only repos in this group, can be given more than once to
+                               select the repos in any of the groups
+    --label <label>            Only repos with this label, as 'key' or 'key=value'. Can be
+                               given more than once to select the repos with all labels
+    -c <file>, --conf <file>   For using optional config file (use if conf file is
+                               something other than '.subgit.yml' or '.sgit.yml')
+    -h, --help                 Show this help message and exit
+
+Information:
+    The object cache is stored in SUBGIT_CACHE_DIR if set, otherwise in
+    ~/.cache/subgit/objects. Set 'object_cache: true' in the config file to
+    let new clones borrow objects from it.
+"""
+
+
 sub_status_args = """
 Usage:
-    subgit status [options]
+    subgit status [-g <name>]... [--label <label>]... [options]
 
 Options:
     -y, --yes                  Answers yes to all questions (use with caution)
+    -j <n>, --jobs <n>         Number of repos to read the status of in parallel. Defaults to
+                               the 'jobs' key in the config file or 2 per CPU core, at least 8
+    --format <format>          Output format, 'text' or 'jsonl' where jsonl prints one JSON
+                               object per repo as soon as it is read [default: text]
+    -g <name>, --group <name>  Only repos in this group, can be given more than once to
+                               select the repos in any of the groups
+    --label <label>            Only repos with this label, as 'key' or 'key=value'. Can be
+                               given more than once to select the repos with all labels
     -c <file>, --conf <file>   For using optional config file (use if conf file is
                                something other than '.subgit.yml' or '.sgit.yml')
     -h, --help                 Show this help message and exit
@@ -81,10 +204,18 @@ Options:
 
 sub_delete_args = """
 Usage:
-    subgit delete [<repo> ...] [options]
+    subgit delete [<repo> ...] [-g <name>]... [--label <label>]... [options]
 
 Options:
     -y, --yes                  Answers yes to all questions (use with caution)
+    -w, --wait                 Wait for the files of the repos to be removed, instead of
+                               removing them in the background
+    -j <n>, --jobs <n>         Number of repos to check and remove in parallel. Defaults to
+                               the 'jobs' key in the config file or 2 per CPU core, at least 8
+    -g <name>, --group <name>  Only repos in this group, can be given more than once to
+                               select the repos in any of the groups
+    --label <label>            Only repos with this label, as 'key' or 'key=value'. Can be
+                               given more than once to select the repos with all labels
     -c <file>, --conf <file>   For using optional config file (use if conf file is
                                something other than '.subgit.yml' or '.sgit.yml')
     -h, --help                 Show this help message and exit
@@ -93,7 +224,7 @@ Options:
 
 sub_reset_args = """
 Usage:
-    subgit reset [<repo> ...] [options]
+    subgit reset [<repo> ...] [-g <name>]... [--label <label>]... [options]
 
 Options:
     -y, --yes                  Answers yes to all questions (use with caution)
@@ -101,6 +232,10 @@ Options:
                                files in the working tree since <commit> are discarded.
                                Any untracked files or directories in the way of writing any
                                tracked files are simply deleted.
+    -g <name>, --group <name>  Only repos in this group, can be given more than once to
+                               select the repos in any of the groups
+    --label <label>            Only repos with this label, as 'key' or 'key=value'. Can be
+                               given more than once to select the repos with all labels
     -c <file>, --conf <file>   For using optional config file (use if conf file is
                                something other than '.subgit.yml' or '.sgit.yml')
     -h, --help                 Show this help message and exit
@@ -123,7 +258,7 @@ Information:
 
 sub_clean_args = """
 Usage:
-    subgit clean (-d|-f|-n)... [<repo> ...] [options]
+    subgit clean (-d|-f|-n)... [<repo> ...] [-g <name>]... [--label <label>]... [options]
 
 Options:
     -d                         Normally, when no <pathspec> is specified, git clean will not recurse
@@ -139,6 +274,11 @@ Options:
 
     -n, --dry-run              Don’t actually remove anything, just show what would be done.
 
+    -g <name>, --group <name>  Only repos in this group, can be given more than once to
+                               select the repos in any of the groups
+    --label <label>            Only repos with this label, as 'key' or 'key=value'. Can be
+                               given more than once to select the repos with all labels
+
     -c <file>, --conf <file>   For using optional config file (use if conf file is
                                something other than '.subgit.yml' or '.sgit.yml')
 
@@ -178,6 +318,14 @@ def parse_cli():
         sub_args = docopt(sub_init_args, argv=argv)
     elif cli_args["<command>"] == "pull":
         sub_args = docopt(sub_pull_args, argv=argv)
+    elif cli_args["<command>"] == "lock":
+        sub_args = docopt(sub_lock_args, argv=argv)
+    elif cli_args["<command>"] == "plan":
+        sub_args = docopt(sub_plan_args, argv=argv)
+    elif cli_args["<command>"] == "optimize":
+        sub_args = docopt(sub_optimize_args, argv=argv)
+    elif cli_args["<command>"] == "cache":
+        sub_args = docopt(sub_cache_args, argv=argv)
     elif cli_args["<command>"] == "status":
         sub_args = docopt(sub_status_args, argv=argv)
     elif cli_args["<command>"] == "delete":
@@ -204,6 +352,21 @@ def parse_cli():
     return (cli_args, sub_args)
 
 
+def get_repo_names(core, sub_args):
+    """
+    Returns the repo names a command should work on from the repo arguments and the group and label
+    selectors, or None for all repos
+    """
+    repos = sub_args.get("<repo>") or None
+    groups = sub_args.get("--group") or []
+    labels = sub_args.get("--label") or []
+
+    if not groups and not labels:
+        return repos
+
+    return core.select_repos(repos, groups, labels)
+
+
 def run(cli_args, sub_args):
     """
     Execute the CLI
@@ -224,11 +387,13 @@ def run(cli_args, sub_args):
     )
 
     if cli_args["<command>"] == "fetch":
-        repos = sub_args["<repo>"]
-        repos = repos or None
+        repos = get_repo_names(core, sub_args)
 
         retcode = core.fetch(
             repos,
+            all_refs=sub_args.get("--all-refs"),
+            jobs=sub_args.get("--jobs"),
+            timeout=sub_args.get("--timeout"),
         )
 
     if cli_args["<command>"] == "init":
@@ -241,25 +406,70 @@ def run(cli_args, sub_args):
         )
 
     if cli_args["<command>"] == "pull":
-        repos = sub_args["<repo>"]
-        repos = repos or None
+        repos = get_repo_names(core, sub_args)
 
-        retcode = core.pull(repos)
+        retcode = core.pull(
+            repos,
+            jobs=sub_args.get("--jobs"),
+            locked=sub_args.get("--locked"),
+            skip_unchanged=not sub_args.get("--no-skip"),
+            all_refs=sub_args.get("--all-refs"),
+            remote_tags=sub_args.get("--remote-tags"),
+            use_cache=not sub_args.get("--no-cache"),
+        )
+
+    if cli_args["<command>"] == "lock":
+        repos = get_repo_names(core, sub_args)
+
+        retcode = core.lock(
+            repos,
+            jobs=sub_args.get("--jobs"),
+        )
+
+    if cli_args["<command>"] == "plan":
+        repos = get_repo_names(core, sub_args)
+
+        retcode = core.plan(
+            repos,
+            jobs=sub_args.get("--jobs"),
+            output_format=sub_args.get("--format"),
+        )
+
+    if cli_args["<command>"] == "optimize":
+        repos = get_repo_names(core, sub_args)
+
+        retcode = core.optimize(
+            repos,
+            jobs=sub_args.get("--jobs"),
+        )
+
+    if cli_args["<command>"] == "cache":
+        repos = get_repo_names(core, sub_args)
+
+        if sub_args["update"]:
+            retcode = core.cache_update(
+                repos,
+                jobs=sub_args.get("--jobs"),
+            )
 
     if cli_args["<command>"] == "status":
-        retcode = core.repo_status()
+        retcode = core.repo_status(
+            jobs=sub_args.get("--jobs"),
+            output_format=sub_args.get("--format"),
+            names=get_repo_names(core, sub_args),
+        )
 
     if cli_args["<command>"] == "delete":
-        repos = sub_args["<repo>"]
-        repos = repos or None
+        repos = get_repo_names(core, sub_args)
 
         retcode = core.delete(
             repo_names=repos,
+            wait=sub_args.get("--wait"),
+            jobs=sub_args.get("--jobs"),
         )
 
     if cli_args["<command>"] == "reset":
-        repos = sub_args["<repo>"]
-        repos = repos or None
+        repos = get_repo_names(core, sub_args)
         hard_flag = sub_args.get("--hard")
 
         retcode = core.reset(
@@ -282,8 +492,7 @@ def run(cli_args, sub_args):
             retcode = git_inspect.inspect_gitlab(owner)
 
     if cli_args["<command>"] == "clean":
-        repos = sub_args["<repo>"]
-        repos = repos or None
+        repos = get_repo_names(core, sub_args)
 
         retcode = core.clean(
             repo_names=repos,
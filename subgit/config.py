@@ -0,0 +1,466 @@
+# -*- coding: utf-8 -*-
+
+# python std lib
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+# 3rd party imports
+from ruamel import yaml
+
+# The C based loader is much faster on big config files, but it is only there when ruamel.yaml
+# was installed together with its compiled libyaml bindings
+try:
+    from ruamel.yaml import CLoader as YamlLoader
+except ImportError:
+    from ruamel.yaml import Loader as YamlLoader
+
+# subgit imports
+from subgit.constants import *
+from subgit.exceptions import *
+
+log = logging.getLogger(__name__)
+
+
+def _validate_repos(repos, source):
+    """
+    Validates the repo list from a config file, and returns it as a dict with the repo name as key
+    """
+    if repos is None:
+        repos = []
+    elif not isinstance(repos, list):
+        raise SubGitConfigException(f"Key 'repos' in {source} must be a list")
+
+    repos_by_name = {}
+
+    for repo_data in repos:
+        if not isinstance(repo_data, dict) or not isinstance(repo_data.get("name", None), str):
+            raise SubGitConfigException(f"Each repo in {source} must be a mapping with a 'name' key, got: {repo_data}")
+
+        if repo_data["name"] in repos_by_name:
+            raise SubGitConfigException(f"Repo name '{repo_data['name']}' is used more than once in {source}")
+
+        if not isinstance(repo_data.get("revision", {}), dict):
+            raise SubGitConfigException(f"Key 'revision' on repo '{repo_data['name']}' must be a mapping")
+
+        groups = repo_data.get("groups", [])
+
+        if not isinstance(groups, list) or not all(isinstance(group, str) for group in groups):
+            raise SubGitConfigException(f"Key 'groups' on repo '{repo_data['name']}' must be a list of group names")
+
+        labels = repo_data.get("labels", {})
+
+        if not isinstance(labels, dict) or not all(
+            isinstance(key, str) and isinstance(value, (str, int, float, bool))
+            for key, value in labels.items()
+        ):
+            raise SubGitConfigException(f"Key 'labels' on repo '{repo_data['name']}' must be a mapping of label names and values")
+
+        repos_by_name[repo_data["name"]] = repo_data
+
+    return repos_by_name
+
+
+def _get_label_value(value):
+    """
+    Returns a label value as the string it is matched on, so that 'tier=1' on the cli matches
+    'tier: 1' in the config file
+    """
+    if isinstance(value, bool):
+        return "true" if value else "false"
+
+    return str(value)
+
+
+def _get_index_entry(repo_data):
+    """
+    Returns the part of a repo that is kept in the shard index, which is what is needed to select
+    repos w/o loading the shard
+    """
+    return {
+        "name": repo_data["name"],
+        "enable": bool(repo_data.get("enable", True)),
+        "url": repo_data.get("url", None),
+        "groups": list(repo_data.get("groups", [])),
+        "labels": {
+            key: _get_label_value(value)
+            for key, value in repo_data.get("labels", {}).items()
+        },
+    }
+
+
+def parse_label_selector(selector):
+    """
+    Parses a label selector from the cli into a tuple of (key, value). The selector 'key=value'
+    matches repos where the label has that value, and 'key' matches repos with the label set to
+    any value, which gives a value of None.
+    """
+    key, separator, value = selector.partition("=")
+    key = key.strip()
+
+    if not key:
+        raise SubGitConfigException(f"Invalid label selector '{selector}', must be 'key' or 'key=value'")
+
+    return key, value.strip() if separator else None
+
+
+class SubGitConfig(dict):
+    """
+    The content of a config file, validated once when it is loaded.
+
+    It works as the plain dict from the config file, and adds an index of the repos by name so
+    that a repo can be looked up w/o scanning the whole repo list:
+
+      repo_index: Dict with the repo name as key, in config file order, and the name, enable flag,
+        url, groups, labels and shard path of the repo as value. The shard path is None for repos
+        in the main file.
+      active_repos: List of the names of all enabled repos in config file order
+
+    Repos can also be selected by group and label through select, which only uses indexes built
+    from the repo index.
+
+    Repos in included config files, shards, is listed in the index from the start, but each shard
+    is only loaded the first time one of its repos is used. The 'repos' key of the dict only holds
+    the repos of the main config file until all shards is loaded through the repos property.
+    """
+
+    def __init__(self, data, shard_index=None, load_shard=None):
+        if data is None:
+            data = {}
+
+        if not isinstance(data, dict):
+            raise SubGitConfigException("Config file must be a mapping with a 'repos' key")
+
+        super().__init__(data)
+
+        self._repos_by_name = _validate_repos(self.get("repos", None), "config file")
+        self._load_shard = load_shard
+        self._loaded_shards = {}
+
+        self.repo_index = {
+            name: dict(_get_index_entry(repo_data), shard=None)
+            for name, repo_data in self._repos_by_name.items()
+        }
+
+        for shard_path, index_entries in (shard_index or {}).items():
+            for index_entry in index_entries:
+                if index_entry["name"] in self.repo_index:
+                    raise SubGitConfigException(f"Repo name '{index_entry['name']}' is used more than once in config file and {shard_path}")
+
+                self.repo_index[index_entry["name"]] = dict(index_entry, shard=shard_path)
+
+        self.active_repos = [
+            name
+            for name, index_entry in self.repo_index.items()
+            if index_entry["enable"]
+        ]
+        self._active_repo_names = set(self.active_repos)
+
+        # Indexes of the enabled repos by group name, and by label name and value
+        self._group_index = {}
+        self._label_index = {}
+        self._repo_order = {
+            name: position
+            for position, name in enumerate(self.repo_index)
+        }
+
+        for name in self.active_repos:
+            index_entry = self.repo_index[name]
+
+            for group in index_entry["groups"]:
+                self._group_index.setdefault(group, set()).add(name)
+
+            for key, value in index_entry["labels"].items():
+                self._label_index.setdefault(key, {}).setdefault(value, set()).add(name)
+
+    @property
+    def repos(self):
+        """
+        The list of all repos in config file order. This loads all shards.
+        """
+        repos = [
+            self.get_repo(name)
+            for name in self.repo_index
+        ]
+
+        if self._load_shard:
+            self["repos"] = repos
+
+        return repos
+
+    def is_active(self, name):
+        """
+        Returns True if a repo with the name exists and is enabled
+        """
+        return name in self._active_repo_names
+
+    def get_repo(self, name):
+        """
+        Returns the repo data for a repo name, or None if the name is not in the config file. Only
+        the shard that the repo is in is loaded.
+        """
+        index_entry = self.repo_index.get(name, None)
+
+        if index_entry is None:
+            return None
+
+        if index_entry["shard"] is None:
+            return self._repos_by_name[name]
+
+        shard_path = index_entry["shard"]
+
+        if shard_path not in self._loaded_shards:
+            log.debug(f"Loading config shard {shard_path}")
+            self._loaded_shards[shard_path] = _validate_repos(self._load_shard(shard_path), shard_path)
+
+        if name not in self._loaded_shards[shard_path]:
+            raise SubGitConfigException(f"Repo '{name}' is no longer in {shard_path}, the file was changed while it was used")
+
+        return self._loaded_shards[shard_path][name]
+
+    def select(self, names=None, groups=None, labels=None):
+        """
+        Returns the names of the enabled repos that matches the selectors, in config file order.
+
+        A repo matches when it is in any of the groups, and has all of the labels. labels is a list of
+        (key, value) tuples from parse_label_selector. If names is set only those repos is matched,
+        otherwise all enabled repos.
+        """
+        selected = set(self.active_repos) if names is None else set(names) & self._active_repo_names
+
+        if groups:
+            selected &= set().union(*(self._group_index.get(group, set()) for group in groups))
+
+        for key, value in labels or []:
+            label_values = self._label_index.get(key, {})
+
+            if value is None:
+                selected &= set().union(*label_values.values())
+            else:
+                selected &= label_values.get(value, set())
+
+        return sorted(selected, key=self._repo_order.__getitem__)
+
+    def get_repos(self, names):
+        """
+        Returns the repo data for each of the names, in config file order. Names that is not
+        in the config file is skipped.
+        """
+        names = set(names)
+
+        return [
+            self.get_repo(name)
+            for name in self.repo_index
+            if name in names
+        ]
+
+
+def _get_cache_file_path(cache_dir, file_path):
+    path_hash = hashlib.sha1(str(file_path).encode("utf-8")).hexdigest()[:16]  # nosec-B324
+
+    return cache_dir / f"{file_path.name}-{path_hash}.json"
+
+
+def _get_file_state(file_path):
+    """
+    Returns a tuple of (state, is_cacheable) for a file. The state is what a cache of the file is
+    keyed on. Files changed within the last CONFIG_CACHE_MIN_AGE seconds is never cached, as a
+    quick edit could keep both the size and the modification time.
+    """
+    stat = file_path.stat()
+    state = {
+        "version": CONFIG_CACHE_VERSION,
+        "path": str(file_path),
+        "mtime": stat.st_mtime_ns,
+        "size": stat.st_size,
+    }
+
+    return state, time.time() - stat.st_mtime_ns / 1e9 >= CONFIG_CACHE_MIN_AGE
+
+
+def _read_json(file_path):
+    try:
+        with file_path.open("r") as stream:
+            data = json.load(stream)
+    except (OSError, ValueError):
+        return None
+
+    return data if isinstance(data, dict) else None
+
+
+def _write_json(file_path, data):
+    """
+    Writes a cache file atomically. Caches is only an optimization so a failed write is ignored.
+    """
+    temp_path = file_path.with_name(f"{file_path.name}.{os.getpid()}.tmp")
+
+    try:
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path.write_text(json.dumps(data))
+        os.replace(temp_path, file_path)
+    except OSError as e:
+        log.debug(f"Unable to write config cache {file_path}: {e}")
+
+        try:
+            temp_path.unlink()
+        except OSError:
+            pass
+
+
+def _load_yaml(file_path, cache_dir):
+    """
+    Parses a YAML file through the parse cache in cache_dir. The cache is used as long as the
+    size and modification time of the file is the same.
+    """
+    state, is_cacheable = _get_file_state(file_path)
+    cache_file_path = _get_cache_file_path(cache_dir, file_path)
+    cache_data = _read_json(cache_file_path)
+
+    if cache_data and cache_data.get("key", None) == state:
+        log.debug(f"Using cached config from {cache_file_path}")
+        return cache_data["config"]
+
+    with file_path.open("r") as stream:
+        data = yaml.load(stream, Loader=YamlLoader)
+
+    if not is_cacheable:
+        return data
+
+    try:
+        cache_content = json.dumps(data)
+    except (TypeError, ValueError):
+        return data
+
+    # YAML values like dates or non string keys would not come back the same from JSON
+    if json.loads(cache_content) != data:
+        log.debug(f"Config file {file_path} can't be cached as JSON")
+        return data
+
+    _write_json(cache_file_path, {"key": state, "config": data})
+
+    return data
+
+
+def _get_include_paths(base_path, include):
+    """
+    Returns the list of config files from the 'include' key. Each item is a file, or a directory
+    where all .yml and .yaml files in it is included in name order. Relative paths is relative to
+    the folder of the main config file.
+    """
+    if include is None:
+        return []
+
+    if isinstance(include, str):
+        include = [include]
+
+    if not isinstance(include, list) or not all(isinstance(item, str) for item in include):
+        raise SubGitConfigException("Key 'include' in config file must be a path or a list of paths")
+
+    include_paths = []
+
+    for item in include:
+        path = (base_path / item).resolve()
+
+        if path.is_dir():
+            include_paths.extend(sorted(
+                file_path
+                for file_path in path.iterdir()
+                if file_path.suffix in (".yml", ".yaml") and file_path.is_file()
+            ))
+        elif path.is_file():
+            include_paths.append(path)
+        else:
+            raise SubGitConfigException(f"Included config file or directory '{item}' do not exist")
+
+    return include_paths
+
+
+def _load_shard(shard_path, cache_dir):
+    """
+    Loads the repos from an included config file. Shards can only contain repos.
+    """
+    data = _load_yaml(Path(shard_path), cache_dir)
+
+    if data is None:
+        return []
+
+    if not isinstance(data, dict) or set(data) - {"repos"}:
+        raise SubGitConfigException(f"Included config file {shard_path} must be a mapping with only a 'repos' key")
+
+    return data.get("repos", None)
+
+
+def _get_shard_index(shard_paths, cache_dir):
+    """
+    Returns the name to shard index, a dict with the shard path as key and the index entries of its
+    repos as value. The index is kept in CONFIG_INDEX_FILE_NAME in the cache dir, and only shards
+    that changed since the index was written is loaded to update it.
+    """
+    index_file_path = cache_dir / CONFIG_INDEX_FILE_NAME
+    index_data = _read_json(index_file_path) or {}
+    cached_shards = index_data.get("shards", {}) if index_data.get("version", None) == CONFIG_CACHE_VERSION else {}
+
+    shard_index = {}
+    index_shards = {}
+    has_changed = False
+
+    for shard_path in shard_paths:
+        state, is_cacheable = _get_file_state(shard_path)
+        cached_shard = cached_shards.get(str(shard_path), None)
+
+        if cached_shard and cached_shard.get("key", None) == state:
+            index_entries = cached_shard["repos"]
+        else:
+            index_entries = [
+                _get_index_entry(repo_data)
+                for repo_data in _validate_repos(_load_shard(shard_path, cache_dir), shard_path).values()
+            ]
+            has_changed = True
+
+        shard_index[str(shard_path)] = index_entries
+
+        if is_cacheable:
+            index_shards[str(shard_path)] = {"key": state, "repos": index_entries}
+
+    if has_changed or set(index_shards) != set(cached_shards):
+        _write_json(index_file_path, {"version": CONFIG_CACHE_VERSION, "shards": index_shards})
+
+    return shard_index
+
+
+def load_config(config_file_path):
+    """
+    Loads and validates a config file.
+
+    The parsed content of each config file is cached as JSON in CONFIG_CACHE_DIR_NAME next to the
+    main config file, so the YAML is only parsed again when a file changes. Repos in the files from
+    the 'include' key is only listed through the name to shard index when the config is loaded, and
+    each included file is loaded the first time one of its repos is used.
+
+    Returns a SubGitConfig object.
+    """
+    config_file_path = Path(config_file_path).resolve()
+    cache_dir = config_file_path.parent / CONFIG_CACHE_DIR_NAME
+
+    data = _load_yaml(config_file_path, cache_dir)
+    include = data.get("include", None) if isinstance(data, dict) else None
+    shard_paths = _get_include_paths(config_file_path.parent, include)
+
+    if not shard_paths:
+        return SubGitConfig(data)
+
+    return SubGitConfig(
+        data,
+        _get_shard_index(shard_paths, cache_dir),
+        lambda shard_path: _load_shard(shard_path, cache_dir),
+    )
+
+
+__all__ = [
+    "SubGitConfig",
+    "load_config",
+    "parse_label_selector",
+]
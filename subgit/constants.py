@@ -4,7 +4,90 @@ DEFAULT_REPO_DICT = {"repos": []}
 
 WORKER_COUNT = 8
 
+# Supported keys in the 'clone' block, both at top level and per repo in the config file
+CLONE_OPTIONS = ("depth", "single_branch", "filter", "dissociate")
+
+# Git config keys set by each option in the 'performance' block
+PERFORMANCE_GIT_CONFIG = {
+    "commit_graph": (("core", "commitGraph"), ("fetch", "writeCommitGraph")),
+    "multi_pack_index": (("core", "multiPackIndex"),),
+    "untracked_cache": (("core", "untrackedCache"),),
+    "fsmonitor": (("core", "fsmonitor"),),
+    "preload_index": (("core", "preloadIndex"),),
+    "checkout_workers": (("checkout", "workers"),),
+}
+
+# Supported keys in the 'performance' block, both at top level and per repo in the config file
+PERFORMANCE_OPTIONS = tuple(PERFORMANCE_GIT_CONFIG) + ("maintenance",)
+
+# Performance options used by 'subgit optimize' for anything not set in the config file. Options that
+# is false is not written to the git config of the repos. checkout_workers 0 means one worker per CPU core.
+DEFAULT_PERFORMANCE_OPTIONS = {
+    "commit_graph": True,
+    "multi_pack_index": True,
+    "untracked_cache": True,
+    "fsmonitor": False,
+    "preload_index": True,
+    "checkout_workers": 0,
+    "maintenance": True,
+}
+
+# Folder for the shared object cache, used when SUBGIT_CACHE_DIR is not set. It is relative to
+# XDG_CACHE_HOME, or ~/.cache if that is not set either.
+OBJECT_CACHE_DIR_NAME = "subgit/objects"
+
+# Git config set in every mirror in the object cache. Workspace repos borrows objects from the
+# mirrors, so git must never remove any objects from them, not even when they become unreachable.
+MIRROR_GIT_CONFIG = (
+    ("gc", "auto", 0),
+    ("gc", "pruneExpire", "never"),
+    ("maintenance", "auto", False),
+)
+
+# Parse cache of the config files, stored relative to the folder of the main config file. The cache
+# of a file is rebuilt when its size or modification time changes, or the cache version is bumped.
+# The index file maps each repo name to the included config file it is defined in.
+CONFIG_CACHE_DIR_NAME = ".subgit/config-cache"
+CONFIG_CACHE_VERSION = 2
+CONFIG_INDEX_FILE_NAME = "index.json"
+
+# Config files modified less than this many seconds ago is not cached, as an edit within the
+# resolution of the file system timestamps could keep both size and modification time the same
+CONFIG_CACHE_MIN_AGE = 2
+
+# Folder in the workspace with the shared object databases for repo urls that is used by more
+# than one repo in the config file. Each repo is checked out as a git worktree from it.
+SHARED_STORE_DIR_NAME = ".subgit/repos"
+
+# Folder in the workspace that deleted repos is moved to before their files is removed. It is on
+# the same file system as the repos so the move is an atomic rename.
+TRASH_DIR_NAME = ".subgit/trash"
+
+# Max number of unique tag names to keep parsed PEP440 versions for in memory
+VERSION_CACHE_SIZE = 131072
+
+# Max number of tag configs to keep the resolved tag for in the tag cache of each repo
+TAG_CACHE_SIZE = 32
+
+# Name of the tag cache file, stored inside the .git folder of each repo
+TAG_CACHE_FILE_NAME = "subgit-tag-cache.json"
+
 __all__ = [
+    "CLONE_OPTIONS",
+    "CONFIG_CACHE_DIR_NAME",
+    "CONFIG_CACHE_MIN_AGE",
+    "CONFIG_CACHE_VERSION",
+    "CONFIG_INDEX_FILE_NAME",
+    "DEFAULT_PERFORMANCE_OPTIONS",
     "DEFAULT_REPO_DICT",
-    "WORKER_COUNT"
+    "MIRROR_GIT_CONFIG",
+    "OBJECT_CACHE_DIR_NAME",
+    "PERFORMANCE_GIT_CONFIG",
+    "PERFORMANCE_OPTIONS",
+    "SHARED_STORE_DIR_NAME",
+    "TAG_CACHE_FILE_NAME",
+    "TAG_CACHE_SIZE",
+    "TRASH_DIR_NAME",
+    "VERSION_CACHE_SIZE",
+    "WORKER_COUNT",
 ]
@@ -1,14 +1,22 @@
 # -*- coding: utf-8 -*-
 
 # python std lib
+import hashlib
+import json
 import logging
 import os
 import re
 import shutil
 import sys
-from multiprocessing import Pool
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from itertools import islice
 from pathlib import Path
-from subprocess import PIPE, Popen  # nosec-B404
+from subprocess import DEVNULL, PIPE, Popen  # nosec-B404
 
 # 3rd party imports
 import git
@@ -19,9 +27,12 @@ from packaging.specifiers import SpecifierSet
 from ruamel import yaml
 
 # subgit imports
+from subgit.config import *
 from subgit.constants import *
 from subgit.enums import *
 from subgit.exceptions import *
+from subgit.query import *
+from subgit.remote import *
 
 log = logging.getLogger(__name__)
 
@@ -38,11 +49,68 @@ def run_cmd(cli_command):
     return output, stderr
 
 
+def run_parallel(func, items, worker_count):
+    """
+    Runs func(item) for each item in a bounded pool of worker threads.
+
+    All the heavy lifting is done by git subprocesses so threads is enough to keep all of
+    them busy at the same time.
+
+    Returns a list of (item, result, exception) tuples in the same order as the input items,
+    regardless of the order the work completed in. If func raised for an item, result is None
+    and the exception is returned instead of being raised.
+    """
+    return list(iter_parallel(func, items, worker_count))
+
+
+def iter_parallel(func, items, worker_count, ordered=True):
+    """
+    Runs func(item) for each item in a bounded pool of worker threads, and yields a
+    (item, result, exception) tuple for each item as soon as it is done.
+
+    With ordered=True the tuples is yielded in the same order as the input items, otherwise in
+    the order the work completed in. Items is taken from the input lazily and at most twice the
+    worker count is pending at any time, so memory use stays flat no matter how many items there is.
+    """
+    worker_count = max(1, worker_count)
+    items = iter(items)
+    pending = deque()
+
+    with ThreadPoolExecutor(max_workers=worker_count) as executor:
+        for item in islice(items, worker_count * 2):
+            pending.append((item, executor.submit(func, item)))
+
+        while pending:
+            if ordered:
+                item, future = pending.popleft()
+            else:
+                done, _ = wait([future for _, future in pending], return_when=FIRST_COMPLETED)
+                index = next(
+                    index
+                    for index, (_, future) in enumerate(pending)
+                    if future in done
+                )
+                item, future = pending[index]
+                del pending[index]
+
+            # Keep the pool busy while the caller handles the result
+            for next_item in islice(items, 1):
+                pending.append((next_item, executor.submit(func, next_item)))
+
+            exception = future.exception()
+
+            yield item, None if exception else future.result(), exception
+
+
 class SubGit():
     def __init__(self, config_file_path=None, answer_yes=False):
         self.answer_yes = answer_yes
         self.config_file_path = config_file_path
 
+        # One lock per git object database, used to serialize fetches into repos shared by worktrees
+        self._repo_locks = {}
+        self._repo_locks_lock = threading.Lock()
+
         if config_file_path:
             self.subgit_config_file_name = Path(config_file_path).name
             self.subgit_config_file_path = Path(config_file_path).resolve()
@@ -63,577 +131,2611 @@ class SubGit():
                 self.subgit_config_file_name = ".sgit.yml"
                 self.subgit_config_file_path = path / self.subgit_config_file_name
 
-                if self.subgit_config_file_path.exists():
-                    log.warning("WARNING: using filename .sgit.yml will be deprecated in the future. Please convert it to .subgit.yml")
-                    break
+                if self.subgit_config_file_path.exists():
+                    log.warning("WARNING: using filename .sgit.yml will be deprecated in the future. Please convert it to .subgit.yml")
+                    break
+
+                # If old file do not exists then try the new filename
+                self.subgit_config_file_name = ".subgit.yml"
+                self.subgit_config_file_path = path / self.subgit_config_file_name
+
+                if self.subgit_config_file_path.exists():
+                    break
+
+                # If we reach root folder then we should abort out
+                if path == Path("/"):
+                    log.critical("Unable to find a config file in any directory...")
+                    sys.exit(1)
+
+                path = path.parent.absolute()
+                os.chdir(path)
+                log.debug(f"Next iteration... Updated cwd path to {path}")
+
+            log.info(f"Found config file...{self.subgit_config_file_path}")
+            log.debug(self.subgit_config_file_name)
+            log.debug(self.subgit_config_file_path)
+        else:
+            self.subgit_config_file_name = Path(self.config_file_path).name
+            self.subgit_config_file_path = Path(self.config_file_path).resolve()
+
+    def init_repo(self, repo_name=None, repo_url=None):
+        """
+        If repo_name & repo_url is set to a string value, it will be attempted to be added to the initial
+        .subgit.yml config file as the first repo in your config. If these values is anything else the initial
+        config vill we written as empty.
+        """
+
+        if self.subgit_config_file_path.exists():
+            log.error(f"File '{self.subgit_config_file_name}' already exists on disk")
+            return 1
+
+        tmp_config = DEFAULT_REPO_DICT
+
+        if isinstance(repo_name, str) and isinstance(repo_url, str):
+            log.info(f"Adding initial git repo '{repo_name}' with url '{repo_url}' to your config")
+            tmp_config["repos"].append({
+                "name": repo_name,
+                "url": repo_url,
+                "revision": {"branch": "master"}
+            })
+
+        self._dump_config_file(tmp_config)
+        log.info(f'Successfully wrote new config file "{self.subgit_config_file_name}" to disk')
+
+    def _get_config_file(self):
+        """
+        Returns the config file as a validated SubGitConfig object, with the repos indexed by name
+        """
+        if not self.subgit_config_file_path.exists():
+            log.error(f"No {self.subgit_config_file_path} file exists in current CWD")
+            sys.exit(1)
+
+        return load_config(self.subgit_config_file_path)
+
+    def _dump_config_file(self, config_data):
+        """
+        Writes the entire config file to the given disk path set
+        in the method constructor.
+        """
+        with open(self.subgit_config_file_path, "w") as stream:
+            yaml.dump(
+                config_data,
+                stream,
+                indent=2,
+                default_flow_style=False,
+            )
+
+    def _get_lock_file_path(self):
+        """
+        The lock file is stored next to the config file with the same name but with a .lock suffix
+        """
+        return self.subgit_config_file_path.with_suffix(".lock")
+
+    def _get_lock_file(self):
+        """
+        Returns the content of the lock file, or an empty lock if no lock file exists on disk
+        """
+        lock_file_path = self._get_lock_file_path()
+
+        if not lock_file_path.exists():
+            return {"repos": []}
+
+        with open(lock_file_path, "r") as stream:
+            lock_data = yaml.load(
+                stream,
+                Loader=yaml.Loader,
+            )
+
+        if not isinstance(lock_data, dict) or not isinstance(lock_data.get("repos", None), list):
+            raise SubGitConfigException(f"Lock file {lock_file_path} is not valid, remove it and run 'subgit lock' again")
+
+        return lock_data
+
+    def _dump_lock_file(self, lock_data):
+        """
+        Writes the entire lock file to disk next to the config file
+        """
+        with open(self._get_lock_file_path(), "w") as stream:
+            yaml.dump(
+                lock_data,
+                stream,
+                indent=2,
+                default_flow_style=False,
+            )
+
+    def repo_status(self, jobs=None, output_format="text", names=None):
+        """
+        Prints the status of each repo in the config file, or only the repos in names if it is set.
+
+        The status of all repos is collected in parallel, with a single git status and a single
+        git for-each-ref call per repo.
+
+        output_format can be:
+
+          text: Human readable status in the same order as the config file
+          jsonl: One JSON object per line and repo, printed as soon as the status of each repo is read
+        """
+        if output_format not in ("text", "jsonl"):
+            raise SubGitConfigException(f"Unsupported output format '{output_format}', must be 'text' or 'jsonl'")
+
+        self._get_recursive_config_path()
+        config = self._get_config_file()
+
+        if not config.repo_index:
+            print("  No repos found")
+            return 1
+
+        for repo_status in self.iter_repo_status(jobs=jobs, ordered=output_format == "text", names=names):
+            if output_format == "jsonl":
+                print(json.dumps(repo_status), flush=True)
+            elif repo_status["error"]:
+                print(f"{repo_status['name']}")
+                print(f"  Unable to read status: {repo_status['error']}")
+                print("")
+            else:
+                self._print_repo_status(repo_status)
+
+        return 0
+
+    def iter_repo_status(self, jobs=None, ordered=True, names=None):
+        """
+        Generator that reads the status of all repos in the config file, or only the repos in names
+        if it is set, in parallel and yields one status dict per repo. See _get_repo_status for the
+        content of each dict.
+
+        With ordered=True the status is yielded in the same order as the config file, otherwise
+        each status is yielded as soon as it is read. Only a small window of repos is read ahead
+        of the caller, so memory use does not grow with the number of repos.
+        """
+        config = self._get_config_file()
+        repos = config.repos if names is None else config.get_repos(names)
+
+        for repo_data, repo_status, exception in iter_parallel(self._get_repo_status, repos, self._get_worker_count(config, jobs, len(repos)), ordered):
+            if exception:
+                repo_status = {
+                    "name": repo_data["name"],
+                    "error": str(exception),
+                }
+
+            yield repo_status
+
+    def _get_repo_status(self, repo_data):
+        """
+        Collects the status of a single repo w/o building any GitPython objects. The working tree and
+        HEAD is read with one 'git status --porcelain=v2 --branch' call, and the refs of the configured
+        branch and tag with one 'git for-each-ref' call.
+
+        Returns a dict with the status of the repo:
+
+          cloned: If the repo exists on disk
+          last_fetch: Time of the last fetch or pull as an ISO 8601 string, or None
+          dirty: If the repo has uncommited changes to tracked files
+          head: The commit sha of HEAD
+          head_branch: The checked out branch, or None if HEAD is detached
+          upstream, ahead, behind: The upstream of the checked out branch and the number of commits
+            HEAD is ahead and behind of it
+          branch, commit, tag: The revision from the config file
+          branch_ahead, branch_behind: The number of commits the local configured branch, or HEAD in
+            worktrees, is ahead and behind of origin/<branch>, or None if any of them is missing
+          refs: The sha and commit summary of the local and origin refs for the configured branch and tag
+          error: Always None, it is set by iter_repo_status if the status could not be read
+        """
+        name = repo_data["name"]
+        repo_path = Path().cwd() / name
+        revision = repo_data.get("revision", {})
+
+        tag = revision.get("tag", None)
+
+        # Extract tag from inner value if that is set
+        #  {revision: {tag: {select: {value: foo}}}}
+        if isinstance(tag, dict):
+            tag = tag.get("select", None)
+
+            if isinstance(tag, dict):
+                tag = tag.get("value", None)
+
+        repo_status = {
+            "name": name,
+            "url": repo_data.get("url", None),
+            "path": str(repo_path),
+            "cloned": False,
+            "last_fetch": None,
+            "dirty": None,
+            "head": None,
+            "head_branch": None,
+            "upstream": None,
+            "ahead": None,
+            "behind": None,
+            "branch": revision.get("branch", None),
+            "commit": revision.get("commit", None),
+            "tag": tag,
+            "refs": {},
+            "branch_ahead": None,
+            "branch_behind": None,
+            "error": None,
+        }
+
+        if not (repo_path / ".git").exists():
+            return repo_status
+
+        repo_status["cloned"] = True
+        repo_status["dirty"] = False
+
+        fetch_times = []
+
+        # Worktrees from a shared object database has a FETCH_HEAD of their own and one in the shared database
+        for git_dir in self._get_git_dirs(repo_path):
+            try:
+                fetch_times.append(os.stat(git_dir / "FETCH_HEAD").st_mtime)
+            except OSError:
+                pass
+
+        if fetch_times:
+            repo_status["last_fetch"] = datetime.fromtimestamp(max(fetch_times)).astimezone().isoformat(sep=" ", timespec="seconds")
+
+        g = Git(repo_path)
+
+        for line in g.status("--porcelain=v2", "--branch", "--untracked-files=no").splitlines():
+            if line.startswith("# branch.oid "):
+                head = line[len("# branch.oid "):]
+                repo_status["head"] = None if head == "(initial)" else head
+            elif line.startswith("# branch.head "):
+                head_branch = line[len("# branch.head "):]
+                repo_status["head_branch"] = None if head_branch == "(detached)" else head_branch
+            elif line.startswith("# branch.upstream "):
+                repo_status["upstream"] = line[len("# branch.upstream "):]
+            elif line.startswith("# branch.ab "):
+                ahead, behind = line[len("# branch.ab "):].split(" ")
+                repo_status["ahead"] = int(ahead)
+                repo_status["behind"] = -int(behind)
+            elif not line.startswith("#"):
+                repo_status["dirty"] = True
+
+        ref_patterns = []
+
+        if repo_status["branch"]:
+            ref_patterns.extend([f"refs/heads/{repo_status['branch']}", f"refs/remotes/origin/{repo_status['branch']}"])
+
+        if tag:
+            ref_patterns.append(f"refs/tags/{tag}")
+
+        if ref_patterns:
+            output = g.for_each_ref(
+                "--format=%(refname)%00%(objectname)%00%(*objectname)%00%(subject)%00%(*subject)",
+                *ref_patterns,
+            )
+
+            for line in output.splitlines():
+                ref_name, sha, peeled_sha, subject, peeled_subject = line.split("\0")
+
+                # Annotated tags points to a tag object, use the commit it points to
+                repo_status["refs"][ref_name] = {
+                    "sha": peeled_sha or sha,
+                    "summary": peeled_subject if peeled_sha else subject,
+                }
+
+        local_ref = repo_status["refs"].get(f"refs/heads/{repo_status['branch']}", None)
+
+        # Worktrees can follow the branch with a detached HEAD, the local branch is shared by all worktrees
+        if (repo_path / ".git").is_file() and repo_status["head"]:
+            local_ref = {"sha": repo_status["head"]}
+
+        origin_ref = repo_status["refs"].get(f"refs/remotes/origin/{repo_status['branch']}", None)
+
+        if local_ref and origin_ref:
+            if local_ref["sha"] == origin_ref["sha"]:
+                repo_status["branch_ahead"], repo_status["branch_behind"] = 0, 0
+            else:
+                # Both sides is counted in a single walk, that git speeds up with the commit-graph file when present
+                counts = g.rev_list("--left-right", "--count", f"{local_ref['sha']}...{origin_ref['sha']}")
+                repo_status["branch_ahead"], repo_status["branch_behind"] = (int(count) for count in counts.split())
+
+        return repo_status
+
+    def _get_git_dirs(self, repo_path):
+        """
+        Returns the git folders of a repo w/o starting git. A regular repo has only the .git folder,
+        while a worktree has its own git folder and the common git folder of the shared object database.
+        """
+        dot_git_path = repo_path / ".git"
+
+        if not dot_git_path.is_file():
+            return [dot_git_path]
+
+        git_dirs = []
+
+        for line in dot_git_path.read_text().splitlines():
+            if line.startswith("gitdir: "):
+                git_dirs.append((repo_path / line[len("gitdir: "):].strip()).resolve())
+
+        if git_dirs and (git_dirs[0] / "commondir").exists():
+            common_dir = (git_dirs[0] / "commondir").read_text().strip()
+            git_dirs.append((git_dirs[0] / common_dir).resolve())
+
+        return git_dirs
+
+    def _print_repo_status(self, repo_status):
+        """
+        Prints the status of a single repo from _get_repo_status
+        """
+        cloned_to_disk = repo_status["cloned"]
+        refs = repo_status["refs"]
+
+        print(f"{repo_status['name']}")
+        print(f"  Url: {repo_status['url'] or 'NOT SET'}")
+        print(f"  Disk path: {repo_status['path']}")
+        print(f"  Cloned: {'Yes' if cloned_to_disk else 'No'}")
+
+        if not cloned_to_disk:
+            print("  Last pull/fetch: UNKNOWN repo not cloned to disk")
+        elif repo_status["last_fetch"]:
+            print(f"  Last pull/fetch: {repo_status['last_fetch']}")
+        else:
+            print("  Last pull/fetch: Repo has not been pulled or fetch since initial clone")
+
+        if cloned_to_disk:
+            print(f"  Repo is dirty? {'Yes' if repo_status['dirty'] else 'No'}")
+        else:
+            print("  Repo is dirty? ---")
+
+        branch = repo_status["branch"] or "---"
+        commit = repo_status["commit"] or "---"
+        tag = repo_status["tag"] or "---"
+
+        print("  Revision:")
+
+        print(f"    branch: {branch}")
+        if branch != "---":
+            local_ref = refs.get(f"refs/heads/{branch}", None)
+            origin_ref = refs.get(f"refs/remotes/origin/{branch}", None)
+
+            if not cloned_to_disk:
+                commit_hash = "Repo not cloned to disk"
+                commit_message = "Repo not cloned to disk"
+                has_new = "Repo not cloned to disk"
+                is_in_origin = "Repo not cloned to disk"
+            elif local_ref:
+                commit_hash = local_ref["sha"]
+                commit_message = local_ref["summary"]
+                has_new = "---" if origin_ref is None else repo_status["branch_behind"] > 0
+                is_in_origin = f"{origin_ref is not None}"
+            else:
+                commit_hash = "Local branch not found"
+                commit_message = "Local branch not found"
+                has_new = "---"
+                is_in_origin = "Local branch not found"
+
+            print(f"      commit hash: {commit_hash}")
+            print(f"      commit message: '{commit_message}'")
+            print(f"      branch exists in origin? {is_in_origin}")
+            print(f"      has newer commit in origin? {has_new}")
+
+            if repo_status["branch_ahead"] is not None:
+                print(f"      commits ahead/behind origin: {repo_status['branch_ahead']}/{repo_status['branch_behind']}")
+
+        print(f"    commit: {commit}")
+        if commit != "---":
+            if cloned_to_disk:
+                at_commit = "Yes" if (repo_status["head"] or "").startswith(str(commit)) else "No"
+            else:
+                at_commit = "Repo not cloned to disk"
+
+            print(f"      HEAD at commit? {at_commit}")
+
+        print(f"    tag: {tag}")
+
+        if tag != "---":
+            tag_ref = refs.get(f"refs/tags/{tag}", None)
+
+            if not cloned_to_disk:
+                commit_hash = "Repo not cloned to disk"
+                commit_summary = "Repo not cloned to disk"
+            elif tag_ref:
+                commit_hash = tag_ref["sha"]
+                commit_summary = tag_ref["summary"]
+            else:
+                commit_hash = "Tag not found"
+                commit_summary = "---"
+
+            print(f"      commit hash: {commit_hash}")
+            print(f"      commit message: '{commit_summary}'")
+
+        print("")
+
+    def yes_no(self, question):
+        print(question)
+
+        if self.answer_yes:
+            log.info("--yes flag set, automatically answer yes to question")
+            return True
+
+        answer = input("(y/n) << ")
+
+        return answer.lower().startswith("y")
+
+    def select_repos(self, names=None, groups=None, labels=None):
+        """
+        Returns the names of all enabled repos that is in any of the groups and has all of the labels,
+        in config file order. Each label is a string, 'key=value' to match a label value or 'key' to
+        match any value. If names is set only those repos is matched.
+
+        The selection is made from the repo index of the config file, so no included config file
+        is loaded and no repo on disk is touched.
+        """
+        self._get_recursive_config_path()
+
+        config = self._get_config_file()
+        label_selectors = [
+            parse_label_selector(label)
+            for label in labels or []
+        ]
+
+        selected_repos = config.select(names, groups, label_selectors)
+
+        if not selected_repos:
+            raise SubGitConfigException(f"No enabled repos matches the groups {groups or []} and labels {labels or []}")
+
+        log.debug(f"Selected repos {selected_repos}")
+
+        return selected_repos
+
+    def fetch(self, repos, all_refs=False, jobs=None, timeout=None):
+        """
+        Runs "git fetch" on one or more git repos.
+
+        To fetch all enabled repos send in None as value.
+
+        To fetch a subset of repo names, send in them as a list of strings.
+
+        A empty list of items will not fetch any repo.
+
+        By default only the refs needed by the revision of each repo is fetched. Set all_refs=True
+        to fetch all branches and tags from the remote.
+
+        The repos is fetched in parallel by a pool of jobs threads. A fetch that takes longer than
+        timeout seconds is killed and counted as failed. Returns 1 if any repo failed to fetch.
+        """
+        self._get_recursive_config_path()
+
+        log.debug(f"repo fetch input - {repos}")
+
+        config = self._get_config_file()
+
+        repos_to_fetch = []
+
+        if repos is None:
+            repos_to_fetch = config.repos
+
+        if isinstance(repos, list):
+            for repo_name in repos:
+                if repo_name in config.repo_index:
+                    repos_to_fetch.append(config.get_repo(repo_name))
+                else:
+                    log.warning(f"repo '{repo_name}' not found in configuration")
+
+        log.info(f"repos to fetch: {[repo_data['name'] for repo_data in repos_to_fetch]}")
+
+        if len(repos_to_fetch) == 0:
+            log.error("No repos to fetch found")
+            return 1
+
+        missing_any_repo = False
+
+        for repo_data in repos_to_fetch:
+            repo_name = repo_data["name"]
+
+            try:
+                repo_path = Path().cwd() / repo_name
+                Repo(repo_path)
+            except git.exc.NoSuchPathError:
+                log.error(f"Repo {repo_name} not found on disk. You must pull to do a initial clone before fetching can be done")
+                missing_any_repo = True
+
+        if missing_any_repo:
+            return 1
+
+        clone_options = {
+            repo_data["name"]: self._get_clone_options(config, repo_data)
+            for repo_data in repos_to_fetch
+        }
+        timeout = self._get_timeout(config, timeout)
+        worker_count = self._get_worker_count(config, jobs, len(repos_to_fetch))
+
+        def fetch_func(repo_data):
+            return self.fetch_repo(repo_data, clone_options[repo_data["name"]], all_refs, timeout)
+
+        log.info(f"Fetching {len(repos_to_fetch)} repos using {worker_count} parallel jobs")
+
+        failed_repos = []
+
+        log.info("Fetch summary:")
+
+        with self._ssh_multiplexing(config):
+            results = self._run_remote_parallel(config, fetch_func, repos_to_fetch, worker_count)
+
+        for repo_data, fetch_results, exception in results:
+            if exception:
+                failed_repos.append(repo_data["name"])
+                log.error(f" - {repo_data['name']}: FAILED, {exception}")
+                continue
+
+            log.info(f" - {repo_data['name']}: {len(fetch_results)} refs fetched")
+
+            for fetch_result in fetch_results:
+                log.debug(f"   - Fetch result: {fetch_result.name}")
+
+        if failed_repos:
+            log.error(f"Failed to fetch {len(failed_repos)} of {len(repos_to_fetch)} repos: {', '.join(failed_repos)}")
+            return 1
+
+        log.info("Fetching for all repos completed")
+        return 0
+
+    def fetch_repo(self, repo_data, clone_options=None, all_refs=False, timeout=None):
+        """
+        Fetches a single repo from origin. The git fetch is killed if it takes longer than timeout seconds.
+
+        Returns the list of FetchInfo objects from GitPython.
+        """
+        repo_name = repo_data["name"]
+        repo_path = Path().cwd() / repo_name
+        git_repo = Repo(repo_path)
+
+        refspec, fetch_kwargs = self._get_fetch_args(repo_data.get("revision", {}), clone_options or {}, all_refs)
+
+        log.debug(f"Fetching git repo '{repo_name}'")
+
+        try:
+            # Repos that share an object database fetches one at a time
+            with self._get_repo_lock(git_repo):
+                fetch_results = git_repo.remotes.origin.fetch(refspec, kill_after_timeout=timeout, **fetch_kwargs)
+        except git.exc.GitCommandError as e:
+            if timeout and "timed out" in str(e.stderr):
+                raise SubGitRepoException(f"Fetch timed out after {timeout} seconds") from e
+
+            raise
+
+        log.debug(f"Fetching completed for repo '{repo_name}'")
+
+        return fetch_results
+
+    def _get_timeout(self, config, timeout=None):
+        """
+        Returns the timeout in seconds for git operations against a remote, or None for no timeout.
+
+        The value given on the cli with --timeout wins over the top level 'timeout' key in the config file.
+        """
+        if timeout is None:
+            timeout = config.get("timeout", None)
+
+        if timeout is None:
+            return None
+
+        try:
+            timeout = float(timeout)
+        except (TypeError, ValueError) as e:
+            raise SubGitConfigException(f"Timeout must be a number of seconds, got: {timeout}") from e
+
+        if timeout <= 0:
+            raise SubGitConfigException(f"Timeout must be higher than 0, got: {timeout}")
+
+        return timeout
+
+    def _get_fetch_args(self, revision, clone_options, all_refs=False):
+        """
+        Returns a tuple of (refspec, fetch_kwargs) for fetching a repo from origin.
+
+        Only the refs that the revision needs is fetched. A branch revision fetches that one branch
+        and no tags, and a tag revision fetches all tags and no branches. This avoids both download
+        and ref update of every other branch in repos with a lot of branches.
+
+        With all_refs=True all branches and all tags is fetched. If the revision do not need any
+        specific refs, refspec is None and the default refspec of the repo is used.
+        """
+        fetch_kwargs = {}
+
+        # A partial clone filter is stored in the repo config by git itself during the clone,
+        # so only the depth needs to be repeated here.
+        if "depth" in clone_options:
+            fetch_kwargs["depth"] = clone_options["depth"]
+
+        if all_refs:
+            refspec = [
+                "+refs/heads/*:refs/remotes/origin/*",
+                "+refs/tags/*:refs/tags/*",
+            ]
+        elif "branch" in revision:
+            refspec = [f"+refs/heads/{revision['branch']}:refs/remotes/origin/{revision['branch']}"]
+            fetch_kwargs["no_tags"] = True
+        elif "tag" in revision:
+            refspec = ["+refs/tags/*:refs/tags/*"]
+        else:
+            refspec = None
+
+        return refspec, fetch_kwargs
+
+    def _ls_remote(self, url, *patterns, tags=False):
+        """
+        Lists refs in a remote git repo w/o the need for a local clone.
+
+        Returns a dict with the ref name as key and commit sha as value. For annotated tags the
+        sha of the commit the tag points to is used and not the sha of the tag object itself.
+        """
+        output = Git().ls_remote(url, *patterns, tags=tags)
+        refs = {}
+
+        for line in output.splitlines():
+            sha, ref = line.split("\t", 1)
+
+            if ref.endswith("^{}"):
+                refs[ref[:-3]] = sha
+            else:
+                refs.setdefault(ref, sha)
+
+        return refs
+
+    def lock(self, names=None, jobs=None):
+        """
+        Resolves the revision of one or more repos to an exact commit sha and writes them to the lock file.
+
+        The revisions is resolved against the remote repo directly so repos do not need to be cloned.
+        Repos that is not selected keeps their current entry in the lock file.
+
+        To lock all enabled repos send in None as value.
+
+        To lock a subset of repo names, send in them as a list of strings.
+        """
+        self._get_recursive_config_path()
+
+        config = self._get_config_file()
+        active_repos = self._get_active_repos(config)
+
+        if len(active_repos) == 0:
+            log.error("There is no repos defined or enabled in the config")
+            return 1
+
+        names = names or active_repos
+
+        for name in names:
+            if not config.is_active(name):
+                choices = ", ".join(active_repos)
+                log.error(f'Repo with name "{name}" not found in config file. Choices are "{choices}"')
+                return 1
+
+        repos = config.get_repos(names)
+
+        with self._ssh_multiplexing(config):
+            results = self._run_remote_parallel(config, self._lock_repo, repos, self._get_worker_count(config, jobs, len(repos)))
+
+        lock_entries = {
+            lock_entry["name"]: lock_entry
+            for lock_entry in self._get_lock_file()["repos"]
+        }
+        has_failed = False
+
+        for repo_data, lock_entry, exception in results:
+            if exception:
+                log.error(f"Unable to lock repo '{repo_data['name']}', {exception}")
+                has_failed = True
+            else:
+                log.info(f"Locked repo '{lock_entry['name']}' at {lock_entry['sha']}")
+                lock_entries[lock_entry["name"]] = lock_entry
+
+        if has_failed:
+            log.error("Lock file was not updated")
+            return 1
+
+        # Keep the lock file in the same order as the config file, and skip repos that is no longer in the config
+        self._dump_lock_file({
+            "repos": [
+                lock_entries[repo_name]
+                for repo_name in active_repos
+                if repo_name in lock_entries
+            ],
+        })
+
+        log.info(f"Successfully wrote lock file {self._get_lock_file_path().name} to disk")
+
+        return 0
+
+    def plan(self, names=None, jobs=None, output_format="table"):
+        """
+        Shows what a pull would do with one or more repos w/o changing anything on disk.
+
+        The same checks as pull is done for each repo, and the revision of each repo is resolved
+        against the remote repo in parallel. Each repo gets one of the actions:
+
+          clone: The repo is not on disk and would be cloned
+          update: The repo would be moved to a new commit or branch
+          unchanged: The repo is already at the target commit
+          dirty: The repo has uncommited changes and would abort the pull
+          error: The revision could not be resolved or the config of the repo is invalid
+
+        output_format can be 'table' or 'json'.
+
+        Returns 1 if any repo would abort or fail the pull, otherwise 0.
+        """
+        self._get_recursive_config_path()
+
+        if output_format not in ("table", "json"):
+            raise SubGitConfigException(f"Unsupported output format '{output_format}', must be 'table' or 'json'")
+
+        config = self._get_config_file()
+        active_repos = self._get_active_repos(config)
+
+        if len(active_repos) == 0:
+            log.error("There is no repos defined or enabled in the config")
+            return 1
+
+        names = names or active_repos
+
+        for name in names:
+            if not config.is_active(name):
+                choices = ", ".join(active_repos)
+                log.error(f'Repo with name "{name}" not found in config file. Choices are "{choices}"')
+                return 1
+
+        repos = config.get_repos(names)
+
+        plan_entries = []
+
+        with self._ssh_multiplexing(config):
+            results = self._run_remote_parallel(config, self._plan_repo, repos, self._get_worker_count(config, jobs, len(repos)))
+
+        for repo_data, plan_entry, exception in results:
+            if exception:
+                plan_entry = {
+                    "name": repo_data["name"],
+                    "action": "error",
+                    "current_sha": None,
+                    "target_sha": None,
+                    "ref": None,
+                    "message": str(exception),
+                }
+
+            plan_entries.append(plan_entry)
+
+        if output_format == "json":
+            print(json.dumps(plan_entries, indent=2))
+        else:
+            name_width = max(len("NAME"), *(len(plan_entry["name"]) for plan_entry in plan_entries))
+
+            print(f"{'NAME':<{name_width}}  {'ACTION':<9}  {'CURRENT':<12}  {'TARGET':<12}  REF")
+
+            for plan_entry in plan_entries:
+                current_sha = (plan_entry["current_sha"] or "-")[:12]
+                target_sha = (plan_entry["target_sha"] or "-")[:12]
+                details = plan_entry["message"] or plan_entry["ref"] or ""
+
+                print(f"{plan_entry['name']:<{name_width}}  {plan_entry['action']:<9}  {current_sha:<12}  {target_sha:<12}  {details}")
+
+            actions = [plan_entry["action"] for plan_entry in plan_entries]
+
+            print("")
+            print(
+                f"{actions.count('clone')} to clone, {actions.count('update')} to update, "
+                f"{actions.count('unchanged')} unchanged, {actions.count('dirty') + actions.count('error')} rejected"
+            )
+
+        if any(plan_entry["action"] in ("dirty", "error") for plan_entry in plan_entries):
+            return 1
+
+        return 0
+
+    def optimize(self, names=None, jobs=None):
+        """
+        Turns on git performance features and runs maintenance in one or more cloned repos in parallel.
+
+        The options in the 'performance' blocks of the config file is used, and any option not set
+        there falls back to DEFAULT_PERFORMANCE_OPTIONS. Repos that is not cloned is skipped.
+
+        To optimize all enabled repos send in None as value.
+
+        To optimize a subset of repo names, send in them as a list of strings.
+        """
+        self._get_recursive_config_path()
+
+        config = self._get_config_file()
+        active_repos = self._get_active_repos(config)
+
+        if len(active_repos) == 0:
+            log.error("There is no repos defined or enabled in the config")
+            return 1
+
+        names = names or active_repos
+
+        for name in names:
+            if not config.is_active(name):
+                choices = ", ".join(active_repos)
+                log.error(f'Repo with name "{name}" not found in config file. Choices are "{choices}"')
+                return 1
+
+        repos = []
+
+        for repo_data in config.get_repos(names):
+            if not (Path().cwd() / repo_data["name"]).exists():
+                log.warning(f"Repo '{repo_data['name']}' is not cloned, skipping it")
+                continue
+
+            repos.append(dict(
+                repo_data,
+                performance=self._get_performance_options(config, repo_data, DEFAULT_PERFORMANCE_OPTIONS),
+            ))
+
+        has_failed = False
+
+        for repo_data, tasks, exception in run_parallel(self._optimize_repo, repos, self._get_worker_count(config, jobs, len(repos))):
+            if exception:
+                log.error(f"Unable to optimize repo '{repo_data['name']}', {exception}")
+                has_failed = True
+            else:
+                log.info(f"Optimized repo '{repo_data['name']}'{', ran ' + ', '.join(tasks) if tasks else ''}")
+
+        return 1 if has_failed else 0
+
+    def _optimize_repo(self, repo_data):
+        """
+        Writes the performance git config of a single repo and runs the maintenance tasks for it.
+        repo_data must contain the resolved performance options in the 'performance' key.
+
+        Returns the list of maintenance tasks that was run.
+        """
+        performance_options = repo_data["performance"]
+        repo = Repo(Path().cwd() / repo_data["name"])
+
+        self._set_performance_config(repo, performance_options)
+
+        if not performance_options.get("maintenance", False):
+            return []
+
+        tasks = ["loose-objects"]
+
+        if performance_options.get("commit_graph", False):
+            tasks.append("commit-graph")
+
+        # Worktrees from the same shared object database is maintained one at a time
+        with self._get_repo_lock(repo):
+            repo.git.maintenance("run", *(f"--task={task}" for task in tasks))
+
+            # Incremental repack needs the multi-pack-index and at least one pack file to index, otherwise
+            # fall back to a regular gc. It runs after the loose-objects task, which packs the loose objects
+            # that small fetches writes.
+            has_packs = any((Path(repo.common_dir) / "objects" / "pack").glob("*.pack"))
+            repack_task = "incremental-repack" if performance_options.get("multi_pack_index", False) and has_packs else "gc"
+
+            repo.git.maintenance("run", f"--task={repack_task}")
+
+        tasks.append(repack_task)
+
+        return tasks
+
+    def _plan_repo(self, repo_data):
+        """
+        Resolves what a pull would do with a single repo w/o changing anything on disk.
+
+        Returns a dict with the planned action, the current and target commit sha and the ref of the revision.
+        """
+        name = repo_data["name"]
+        repo_path = Path().cwd() / name
+        revision = repo_data.get("revision", {})
+
+        plan_entry = {
+            "name": name,
+            "action": None,
+            "current_sha": None,
+            "target_sha": None,
+            "ref": None,
+            "message": None,
+        }
+
+        if "branch" in revision and not revision["branch"]:
+            plan_entry["action"] = "error"
+            plan_entry["message"] = "Invalid branch option"
+            return plan_entry
+
+        repo = None
+
+        if repo_path.exists():
+            repo = Repo(repo_path)
+
+            if repo.head.is_valid():
+                plan_entry["current_sha"] = repo.head.commit.hexsha
+
+            dirty_files = self._get_dirty_files(repo_data)
+
+            if dirty_files is not None:
+                plan_entry["action"] = "dirty"
+                plan_entry["message"] = f"Uncommited changes in {', '.join(dirty_files)}"
+                return plan_entry
+
+            # Repos that is already cloned can be pulled w/o a url in the config
+            if not repo_data.get("url", None) and "origin" in repo.remotes:
+                repo_data = dict(repo_data, url=repo.remotes.origin.url)
+
+        lock_entry = self._lock_repo(repo_data, read_only=True)
+
+        plan_entry["target_sha"] = lock_entry["sha"]
+        plan_entry["ref"] = lock_entry.get("ref", None)
+
+        # Tags ordered by time is selected from the local tags, that can be behind the remote
+        if "tag" in revision and self._parse_tag_config(name, revision["tag"])[1] == OrderAlgorithms.TIME:
+            plan_entry["message"] = f"{plan_entry['ref']} (from local tags, may be outdated)"
+
+        if repo is None:
+            plan_entry["action"] = "clone"
+        elif not (plan_entry["current_sha"] or "").startswith(plan_entry["target_sha"]):
+            # Commit revisions can be a short sha
+            plan_entry["action"] = "update"
+        elif "branch" in revision and not self._is_on_branch(repo, revision["branch"]):
+            plan_entry["action"] = "update"
+            plan_entry["message"] = f"Checkout branch '{revision['branch']}'"
+        else:
+            plan_entry["action"] = "unchanged"
+
+        return plan_entry
+
+    def _lock_repo(self, repo_data, read_only=False):
+        """
+        Resolves the revision of one repo to a commit sha in the remote repo. Returns the lock file entry.
+
+        Tags ordered by time is resolved from the local clone, set read_only=True to not update
+        the tag cache in it.
+        """
+        name = repo_data["name"]
+        url = repo_data.get("url", None)
+        revision = repo_data.get("revision", {})
+
+        if not url:
+            raise SubGitConfigException(f"Missing required key 'url' on repo '{name}'")
+
+        if "commit" in revision:
+            return {
+                "name": name,
+                "url": url,
+                "sha": self._resolve_commit(name, revision["commit"]),
+            }
+
+        if "branch" in revision:
+            ref = f"refs/heads/{revision['branch']}"
+            remote_refs = self._ls_remote(url, ref)
+            if ref not in remote_refs:
+                raise SubGitRepoException(f"Ref '{ref}' not found in remote repo")
+
+            sha = remote_refs[ref]
+        elif "tag" in revision:
+            if self._parse_tag_config(name, revision["tag"])[1] == OrderAlgorithms.TIME:
+                tag_name, sha = self._resolve_local_tag(name, revision["tag"], read_only)
+            else:
+                tag_name, sha = self._resolve_remote_tag(name, url, revision["tag"])
+
+            if not tag_name:
+                raise SubGitRepoException("No git tag could be parsed out with the current repo configuration")
+
+            ref = f"refs/tags/{tag_name}"
+        else:
+            raise SubGitConfigException(f"Repo '{name}' must have a branch, tag or commit revision to be locked")
+
+        return {
+            "name": name,
+            "url": url,
+            "ref": ref,
+            "sha": sha,
+        }
+
+    def _resolve_commit(self, name, commit):
+        """
+        Returns the full sha of a commit revision.
+
+        A remote repo can't be asked what commit a short sha is, so a short sha is only expanded if
+        it is unique among the commits in the local clone of the repo.
+        """
+        commit = str(commit).lower()
+
+        if re.fullmatch(r"[0-9a-f]{40}|[0-9a-f]{64}", commit):
+            return commit
+
+        repo_path = Path().cwd() / name
+
+        if repo_path.exists() and re.fullmatch(r"[0-9a-f]{4,63}", commit):
+            sha = Repo(repo_path).git.rev_parse("--verify", "--quiet", f"{commit}^{{commit}}", with_exceptions=False)
+
+            if sha:
+                return sha
+
+        raise SubGitConfigException(f"Commit '{commit}' on repo '{name}' must be a full sha, or a short sha of a commit in the local clone of the repo, to be locked")
+
+    def _resolve_local_tag(self, name, tag_config, read_only=False):
+        """
+        Runs the tag selection from the revision.tag config over the tags in the local clone of
+        the repo. Used for tags ordered by time, where the creation time of each tag is only
+        available in a local repo.
+
+        Returns a tuple of (tag_name, sha) for the selected tag, or (None, None) if no tag was selected.
+        """
+        repo_path = Path().cwd() / name
+
+        if not repo_path.exists():
+            raise SubGitRepoException(f"Repo '{name}' orders tags by time and must be pulled before it can be locked")
+
+        repo = Repo(repo_path)
+        tag_name = self._resolve_local_tag_cached(repo, name, tag_config, read_only=read_only)
+
+        if not tag_name:
+            return None, None
+
+        return tag_name, repo.git.rev_parse(f"refs/tags/{tag_name}^{{commit}}")
+
+    def _resolve_remote_tag(self, name, url, tag_config):
+        """
+        Runs the tag selection from the revision.tag config over the tags in the remote repo.
+
+        Returns a tuple of (tag_name, sha) for the selected tag, or (None, None) if no tag was selected.
+
+        A remote repo can't tell when each tag was created, so tags ordered by time can't be resolved
+        remotely and will raise SubGitConfigException.
+        """
+        if self._parse_tag_config(name, tag_config)[1] == OrderAlgorithms.TIME:
+            raise SubGitConfigException(f"Tags ordered by time for repo '{name}' can't be resolved against the remote repo")
+
+        remote_refs = self._ls_remote(url, tags=True)
+        tag_names = [
+            remote_ref[len("refs/tags/"):]
+            for remote_ref in remote_refs
+        ]
+
+        tag_name = self._resolve_tag(name, tag_config, tag_names)
+
+        if not tag_name:
+            return None, None
+
+        return tag_name, remote_refs[f"refs/tags/{tag_name}"]
+
+    def _get_active_repos(self, config):
+        """
+        Helper method that will return only the repos that is enabled and active for usage
+        """
+        return config.active_repos
+
+    def cache_update(self, names=None, jobs=None):
+        """
+        Creates or updates the bare mirror in the shared object cache for one or more repos in parallel.
+
+        The object cache is shared by all workspaces on the machine, and new clones in workspaces with
+        'object_cache: true' borrows all objects they can from the mirrors instead of downloading them.
+
+        To update the mirrors of all enabled repos send in None as value.
+
+        To update a subset of repo names, send in them as a list of strings.
+        """
+        self._get_recursive_config_path()
+
+        config = self._get_config_file()
+        active_repos = self._get_active_repos(config)
+
+        if len(active_repos) == 0:
+            log.error("There is no repos defined or enabled in the config")
+            return 1
+
+        names = names or active_repos
+
+        for name in names:
+            if not config.is_active(name):
+                choices = ", ".join(active_repos)
+                log.error(f'Repo with name "{name}" not found in config file. Choices are "{choices}"')
+                return 1
+
+        repos = [
+            repo_data
+            for repo_data in config.get_repos(names)
+            if repo_data.get("url", None)
+        ]
+
+        log.info(f"Updating {len(repos)} mirrors in object cache {self._get_object_cache_dir()}")
+
+        has_failed = False
+
+        with self._ssh_multiplexing(config):
+            results = self._run_remote_parallel(config, self._update_mirror, repos, self._get_worker_count(config, jobs, len(repos)))
+
+        for repo_data, result, exception in results:
+            if exception:
+                log.error(f"Unable to update mirror for repo '{repo_data['name']}', {exception}")
+                has_failed = True
+            else:
+                log.info(f" - {repo_data['name']}: {result}")
+
+        return 1 if has_failed else 0
+
+    def _update_mirror(self, repo_data):
+        """
+        Creates the mirror for the url of a repo if it do not exists, otherwise fetches all refs into it.
+
+        New mirrors is cloned to a temporary folder and moved in place when they are complete, so
+        a pull in another workspace never borrows objects from a half done mirror.
+
+        Refs that is removed from the remote is pruned from the mirror, but gc is disabled in it so the
+        objects they pointed to is kept for the workspace repos that borrows them.
+
+        Returns a short summary string.
+        """
+        url = repo_data["url"]
+        mirror_path = self._get_mirror_path(url)
+
+        if mirror_path.exists():
+            mirror = Repo(mirror_path)
+
+            # Mirrors created by older versions of subgit has gc enabled
+            self._set_mirror_config(mirror)
+            mirror.remotes.origin.fetch(prune=True)
+
+            return f"updated {mirror_path.name}"
+
+        mirror_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = mirror_path.with_name(f"{mirror_path.name}.tmp-{os.getpid()}-{threading.get_ident()}")
+
+        try:
+            self._set_mirror_config(Repo.clone_from(url, temp_path, mirror=True))
+            temp_path.rename(mirror_path)
+        except OSError:
+            # Another process created the same mirror at the same time
+            if not mirror_path.exists():
+                raise
+        finally:
+            shutil.rmtree(temp_path, ignore_errors=True)
+
+        return f"created {mirror_path.name}"
+
+    def _set_mirror_config(self, mirror):
+        """
+        Sets the git config from MIRROR_GIT_CONFIG in a mirror, if it is not already set
+        """
+        config_reader = mirror.config_reader("repository")
+
+        missing_config = [
+            (section, key, value)
+            for section, key, value in MIRROR_GIT_CONFIG
+            if str(config_reader.get_value(section, key, "")).lower() != str(value).lower()
+        ]
+
+        if not missing_config:
+            return
+
+        with mirror.config_writer() as config_writer:
+            for section, key, value in missing_config:
+                config_writer.set_value(section, key, value)
+
+    def _get_object_cache_dir(self):
+        """
+        Returns the folder of the shared object cache. SUBGIT_CACHE_DIR is used if it is set, otherwise
+        OBJECT_CACHE_DIR_NAME within XDG_CACHE_HOME or ~/.cache.
+        """
+        if os.environ.get("SUBGIT_CACHE_DIR", None):
+            return Path(os.environ["SUBGIT_CACHE_DIR"]).expanduser()
+
+        cache_home = os.environ.get("XDG_CACHE_HOME", None) or Path.home() / ".cache"
+
+        return Path(cache_home) / OBJECT_CACHE_DIR_NAME
+
+    def _get_url_dir_name(self, url):
+        """
+        Returns a folder name for a bare repo of a url. The name of the repo is kept in the folder
+        name to make it readable, and a hash of the url makes it unique.
+        """
+        repo_name = re.sub(r"[^A-Za-z0-9._-]", "_", url.rstrip("/").rsplit("/", 1)[-1].rsplit(":", 1)[-1])
+
+        if repo_name.endswith(".git"):
+            repo_name = repo_name[:-len(".git")]
+
+        url_hash = hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]  # nosec-B324
+
+        return f"{repo_name}-{url_hash}.git"
+
+    def _get_mirror_path(self, url):
+        """
+        Returns the path to the mirror of a url in the object cache
+        """
+        return self._get_object_cache_dir() / self._get_url_dir_name(url)
+
+    def _get_shared_store_path(self, url):
+        """
+        Returns the path to the shared object database in the workspace for a url
+        """
+        return Path().cwd() / SHARED_STORE_DIR_NAME / self._get_url_dir_name(url)
+
+    def _get_shared_urls(self, config):
+        """
+        Returns the set of urls that is used by more than one enabled repo in the config file.
+        Repos with these urls is checked out as worktrees from one shared object database.
+        """
+        url_counts = {}
+
+        # Read from the index so that no included config files is loaded
+        for name, index_entry in config.repo_index.items():
+            url = index_entry["url"]
+
+            if url and config.is_active(name):
+                url_counts[url] = url_counts.get(url, 0) + 1
+
+        return {
+            url
+            for url, count in url_counts.items()
+            if count > 1
+        }
+
+    def _get_repo_lock(self, repo_or_path):
+        """
+        Returns the lock for the object database of a repo, or a path to one. Worktrees from the
+        same shared object database gets the same lock.
+        """
+        if isinstance(repo_or_path, Repo):
+            repo_or_path = repo_or_path.common_dir
+
+        key = str(Path(repo_or_path).resolve())
+
+        with self._repo_locks_lock:
+            if key not in self._repo_locks:
+                self._repo_locks[key] = threading.Lock()
+
+            return self._repo_locks[key]
+
+    def _open_shared_store(self, store_path):
+        """
+        Opens the shared object database at store_path.
+
+        When a worktree enables sparse checkout git turns on 'extensions.worktreeConfig', and moves
+        'core.bare' from the config of the database to its config.worktree file. GitPython do not
+        read that file, so it would open the database as a regular repo with the parent folder as
+        working tree. GIT_DIR is set to make all git commands run against the database as a bare repo.
+        """
+        repo = Repo(store_path)
+        repo.git.update_environment(GIT_DIR=str(Path(store_path).resolve()))
+
+        return repo
+
+    def _is_shared_store(self, repo):
+        """
+        Returns True if the repo is a shared object database in the workspace
+        """
+        return Path(repo.git_dir).resolve().parent == (Path().cwd() / SHARED_STORE_DIR_NAME).resolve()
+
+    def _add_worktree(self, store, repo_path, commit):
+        """
+        Adds a worktree at repo_path from the shared object database. The worktree is created
+        w/o a checkout, so sparse paths can be set before the configured revision is checked out.
+        """
+        with self._get_repo_lock(store):
+            store.git.worktree("add", "--detach", "--no-checkout", str(repo_path), commit)
+
+        return Repo(repo_path)
+
+    def _is_worktree(self, repo):
+        """
+        Returns True if the repo is a worktree from a shared object database
+        """
+        return Path(repo.git_dir).resolve() != Path(repo.common_dir).resolve()
+
+    def _checkout_branch(self, repo, branch, start_point):
+        """
+        Moves a repo to start_point of a branch revision. The local branch is created or reset to
+        start_point and checked out.
+
+        The local branches in a shared object database is shared by all of its worktrees. Moving a
+        branch that is checked out in another worktree would move the HEAD of that worktree but leave
+        its files as they was. A worktree where the branch already is checked out in another worktree
+        instead follows the branch with a detached HEAD of its own.
+        """
+        if not self._is_worktree(repo):
+            repo.git.checkout("-B", branch, start_point)
+            return
+
+        # The check and the checkout is done under the lock, so two worktrees never takes the same branch
+        with self._get_repo_lock(repo):
+            if self._is_branch_in_other_worktree(repo, branch):
+                repo.git.checkout("--detach", start_point)
+            else:
+                # The HEAD of the shared object database itself can point to the branch too
+                repo.git.checkout("--ignore-other-worktrees", "-B", branch, start_point)
+
+    def _is_branch_in_other_worktree(self, repo, branch):
+        """
+        Returns True if the branch is checked out in another worktree from the same shared object database
+        """
+        worktree_paths = []
+        working_dir = Path(repo.working_dir).resolve()
+
+        for line in repo.git.worktree("list", "--porcelain").splitlines():
+            if line.startswith("worktree "):
+                worktree_paths.append(Path(line[len("worktree "):]).resolve())
+            elif line == f"branch refs/heads/{branch}" and worktree_paths[-1] != working_dir:
+                # The first entry is the shared object database, that never has anything checked out
+                if len(worktree_paths) > 1:
+                    return True
+
+        return False
+
+    def _is_on_branch(self, repo, branch):
+        """
+        Returns True if the branch is checked out in the repo. Worktrees with a detached HEAD counts as
+        on the branch, as that is how they follow a branch that is checked out in another worktree.
+        """
+        if repo.head.is_detached:
+            return self._is_worktree(repo)
+
+        return repo.active_branch.name == branch
+
+    def _get_local_commit_count(self, g):
+        """
+        Returns the number of commits reachable from HEAD that is not in any remote branch or tag.
+        Used for worktrees that follows their branch with a detached HEAD.
+        """
+        return int(g.rev_list("--count", "HEAD", "--not", "--remotes", "--tags"))
+
+    def _fetch_shared_store(self, store_data):
+        """
+        Fetches the refs needed by all repos that uses the same shared object database with one
+        single fetch. The store is created if it do not exist.
+
+        store_data is a dict with the url, path, and a list of (repo_data, clone_options, all_refs)
+        tuples for each repo.
+        """
+        refspecs = []
+        depths = []
+        no_tags = True
+
+        for repo_data, clone_options, all_refs in store_data["repos"]:
+            refspec, fetch_kwargs = self._get_fetch_args(repo_data.get("revision", {}), clone_options, all_refs)
+
+            # No specific refspec means the default refspec of the remote, all branches
+            if refspec is None:
+                refspec = "+refs/heads/*:refs/remotes/origin/*"
+
+            refspecs.extend([refspec] if isinstance(refspec, str) else refspec)
+            depths.append(fetch_kwargs.get("depth", None))
+            no_tags = no_tags and fetch_kwargs.get("no_tags", False)
+
+        fetch_kwargs = {}
+
+        # The store is only shallow if all repos wants it to be shallow
+        if all(depths):
+            fetch_kwargs["depth"] = max(depths)
+
+        if no_tags:
+            fetch_kwargs["no_tags"] = True
+
+        repo_data, clone_options, _ = store_data["repos"][0]
+        store, _ = self._open_or_init_repo(repo_data, clone_options)
+
+        with self._get_repo_lock(store):
+            store.remotes.origin.fetch(list(dict.fromkeys(refspecs)), **fetch_kwargs)
+
+        return f"fetched {len(store_data['repos'])} repos into {Path(store_data['path']).name}"
+
+    def _remove_repo(self, repo_path):
+        """
+        Moves a repo to the trash folder of the workspace. For worktrees from a shared object database
+        the worktree is removed from the database, and the database itself is moved to the trash
+        with the last worktree.
+
+        Returns the list of paths in the trash that is left to remove with _empty_trash.
+        """
+        store_path = None
+
+        if (repo_path / ".git").is_file():
+            store_path = Path(Repo(repo_path).common_dir).resolve()
+
+        trash_paths = [self._move_to_trash(repo_path)]
+
+        if store_path:
+            with self._get_repo_lock(store_path):
+                # The moved worktree no longer exists at the path the database knows it by
+                self._open_shared_store(store_path).git.worktree("prune")
+
+                worktrees_path = store_path / "worktrees"
+
+                if not worktrees_path.exists() or not any(worktrees_path.iterdir()):
+                    log.debug(f"Removing shared object database {store_path} as it has no worktrees left")
+                    trash_paths.append(self._move_to_trash(store_path))
+
+        return [
+            trash_path
+            for trash_path in trash_paths
+            if trash_path
+        ]
+
+    def _get_trash_dir(self):
+        """
+        Returns the trash folder of the workspace
+        """
+        return Path().cwd() / TRASH_DIR_NAME
+
+    def _move_to_trash(self, path):
+        """
+        Renames a folder into a new unique folder within the trash folder. The rename is atomic, so
+        the path is free to be used again as soon as this returns, no matter how big the folder is.
+
+        If the folder is on another file system than the trash folder it can't be renamed, and
+        is removed right away instead.
+
+        Returns the path in the trash, or None if the folder was removed.
+        """
+        trash_dir = self._get_trash_dir()
+        trash_dir.mkdir(parents=True, exist_ok=True)
+        trash_path = Path(tempfile.mkdtemp(prefix=f"{path.name}-", dir=trash_dir))
+
+        try:
+            path.rename(trash_path / path.name)
+        except OSError as e:
+            log.debug(f"Unable to move {path} to the trash, removing it in place: {e}")
+            trash_path.rmdir()
+            shutil.rmtree(path)
+            return None
+
+        return trash_path
+
+    def _empty_trash(self, trash_paths, wait=False, jobs=None):
+        """
+        Removes paths in the trash folder, together with anything left in it from earlier runs.
+
+        With wait=True the paths is removed in parallel before this returns. Otherwise they is handed
+        over to a detached python process that removes them in the background, and keeps doing
+        so after subgit has exited.
+        """
+        trash_dir = self._get_trash_dir()
+        trash_paths = list(trash_paths)
+
+        # Left overs from background removals that was interrupted
+        if trash_dir.exists():
+            trash_paths.extend(
+                path
+                for path in trash_dir.iterdir()
+                if path not in trash_paths
+            )
+
+        if not trash_paths:
+            return
+
+        if wait:
+            worker_count = self._get_worker_count(self._get_config_file(), jobs, len(trash_paths))
+
+            for path, _, exception in run_parallel(shutil.rmtree, trash_paths, worker_count):
+                if exception and path.exists():
+                    log.error(f"Unable to remove {path}: {exception}")
+
+            return
+
+        log.debug(f"Removing {len(trash_paths)} paths in the trash in the background")
+
+        Popen(
+            [
+                sys.executable,
+                "-c",
+                "import shutil, sys; [shutil.rmtree(path, ignore_errors=True) for path in sys.argv[1:]]",
+                *[str(path) for path in trash_paths],
+            ],
+            stdin=DEVNULL,
+            stdout=DEVNULL,
+            stderr=DEVNULL,
+            start_new_session=True,
+        )  # nosec-B603
+
+    def _get_object_cache_enabled(self, config):
+        object_cache = config.get("object_cache", False)
+
+        if not isinstance(object_cache, bool):
+            raise SubGitConfigException(f"Key 'object_cache' must be true or false, got: {object_cache}")
+
+        return object_cache
+
+    def _run_remote_parallel(self, config, func, repos, worker_count):
+        """
+        Runs func(repo_data) for each repo with run_parallel, for work that talks to the remote of each repo.
+
+        The top level 'host_jobs' key in the config file limits how many repos can work against the
+        same remote host at the same time, and the repos is interleaved by host so other hosts can be
+        worked on while one host is at its limit.
+
+        Returns a list of (repo_data, result, exception) tuples in the same order as repos.
+        """
+        host_limiter = HostLimiter(self._get_host_jobs(config))
+
+        def get_host(repo_data):
+            return get_url_host(repo_data.get("url", None))
+
+        def limited_func(repo_data):
+            with host_limiter.limit(get_host(repo_data)):
+                return func(repo_data)
+
+        results = {
+            id(repo_data): (repo_data, result, exception)
+            for repo_data, result, exception in run_parallel(limited_func, interleave_by_host(repos, get_host), worker_count)
+        }
+
+        return [
+            results[id(repo_data)]
+            for repo_data in repos
+        ]
+
+    def _ssh_multiplexing(self, config):
+        """
+        Returns the context that all remote work of one command is run in. With the top level key
+        'ssh_multiplex: true' all ssh connections to the same host is shared through one ssh
+        ControlMaster for as long as the context is entered.
+        """
+        ssh_multiplex = config.get("ssh_multiplex", False)
+
+        if not isinstance(ssh_multiplex, bool):
+            raise SubGitConfigException(f"Key 'ssh_multiplex' must be true or false, got: {ssh_multiplex}")
+
+        return ssh_multiplexing() if ssh_multiplex else nullcontext()
+
+    def _get_host_jobs(self, config):
+        """
+        Returns the max number of repos to work on against the same remote host at the same time, or
+        None if there is no limit.
+        """
+        host_jobs = config.get("host_jobs", None)
+
+        if host_jobs is None:
+            return None
+
+        if isinstance(host_jobs, bool) or not isinstance(host_jobs, int) or host_jobs < 1:
+            raise SubGitConfigException(f"Key 'host_jobs' must be 1 or higher, got: {host_jobs}")
+
+        return host_jobs
+
+    def _get_worker_count(self, config, jobs=None, repo_count=None):
+        """
+        Returns how many repos we should work on at the same time.
+
+        The value given on the cli with -j/--jobs wins over the top level 'jobs' key in
+        the config file. If neither is set, two jobs per CPU core is used but never less than
+        WORKER_COUNT, as most of the time is spent waiting on the network. The default is
+        also limited to repo_count so no more threads than repos is started.
+        """
+        if jobs is None:
+            jobs = config.get("jobs", None)
+
+        if jobs is None:
+            jobs = max(WORKER_COUNT, (os.cpu_count() or 1) * 2)
+
+            if repo_count:
+                jobs = min(jobs, repo_count)
+
+        try:
+            worker_count = int(jobs)
+        except (TypeError, ValueError) as e:
+            raise SubGitConfigException(f"Number of jobs must be an integer, got: {jobs}") from e
+
+        if worker_count < 1:
+            raise SubGitConfigException(f"Number of jobs must be 1 or higher, got: {worker_count}")
+
+        return worker_count
+
+    def pull(self, names, jobs=None, locked=False, skip_unchanged=True, all_refs=False, remote_tags=False, use_cache=True):
+        """
+        To pull all repos defined in the configuration send in names=None
+
+        To pull a subset of repos send in a list of strings names=["repo1", "repo2"]
+
+        With locked=True each repo is moved to the exact commit in the lock file instead of resolving
+        the revision in the config file.
+
+        With skip_unchanged=True the remote of each repo that is already cloned is first queried with
+        git ls-remote, and repos where the resolved revision is the same as the current HEAD is
+        skipped w/o any fetch or checkout.
+
+        By default only the refs needed by the revision of each repo is fetched. Set all_refs=True
+        to fetch all branches and tags from the remote.
+
+        With remote_tags=True the tag revisions is resolved against the tags in the remote repo, and
+        only the selected tag is fetched instead of cloning the whole repo first. Tags ordered by
+        time can't be resolved remotely and is always pulled the regular way.
+
+        With use_cache=False the tag cache in each repo is not used and tags is always selected
+        from a fresh listing of the local tags.
+        """
+        self._get_recursive_config_path()
+
+        log.debug(f"Repo pull - {names}")
+
+        config = self._get_config_file()
+
+        active_repos = self._get_active_repos(config)
+
+        repos = []
+
+        if len(active_repos) == 0:
+            log.error("There is no repos defined or enabled in the config")
+            return 1
+
+        if names is None:
+            repos = config.repos
+            repo_choices = ", ".join(active_repos)
+
+            answer = self.yes_no(f"Are you sure you want to 'git pull' the following repos '{repo_choices}'")
+
+            if not answer:
+                log.warning("User aborted pull step")
+                return 1
+        elif isinstance(names, list):
+            # Validate that all provided repo names exists in the config. A name given more than once
+            # is only pulled once, as the same repo can't be pulled into the same path in parallel.
+            for name in dict.fromkeys(names):
+                if not config.is_active(name):
+                    choices = ", ".join(active_repos)
+                    log.error(f'Repo with name "{name}" not found in config file. Choices are "{choices}"')
+                    return 1
+
+                repos.append(config.get_repo(name))
+        else:
+            log.debug(f"Names {names}")
+            raise SubGitConfigException("Unsuported value type for argument names")
+
+        if not repos:
+            raise SubGitConfigException("No valid repositories found")
+
+        # Validation step across all repos to manipulate that they are not dirty
+        # or anything uncommited that would break the code trees.
+        #
+        # Abort out if any repo is bad.
+
+        worker_count = self._get_worker_count(config, jobs, len(repos))
+
+        has_dirty = False
+
+        for repo_data, dirty_files, exception in run_parallel(self._get_dirty_files, repos, worker_count):
+            if exception:
+                raise exception
+
+            if dirty_files is None:
+                continue
+
+            log.error(f'The repo "{repo_data["name"]}" is dirty and has uncommited changes in the following files')
+
+            for file in dirty_files:
+                log.info(f" - {file}")
+
+            has_dirty = True
+
+        if has_dirty:
+            log.error("\nFound one or more dirty repos. Resolve it before continue...")
+            return 1
+
+        bad_repo_configs = []
+
+        for repo_data in repos:
+            name = repo_data["name"]
+            revision = repo_data["revision"]
+
+            if "branch" in revision:
+                if not revision["branch"]:
+                    bad_repo_configs.append(name)
+
+        if bad_repo_configs:
+            bad_repos_string = ", ".join(repo for repo in bad_repo_configs)
+            log.error(f"One or more repos in congif file has an invalid branch option... {bad_repos_string}")
+            return 1
+
+        clone_options = {}
+        performance_options = {}
+        use_object_cache = self._get_object_cache_enabled(config)
+        shared_urls = self._get_shared_urls(config)
+
+        for repo_data in repos:
+            name = repo_data["name"]
+            repo_path = Path().cwd() / name
+
+            if not repo_path.exists() and not repo_data.get("url", None):
+                raise SubGitConfigException(f"Missing required key 'url' on repo '{name}'")
+
+            clone_options[name] = self._get_clone_options(config, repo_data)
+            performance_options[name] = self._get_performance_options(config, repo_data)
+
+            if use_object_cache and repo_data.get("url", None):
+                mirror_path = self._get_mirror_path(repo_data["url"])
+
+                if mirror_path.exists():
+                    clone_options[name]["reference_if_able"] = str(mirror_path)
+
+            # Repos with the same url shares one object database in the workspace. Repos that
+            # already is cloned on their own is left as they are.
+            if repo_data.get("url", None) in shared_urls and (not repo_path.exists() or (repo_path / ".git").is_file()):
+                clone_options[name]["shared_store"] = str(self._get_shared_store_path(repo_data["url"]))
+
+        # All remote work of the pull shares one ssh ControlMaster per host
+        with self._ssh_multiplexing(config):
+            if locked:
+                lock_entries = {
+                    lock_entry["name"]: lock_entry
+                    for lock_entry in self._get_lock_file()["repos"]
+                }
+                bad_lock_entries = []
+
+                for repo_data in repos:
+                    lock_entry = lock_entries.get(repo_data["name"], None)
+
+                    if not lock_entry or lock_entry.get("url", None) != repo_data.get("url", None):
+                        bad_lock_entries.append(repo_data["name"])
+
+                if bad_lock_entries:
+                    log.error(f"One or more repos is missing or outdated in the lock file, run 'subgit lock' to update it... {', '.join(bad_lock_entries)}")
+                    return 1
+
+                def pull_func(repo_data):
+                    name = repo_data["name"]
+
+                    with self._remove_new_repo_on_failure(Path().cwd() / name):
+                        return self._pull_locked_repo(repo_data, clone_options[name], lock_entries[name])
+            else:
+                unchanged_repos = {}
+
+                if skip_unchanged:
+                    for repo_data, unchanged_sha, exception in self._run_remote_parallel(config, self._get_unchanged_sha, repos, worker_count):
+                        if exception:
+                            log.debug(f"Unable to check remote for repo '{repo_data['name']}', it will be pulled. {exception}")
+                        elif unchanged_sha:
+                            unchanged_repos[repo_data["name"]] = unchanged_sha
+
+                    log.info(f"Skipping {len(unchanged_repos)} of {len(repos)} repos where the remote has not changed")
+
+                def is_remote_tag_pull(repo_data):
+                    revision = repo_data["revision"]
+                    return remote_tags and "tag" in revision and self._parse_tag_config(repo_data["name"], revision["tag"])[1] != OrderAlgorithms.TIME
+
+                # All repos that shares an object database is served by one single fetch into it
+                shared_stores = {}
+
+                for repo_data in repos:
+                    name = repo_data["name"]
+
+                    if name in unchanged_repos or "shared_store" not in clone_options[name] or is_remote_tag_pull(repo_data):
+                        continue
+
+                    store_path = clone_options[name]["shared_store"]
+                    store_data = shared_stores.setdefault(store_path, {"url": repo_data["url"], "path": store_path, "repos": []})
+                    store_data["repos"].append((repo_data, clone_options[name], all_refs))
+
+                store_errors = {}
+
+                for store_data, result, exception in self._run_remote_parallel(config, self._fetch_shared_store, list(shared_stores.values()), worker_count):
+                    if exception:
+                        log.debug(f"Fetch of shared object database {store_data['path']} failed. {exception}")
+
+                        for repo_data, _, _ in store_data["repos"]:
+                            store_errors[repo_data["name"]] = exception
+                    else:
+                        log.debug(f"Shared object database {store_data['path']}: {result}")
+
+                def pull_func(repo_data):
+                    name = repo_data["name"]
+
+                    if name in unchanged_repos:
+                        # Sparse paths is a local setting that can change even if the remote has not
+                        self._set_sparse_checkout(Repo(Path().cwd() / name), repo_data)
+
+                        return f"unchanged at {unchanged_repos[name]}"
+
+                    if name in store_errors:
+                        raise SubGitRepoException(f"Fetch of shared object database failed: {store_errors[name]}")
+
+                    if is_remote_tag_pull(repo_data):
+                        with self._remove_new_repo_on_failure(Path().cwd() / name):
+                            return self._pull_remote_tag(repo_data, clone_options[name])
+
+                    return self._pull_repo(repo_data, clone_options[name], all_refs, use_cache, fetch="shared_store" not in clone_options[name])
+
+            def pull_and_configure_func(repo_data):
+                name = repo_data["name"]
+                repo_path = Path().cwd() / name
+                is_new_repo = not repo_path.exists()
+
+                result = pull_func(repo_data)
+
+                # Repos cloned with 'git clone --dissociate' is already done, this covers the repos
+                # that is created and then fetched into
+                if is_new_repo and clone_options[name].get("dissociate", False):
+                    self._dissociate_repo(Repo(repo_path))
+
+                # Performance settings is applied to new repos only, 'subgit optimize' updates existing repos
+                if is_new_repo and performance_options[name]:
+                    self._set_performance_config(Repo(repo_path), performance_options[name])
+
+                return result
+
+            # Repos looks good to be pulled. Run the pull logic for all repos in parallel
+
+            log.info(f"Pulling {len(repos)} repos using {worker_count} parallel jobs")
+
+            results = self._run_remote_parallel(config, pull_and_configure_func, repos, worker_count)
+
+        # Summary is always presented in the same order as the repos in the config file
+        # no matter in what order the repos completed.
+        failed_repos = []
+
+        log.info("")
+        log.info("Pull summary:")
+
+        for repo_data, result, exception in results:
+            name = repo_data["name"]
+
+            if exception:
+                failed_repos.append(name)
+                log.error(f" - {name}: FAILED, {exception}")
+            else:
+                log.info(f" - {name}: {result}")
+
+        if not locked and skip_unchanged:
+            log.info(f"Skipped {len(unchanged_repos)} unchanged repos")
+
+        if failed_repos:
+            log.error(f"Failed to pull {len(failed_repos)} of {len(results)} repos: {', '.join(failed_repos)}")
+            return 1
+
+        return 0
+
+    def _get_dirty_files(self, repo_data):
+        """
+        Returns a list of files with uncommited changes in the repo, or None if the repo is clean
+        or not cloned to disk yet.
+        """
+        repo_path = Path().cwd() / repo_data["name"]
+
+        # If the path do not exists then the repo can't be dirty
+        if not repo_path.exists():
+            return None
+
+        repo = Repo(repo_path)
+
+        # A dirty repo means there is uncommited changes in the tree
+        if not repo.is_dirty():
+            return None
+
+        return [item.a_path for item in repo.index.diff(None)]
+
+    def _get_performance_options(self, config, repo_data, defaults=None):
+        """
+        Returns the performance options for a repo. Options set in the 'performance' block of the repo
+        itself is merged on top of the options in the top level 'performance' block of the config file,
+        which is merged on top of the defaults.
+
+        Defaults that is false is left out, so the git config of the repo is only written for options
+        that is turned on or set in a 'performance' block. Any value from the global git config of
+        the user is kept for the rest.
+
+        Returns None if there is no defaults and no 'performance' block for the repo.
+
+        Supported options:
+
+          commit_graph: Use and write the commit-graph file that speeds up history walks
+          multi_pack_index: Use a multi-pack-index over all pack files
+          untracked_cache: Cache untracked files in the index to speed up git status
+          fsmonitor: Use the builtin file system monitor, only supported on Windows and macOS
+          preload_index: Read the index in parallel
+          checkout_workers: Number of parallel checkout workers, 0 for one worker per CPU core
+          maintenance: Run maintenance tasks like commit-graph and repack in 'subgit optimize'
+        """
+        name = repo_data["name"]
+        performance_configs = [config.get("performance", None), repo_data.get("performance", None)]
+
+        if defaults is None and not any(performance_config is not None for performance_config in performance_configs):
+            return None
+
+        performance_options = {
+            option: value
+            for option, value in (defaults or {}).items()
+            if value is not False
+        }
+
+        for performance_config in performance_configs:
+            if performance_config is None:
+                continue
+
+            if not isinstance(performance_config, dict):
+                raise SubGitConfigException(f"Key 'performance' for repo {name} must be a dict object")
+
+            unsupported_keys = set(performance_config) - set(PERFORMANCE_OPTIONS)
+
+            if unsupported_keys:
+                raise SubGitConfigException(f"Unsupported performance options for repo {name}: {', '.join(sorted(unsupported_keys))}")
+
+            performance_options.update(performance_config)
+
+        for option, value in performance_options.items():
+            if option == "checkout_workers":
+                if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+                    raise SubGitConfigException(f"Performance option 'checkout_workers' for repo {name} must be 0 or a positive integer")
+            elif not isinstance(value, bool):
+                raise SubGitConfigException(f"Performance option '{option}' for repo {name} must be true or false")
+
+        return performance_options
+
+    def _set_performance_config(self, repo, performance_options):
+        """
+        Writes the git config for all performance options to the local config of the repo
+        """
+        # Worktrees from the same shared object database writes to the same config file
+        with self._get_repo_lock(repo), repo.config_writer() as config_writer:
+            for option, config_keys in PERFORMANCE_GIT_CONFIG.items():
+                if option not in performance_options:
+                    continue
+
+                value = performance_options[option]
+
+                if isinstance(value, bool):
+                    value = "true" if value else "false"
+
+                for section, key in config_keys:
+                    config_writer.set_value(section, key, value)
+
+    def _get_clone_options(self, config, repo_data):
+        """
+        Returns the clone options for a repo. Options set in the 'clone' block of the repo itself
+        is merged on top of the options in the top level 'clone' block of the config file.
+
+        Supported options:
+
+          depth: Only clone and fetch the given number of commits of history
+          single_branch: Only clone and fetch the branch, or tags, that the revision points to
+          filter: Partial clone filter passed to git, for example 'blob:none' or 'tree:0'
+          dissociate: Copy the objects borrowed from the object cache into new repos, so they keep
+                      working if the object cache is removed
+        """
+        name = repo_data["name"]
+        clone_options = {}
+
+        for clone_config in (config.get("clone", None), repo_data.get("clone", None)):
+            if clone_config is None:
+                continue
+
+            if not isinstance(clone_config, dict):
+                raise SubGitConfigException(f"Key 'clone' for repo {name} must be a dict object")
+
+            unsupported_keys = set(clone_config) - set(CLONE_OPTIONS)
+
+            if unsupported_keys:
+                raise SubGitConfigException(f"Unsupported clone options for repo {name}: {', '.join(sorted(unsupported_keys))}")
+
+            clone_options.update(clone_config)
+
+        depth = clone_options.get("depth", None)
+
+        if depth is not None and (isinstance(depth, bool) or not isinstance(depth, int) or depth < 1):
+            raise SubGitConfigException(f"Clone option 'depth' for repo {name} must be a positive integer")
+
+        for option in ("single_branch", "dissociate"):
+            if not isinstance(clone_options.get(option, False), bool):
+                raise SubGitConfigException(f"Clone option '{option}' for repo {name} must be true or false")
+
+        clone_filter = clone_options.get("filter", None)
+
+        if clone_filter is not None and (not isinstance(clone_filter, str) or clone_filter.strip() == ""):
+            raise SubGitConfigException(f"Clone option 'filter' for repo {name} must be a non empty string")
+
+        return {
+            key: value
+            for key, value in clone_options.items()
+            if value is not None and value is not False
+        }
+
+    def _set_sparse_checkout(self, repo, repo_data):
+        """
+        Ensures that the sparse checkout settings in the repo matches the 'sparse' block in the config.
+
+        Sparse paths is matched with .gitignore style patterns by default. Set 'cone: true' in the
+        sparse block to use the faster cone mode, where each path must be a directory.
+
+        If the paths and mode already matches what is configured in the repo nothing is done, and if
+        they differ only the files that moves in or out of the sparse paths is updated by git.
+        """
+        name = repo_data["name"]
+        sparse_repo_config = repo_data.get("sparse", None)
+
+        # Sparse settings is written to the per worktree config by git, that GitPython do not read
+        sparse_enabled = repo.git.config("--type=bool", "--get", "core.sparseCheckout", with_exceptions=False) == "true"
+        cone_enabled = repo.git.config("--type=bool", "--get", "core.sparseCheckoutCone", with_exceptions=False) == "true"
+
+        if not sparse_repo_config:
+            # By always disabling sparse when it is enabled, this will automatically revert any repo
+            # that used to have sparse enabled but no longer is enabled
+            if sparse_enabled:
+                log.info(f"Disabling sparse checkout on repo {name}")
+
+                with self._get_repo_lock(repo):
+                    repo.git.sparse_checkout("disable")
+
+            return
+
+        if not isinstance(sparse_repo_config, dict) or not isinstance(sparse_repo_config.get("paths", None), list):
+            raise SubGitConfigException(f"Key sparse.paths for repo {name} must be a list of paths")
 
-                # If old file do not exists then try the new filename
-                self.subgit_config_file_name = ".subgit.yml"
-                self.subgit_config_file_path = path / self.subgit_config_file_name
+        cone = sparse_repo_config.get("cone", False)
 
-                if self.subgit_config_file_path.exists():
-                    break
+        if not isinstance(cone, bool):
+            raise SubGitConfigException(f"Key sparse.cone for repo {name} must be true or false")
 
-                # If we reach root folder then we should abort out
-                if path == Path("/"):
-                    log.critical("Unable to find a config file in any directory...")
-                    sys.exit(1)
+        sparse_paths = [
+            str(path)
+            for path in sparse_repo_config["paths"]
+        ]
 
-                path = path.parent.absolute()
-                os.chdir(path)
-                log.debug(f"Next iteration... Updated cwd path to {path}")
+        if sparse_enabled and cone_enabled == cone:
+            current_paths = repo.git.sparse_checkout("list").splitlines()
 
-            log.info(f"Found config file...{self.subgit_config_file_path}")
-            log.debug(self.subgit_config_file_name)
-            log.debug(self.subgit_config_file_path)
-        else:
-            self.subgit_config_file_name = Path(self.config_file_path).name
-            self.subgit_config_file_path = Path(self.config_file_path).resolve()
+            if cone:
+                # In cone mode git lists the directories w/o any trailing slash
+                is_same = sorted(current_paths) == sorted(path.strip("/") for path in sparse_paths)
+            else:
+                is_same = current_paths == sparse_paths
 
-    def init_repo(self, repo_name=None, repo_url=None):
-        """
-        If repo_name & repo_url is set to a string value, it will be attempted to be added to the initial
-        .subgit.yml config file as the first repo in your config. If these values is anything else the initial
-        config vill we written as empty.
-        """
+            if is_same:
+                log.debug(f"Sparse checkout on repo {name} is already up to date")
+                return
 
-        if self.subgit_config_file_path.exists():
-            log.error(f"File '{self.subgit_config_file_name}' already exists on disk")
-            return 1
+        log.info(f"Enable sparse checkout on repo {name}")
 
-        tmp_config = DEFAULT_REPO_DICT
+        # Set what paths we defined to be checked out. This will also enable sparse checkout
+        # on the repo if it was not enabled before. In worktrees git can write to the git config
+        # that all worktrees share, so it is done under the lock of the object database.
+        with self._get_repo_lock(repo):
+            repo.git.sparse_checkout("set", "--cone" if cone else "--no-cone", *sparse_paths)
 
-        if isinstance(repo_name, str) and isinstance(repo_url, str):
-            log.info(f"Adding initial git repo '{repo_name}' with url '{repo_url}' to your config")
-            tmp_config["repos"].append({
-                "name": repo_name,
-                "url": repo_url,
-                "revision": {"branch": "master"}
-            })
+    def _resolve_tag(self, name, tag_config, tag_names, timestamps=None):
+        """
+        Runs the filter, order and select steps from the revision.tag config over a list of tag names.
 
-        self._dump_config_file(tmp_config)
-        log.info(f'Successfully wrote new config file "{self.subgit_config_file_name}" to disk')
+        A filter regex with a group only keeps a part of the tag name, like 1.0.0 out of v1.0.0. The
+        selected value is mapped back to the tag it came from so the returned value is always the
+        full name of an existing tag. Returns None if no tag could be selected.
 
-    def _get_config_file(self):
-        if not self.subgit_config_file_path.exists():
-            log.error(f"No {self.subgit_config_file_path} file exists in current CWD")
-            sys.exit(1)
+        If the tags is ordered by time, timestamps must be a dict of tag name and creation time.
+        """
+        query = TagQuery(*self._parse_tag_config(name, tag_config))
 
-        with open(self.subgit_config_file_path, "r") as stream:
-            return yaml.load(
-                stream,
-                Loader=yaml.Loader,
-            )
-            # TODO: Minimal required data should be 'repos:'
-            #       Raise error if missing from loaded config
+        return query.select(tag_names, timestamps)
 
-    def _dump_config_file(self, config_data):
+    def _get_local_tags(self, repo):
         """
-        Writes the entire config file to the given disk path set
-        in the method constructor.
+        Lists all tags in a local repo with a single git for-each-ref call.
+
+        Returns a tuple of (tag_names, timestamps) where tag_names is ordered by the time each tag
+        was created, and timestamps is a dict of tag name and creation time as unix timestamp. The
+        creation time is the tagger date for annotated tags and the committer date for lightweight tags.
         """
-        with open(self.subgit_config_file_path, "w") as stream:
-            yaml.dump(
-                config_data,
-                stream,
-                indent=2,
-                default_flow_style=False,
-            )
+        output = repo.git.for_each_ref(
+            "--sort=creatordate",
+            "--format=%(creatordate:unix) %(refname:strip=2)",
+            "refs/tags",
+        )
 
-    def repo_status(self):
-        self._get_recursive_config_path()
-        config = self._get_config_file()
-        repos = config.get("repos", {})
+        tag_names = []
+        timestamps = {}
 
-        if not repos:
-            print("  No repos found")
-            return 1
+        for line in output.splitlines():
+            timestamp, tag_name = line.split(" ", 1)
+            tag_names.append(tag_name)
+            timestamps[tag_name] = int(timestamp) if timestamp else 0
 
-        for repo_data in repos:
-            repo_name = repo_data["name"]
+        return tag_names, timestamps
 
-            print(f"{repo_name}")
-            print(f"  Url: {repo_data.get('url', 'NOT SET')}")
+    def _parse_tag_config(self, name, tag_config):
+        """
+        Parse and extract out all relevant config options from a revision.tag block and determine
+        if they are nested dicts or single values. The values will later be used as input into
+        the filter, order and select steps.
 
-            repo_disk_path = Path().cwd() / repo_name
-            print(f"  Disk path: {repo_disk_path}")
+        Returns a tuple of (filter_config, order_algorithm, select_config, select_method)
+        """
+        if isinstance(tag_config, str):
+            # All options should be set to default'
+            filter_config = []
+            order_algorithm = OrderAlgorithms.SEMVER
+            order_config = None
+            select_config = tag_config
+            select_method = SelectionMethods.SEMVER
+        elif isinstance(tag_config, dict):
+            # If "filter" key is not specified then we should not filter anything and keep all values
+            filter_config = tag_config.get("filter", [])
+
+            # If we do not have a list, convert it internally first
+            if isinstance(filter_config, str):
+                filter_config = [filter_config]
+
+            if not isinstance(filter_config, list):
+                raise SubGitConfigException("filter option must be a list of items or a single string")
+
+            order_config = tag_config.get("order", None)
+            if order_config is None:
+                order_algorithm = OrderAlgorithms.SEMVER
+            else:
+                order_algorithm = OrderAlgorithms.__members__.get(order_config.upper(), None)
 
-            try:
-                repo = Repo(repo_disk_path)
-                cloned_to_disk = True
-            except git.exc.NoSuchPathError:
-                cloned_to_disk = False
+                if order_algorithm is None:
+                    raise SubGitConfigException(f"Unsupported order algorithm chose: {order_config.upper()}")
 
-            print(f"  Cloned: {'Yes' if cloned_to_disk else 'No'}")
+            select_config = tag_config.get("select", None)
+            select_method = None
+            if select_config is None:
+                raise SubGitConfigException("select key is required in all tag revisions")
 
-            if cloned_to_disk:
-                file_cwd = Path().cwd() / repo_name / ".git/FETCH_HEAD"
+            log.debug(f"select_config: {select_config}")
 
-                if file_cwd.exists():
-                    output, stderr = run_cmd(f"stat -c %y {file_cwd}")
-                    parsed_output = str(output).replace('\\n', '')
+            # We have sub options to extract out
+            if isinstance(select_config, dict):
+                select_method_value = select_config["method"]
+                select_config = select_config["value"]
 
-                    print(f"  Last pull/fetch: {parsed_output}")
-                else:
-                    print("  Last pull/fetch: Repo has not been pulled or fetch since initial clone")
-            else:
-                print("  Last pull/fetch: UNKNOWN repo not cloned to disk")
+                log.debug(f"select_method: {select_method_value}")
 
-            if cloned_to_disk:
-                repo = Repo(repo_disk_path)
-                print(f"  Repo is dirty? {'Yes' if repo.is_dirty() else 'No'}")
+                select_method = SelectionMethods.__members__.get(select_method_value.upper(), None)
+
+                if select_method is None:
+                    raise SubGitConfigException(f"Unsupported select method chosen: {select_method_value.upper()}")
             else:
-                print("  Repo is dirty? ---")
-
-            branch = repo_data['revision'].get('branch', '---')
-            commit = repo_data['revision'].get('commit', '---')
-            tag = repo_data['revision'].get('tag', '---')
-
-            print("  Revision:")
-
-            print(f"    branch: {branch}")
-            if branch != "---":
-                if cloned_to_disk:
-                    if branch in repo.heads:
-                        commit_hash = str(repo.heads[branch].commit)
-                        commit_message = str(repo.heads[branch].commit.summary)
-                        has_new = repo.remotes.origin.refs["master"].commit != repo.heads[branch].commit
-                        is_in_origin = f"{branch in repo.remotes.origin.refs}"
-                    else:
-                        commit_hash = "Local branch not found"
-                        commit_message = "Local branch not found"
-                        has_new = "---"
-                        is_in_origin = "Local branch not found"
-                else:
-                    commit_hash = "Repo not cloned to disk"
-                    commit_message = "Repo not cloned to disk"
-                    has_new = "Repo not cloned to disk"
-                    is_in_origin = "Repo not cloned to disk"
-
-                print(f"      commit hash: {commit_hash}")
-                print(f"      commit message: '{commit_message}'")
-                print(f"      branch exists in origin? {is_in_origin}")
-                print(f"      has newer commit in origin? {has_new}")
-
-            print(f"    commit: {commit}")
-            if commit != "---":
-                print("FIXME: Not implemented yet")
-
-            # Extract tag from inner value if that is set
-            #  {revision: {tag: {select: {value: foo}}}}
-            if isinstance(tag, dict):
-                tag = tag["select"]
+                select_method = SelectionMethods.SEMVER
+        else:
+            raise SubGitConfigException(f"Key revision.tag for repo {name} must be a string or dict object")
 
-                if isinstance(tag, dict):
-                    tag = tag["value"]
+        log.debug(f"{filter_config}")
+        log.debug(f"{order_config}")
+        log.debug(f"{order_algorithm}")
+        log.debug(f"{select_config}")
+        log.debug(f"{select_method}")
 
-            print(f"    tag: {tag}")
+        return filter_config, order_algorithm, select_config, select_method
 
-            if tag != "---":
-                if cloned_to_disk:
-                    if tag in repo.tags:
-                        commit_hash = str(repo.tags[tag].commit)
-                        commit_summary = str(repo.tags[tag].commit.summary)
-                    else:
-                        commit_hash = "Tag not found"
-                        commit_summary = "---"
-                else:
-                    commit_hash = "Repo not cloned to disk"
-                    commit_summary = "Repo not cloned to disk"
+    def _get_unchanged_sha(self, repo_data):
+        """
+        Compares the revision of a cloned repo in the remote, using a single git ls-remote call, with
+        the current HEAD of the local repo.
 
-                print(f"      commit hash: {commit_hash}")
-                print(f"      commit message: '{commit_summary}'")
+        Returns the sha of HEAD if the repo already is at the latest commit of the revision and a pull
+        would not change anything, otherwise None.
+        """
+        repo_path = Path().cwd() / repo_data["name"]
+        revision = repo_data["revision"]
 
-            print("")
+        if not repo_path.exists():
+            return None
 
-    def yes_no(self, question):
-        print(question)
+        repo = Repo(repo_path)
+        local_sha = repo.head.commit.hexsha
+        url = repo.remotes.origin.url
 
-        if self.answer_yes:
-            log.info("--yes flag set, automatically answer yes to question")
-            return True
+        if "branch" in revision:
+            # If we are on another branch we must checkout the configured branch
+            if not self._is_on_branch(repo, revision["branch"]):
+                return None
 
-        answer = input("(y/n) << ")
+            ref = f"refs/heads/{revision['branch']}"
+            remote_sha = self._ls_remote(url, ref).get(ref, None)
+        elif "tag" in revision:
+            # The remote can't tell when each tag was created, so a time ordered tag is always pulled
+            if self._parse_tag_config(repo_data["name"], revision["tag"])[1] == OrderAlgorithms.TIME:
+                return None
 
-        return answer.lower().startswith("y")
+            _, remote_sha = self._resolve_remote_tag(repo_data["name"], url, revision["tag"])
+        else:
+            return None
 
-    def fetch(self, repos):
-        """
-        Runs "git fetch" on one or more git repos.
+        return local_sha if remote_sha == local_sha else None
 
-        To fetch all enabled repos send in None as value.
+    def _has_commit(self, repo, sha):
+        """
+        Returns True if the commit exists in the local repo
+        """
+        try:
+            repo.git.cat_file("-e", f"{sha}^{{commit}}")
+        except git.exc.GitCommandError:
+            return False
 
-        To fetch a subset of repo names, send in them as a list of strings.
+        return True
 
-        A empty list of items will not fetch any repo.
+    @contextmanager
+    def _remove_new_repo_on_failure(self, repo_path):
         """
-        self._get_recursive_config_path()
+        Removes the repo at repo_path if it is created within the context and an exception is raised.
 
-        log.debug(f"repo fetch input - {repos}")
+        Pulls that creates an empty repo and then fetches into it would otherwise leave the empty repo
+        behind on failure, and it would be seen as an already cloned repo by the next pull and plan.
+        """
+        is_new_repo = not repo_path.exists()
 
-        config = self._get_config_file()
+        try:
+            yield
+        except Exception:
+            if is_new_repo and repo_path.exists():
+                log.debug(f"Removing {repo_path} as the pull of the new repo failed")
 
-        repos_to_fetch = []
+                for trash_path in self._remove_repo(repo_path):
+                    shutil.rmtree(trash_path, ignore_errors=True)
 
-        if repos is None:
-            for repo_data in config["repos"]:
-                repo_name = repo_data["name"]
-                repos_to_fetch.append(repo_name)
+            raise
 
-        if isinstance(repos, list):
-            for repo_data in repos:
-                repo_name = repo_data["name"]
+    def _open_or_init_repo(self, repo_data, clone_options):
+        """
+        Opens the local repo, or creates it if it is not on disk, for pulls that only fetch a
+        single commit or ref.
 
-                if repo_name in config["repos"]:
-                    repos_to_fetch.append(repo_name)
-                else:
-                    log.warning(f"repo '{repo_name}' not found in configuration")
+        A single commit or tag can't be cloned directly, instead we build the same repo as a clone
+        would do and then only fetch what we want. New repos is fetched shallow unless a clone
+        depth is configured, and repos that already is shallow stays shallow.
 
-        log.info(f"repos to fetch: {repos_to_fetch}")
+        Returns a tuple of (repo, depth) where depth is the depth to fetch with or None for a full fetch.
+        """
+        repo_path = Path().cwd() / repo_data["name"]
+        is_new_repo = not repo_path.exists()
 
-        if len(repos_to_fetch) == 0:
-            log.error("No repos to fetch found")
-            return 1
+        # Repos in a shared object database gets the database here, and the worktree is added once
+        # the commit to checkout is fetched
+        if is_new_repo and "shared_store" in clone_options:
+            repo_path = Path(clone_options["shared_store"])
 
-        missing_any_repo = False
+            with self._get_repo_lock(repo_path):
+                if repo_path.exists():
+                    repo = self._open_shared_store(repo_path)
+                else:
+                    repo = self._init_repo(repo_path, repo_data["url"], clone_options, bare=True)
+                    return repo, clone_options.get("depth", 1)
+        elif not is_new_repo:
+            repo = Repo(repo_path)
+        else:
+            repo = self._init_repo(repo_path, repo_data["url"], clone_options)
+            return repo, clone_options.get("depth", 1)
 
-        for repo_name in repos_to_fetch:
-            try:
-                repo_path = Path().cwd() / repo_name
-                Repo(repo_path)
-            except git.exc.NoSuchPathError:
-                log.error(f"Repo {repo_name} not found on disk. You must pull to do a initial clone before fetching can be done")
-                missing_any_repo = True
+        depth = clone_options.get("depth", None)
 
-        if missing_any_repo:
-            return 1
+        if repo.git.rev_parse("--is-shallow-repository") == "true":
+            depth = depth or 1
 
-        with Pool(WORKER_COUNT) as pool:
-            pool.map(self.fetch_repo, repos_to_fetch)
+        return repo, depth
 
-        log.info("Fetching for all repos completed")
-        return 0
+    def _init_repo(self, repo_path, url, clone_options, bare=False):
+        """
+        Creates an empty repo with the origin remote, set up in the same way as a clone with
+        the clone options would do it.
+        """
+        repo = Repo.init(repo_path, bare=bare)
+        repo.create_remote("origin", url)
 
-    def fetch_repo(self, repo_name):
-        repo_path = Path().cwd() / repo_name
-        git_repo = Repo(repo_path)
+        # Same as 'git clone --reference-if-able', borrow objects from the mirror in the object cache
+        if "reference_if_able" in clone_options:
+            alternates_path = Path(repo.git_dir) / "objects" / "info" / "alternates"
+            alternates_path.parent.mkdir(parents=True, exist_ok=True)
+            alternates_path.write_text(f"{Path(clone_options['reference_if_able']) / 'objects'}\n")
 
-        log.info(f"Fetching git repo '{repo_name}'")
-        fetch_results = git_repo.remotes.origin.fetch()
-        log.info(f"Fetching completed for repo '{repo_name}'")
+        if "filter" in clone_options:
+            with repo.config_writer() as config_writer:
+                config_writer.set_value('remote "origin"', "promisor", True)
+                config_writer.set_value('remote "origin"', "partialclonefilter", clone_options["filter"])
 
-        for fetch_result in fetch_results:
-            log.info(f" - Fetch result: {fetch_result.name}")
+        return repo
 
-    def _get_active_repos(self, config):
+    def _dissociate_repo(self, repo):
         """
-        Helper method that will return only the repos that is enabled and active for usage
+        Copies all objects that a repo borrows from a mirror in the object cache into the repo itself
+        and removes the alternates, the same as 'git clone --dissociate' do. Worktrees dissociates
+        their shared object database.
         """
-        active_repos = []
-
-        for repo_data in config.get("repos", []):
-            repo_name = repo_data["name"]
+        alternates_path = Path(repo.common_dir) / "objects" / "info" / "alternates"
 
-            if repo_data.get("enable", True):
-                active_repos.append(repo_name)
+        with self._get_repo_lock(repo):
+            if not alternates_path.exists():
+                return
 
-        return active_repos
+            # Without --local, repack -a also packs all objects that is reachable through the alternates
+            repo.git.repack("-a", "-d")
+            alternates_path.unlink()
 
-    def pull(self, names):
+    def _pull_remote_tag(self, repo_data, clone_options):
         """
-        To pull all repos defined in the configuration send in names=None
+        Pulls a tag revision by running the tag selection over the tags in the remote repo, and then
+        only fetching the selected tag. Repos that is not on disk is created with a shallow fetch
+        of the tag instead of a full clone.
 
-        To pull a subset of repos send in a list of strings names=["repo1", "repo2"]
+        Returns a short summary string of the end result for the repo.
         """
-        self._get_recursive_config_path()
+        name = repo_data["name"]
+        log.info(f'Pulling repo "{name}" with remote tag resolution')
 
-        log.debug(f"Repo pull - {names}")
+        tag_name, sha = self._resolve_remote_tag(name, repo_data["url"], repo_data["revision"]["tag"])
 
-        config = self._get_config_file()
+        if not tag_name:
+            raise SubGitRepoException("No git tag could be parsed out with the current repo configuration")
 
-        active_repos = self._get_active_repos(config)
+        repo, depth = self._open_or_init_repo(repo_data, clone_options)
 
-        repos = []
+        with self._get_repo_lock(repo):
+            if not self._has_commit(repo, sha):
+                fetch_kwargs = {"depth": depth} if depth else {}
+                repo.remotes.origin.fetch(f"+refs/tags/{tag_name}:refs/tags/{tag_name}", no_tags=True, **fetch_kwargs)
 
-        if len(active_repos) == 0:
-            log.error("There is no repos defined or enabled in the config")
-            return 1
+        if self._is_shared_store(repo):
+            repo = self._add_worktree(repo, Path().cwd() / name, sha)
 
-        if names is None:
-            repos = config.get("repos", [])
-            repo_choices = ", ".join(active_repos)
+        self._set_sparse_checkout(repo, repo_data)
 
-            answer = self.yes_no(f"Are you sure you want to 'git pull' the following repos '{repo_choices}'")
+        repo.git.checkout("--detach", sha)
 
-            if not answer:
-                log.warning("User aborted pull step")
-                return 1
-        elif isinstance(names, list):
-            # Validate that all provided repo names exists in the config
-            for name in names:
-                if name not in active_repos:
-                    choices = ", ".join(active_repos)
-                    log.error(f'Repo with name "{name}" not found in config file. Choices are "{choices}"')
-                    return 1
+        log.info(f"Checked out tag '{tag_name}' for repo '{name}'")
 
-                for repo_data in config["repos"]:
-                    if repo_data["name"] == name:
-                        repos.append(repo_data)
-        else:
-            log.debug(f"Names {names}")
-            raise SubGitConfigException("Unsuported value type for argument names")
+        return f"tag '{tag_name}' at {sha}"
 
-        if not repos:
-            raise SubGitConfigException("No valid repositories found")
+    def _pull_locked_repo(self, repo_data, clone_options, lock_entry):
+        """
+        Moves a single repo to the exact commit from its lock file entry.
 
-        # Validation step across all repos to manipulate that they are not dirty
-        # or anything uncommited that would break the code trees.
-        #
-        # Abort out if any repo is bad.
+        Only the locked commit is fetched, and no fetch is done at all if the commit already exists in
+        the local repo. Repos that is not on disk is created with a shallow fetch of the locked commit,
+        unless a clone depth is configured.
 
-        has_dirty = False
+        Returns a short summary string of the end result for the repo.
+        """
+        name = repo_data["name"]
+        sha = lock_entry["sha"]
+        ref = lock_entry.get("ref", None)
+        log.info(f'Pulling repo "{name}" at locked commit {sha}')
 
-        for repo_data in repos:
-            name = repo_data["name"]
-            repo_path = Path().cwd() / name
+        repo, depth = self._open_or_init_repo(repo_data, clone_options)
 
-            # If the path do not exists then the repo can't be dirty
-            if not repo_path.exists():
-                continue
+        with self._get_repo_lock(repo):
+            if not self._has_commit(repo, sha):
+                fetch_kwargs = {"depth": depth} if depth else {}
 
-            repo = Repo(repo_path)
+                try:
+                    repo.remotes.origin.fetch(sha, **fetch_kwargs)
+                except git.exc.GitCommandError as e:
+                    # Not all servers allows fetching a commit directly, fall back to the locked ref
+                    if not ref:
+                        raise SubGitRepoException(f"Unable to fetch locked commit {sha}: {e}") from e
+
+                    log.debug(f"Unable to fetch commit {sha} directly, fetching ref {ref} instead")
+                    repo.remotes.origin.fetch(ref, **fetch_kwargs)
+
+                if not self._has_commit(repo, sha):
+                    raise SubGitRepoException(f"Locked commit {sha} not found in remote repo, run 'subgit lock' to update the lock file")
+
+        if self._is_shared_store(repo):
+            repo = self._add_worktree(repo, Path().cwd() / name, sha)
+
+        self._set_sparse_checkout(repo, repo_data)
+
+        if ref and ref.startswith("refs/heads/"):
+            branch = ref[len("refs/heads/"):]
+            self._checkout_branch(repo, branch, sha)
+            summary = f"locked branch '{branch}' at {sha}"
+        elif ref:
+            repo.git.checkout("--detach", sha)
+            summary = f"locked tag '{ref[len('refs/tags/'):]}' at {sha}"
+        else:
+            repo.git.checkout("--detach", sha)
+            summary = f"locked commit {sha}"
 
-            # A dirty repo means there is uncommited changes in the tree
-            if repo.is_dirty():
-                log.error(f'The repo "{name}" is dirty and has uncommited changes in the following files')
-                dirty_files = [item.a_path for item in repo.index.diff(None)]
+        log.info(f"Checked out locked commit {sha} for repo '{name}'")
 
-                for file in dirty_files:
-                    log.info(f" - {file}")
+        return summary
 
-                has_dirty = True
+    def _resolve_local_tag_cached(self, repo, name, tag_config, use_cache=True, read_only=False):
+        """
+        Runs the tag selection over the tags in a local repo, through the tag cache in the git folder
+        of the repo. When neither the tags in the repo or the tag config has changed since the last
+        pull, the tag is taken directly from the cache w/o listing any tags.
 
-        if has_dirty:
-            log.error("\nFound one or more dirty repos. Resolve it before continue...")
-            return 1
+        Set use_cache=False to always list and select the tags and leave the cache untouched. With
+        read_only=True the cache is used but never written to.
 
-        bad_repo_configs = []
+        Returns the name of the selected tag or None if no tag could be selected.
+        """
+        if not use_cache:
+            tag_names, timestamps = self._get_local_tags(repo)
+            return self._resolve_tag(name, tag_config, tag_names, timestamps)
 
-        for repo_data in repos:
-            name = repo_data["name"]
-            revision = repo_data["revision"]
+        tag_cache = TagCache(repo.git_dir, repo.common_dir)
+        tag_name = tag_cache.get_resolved(tag_config)
 
-            if "branch" in revision:
-                if not revision["branch"]:
-                    bad_repo_configs.append(name)
+        if tag_name is not None:
+            log.debug(f"Using cached tag '{tag_name}' for repo '{name}'")
 
-        if bad_repo_configs:
-            bad_repos_string = ", ".join(repo for repo in bad_repo_configs)
-            log.error(f"One or more repos in congif file has an invalid branch option... {bad_repos_string}")
-            return 1
+            if not read_only:
+                tag_cache.save()
 
-        # Repos looks good to be pulled. Run the pull logic for each repo in sequence
+            return tag_name
 
-        for repo_data in repos:
-            name = repo_data["name"]
-            log.info("")
+        cached_tags = tag_cache.get_tags()
 
-            repo_path = Path().cwd() / name
-            revision = repo_data["revision"]
+        if cached_tags is None:
+            tag_names, timestamps = self._get_local_tags(repo)
+            tag_cache.set_tags(tag_names, timestamps)
+        else:
+            tag_names, timestamps = cached_tags
 
-            # Boolean value wether repo is newly cloned.
-            cloned = False
+        log.debug(f"Raw git tags from git repo {tag_names}")
 
-            if not repo_path.exists():
-                clone_url = repo_data.get("url", None)
-                cloned = True
+        tag_name = self._resolve_tag(name, tag_config, tag_names, timestamps)
 
-                if not clone_url:
-                    raise SubGitConfigException(f"Missing required key 'url' on repo '{name}'")
+        if read_only:
+            return tag_name
 
-                try:
-                    # Cloning a repo w/o a specific commit/branch/tag it will clone out whatever default
-                    # branch or where the origin HEAD is pointing to. After we clone we can then move our
-                    # repo to the correct revision we want.
-                    repo = Repo.clone_from(
-                        repo_data["url"],
-                        repo_path,
-                    )
-                    log.info(f'Successfully cloned repo "{name}" from remote server')
-                except Exception as e:
-                    raise SubGitException(f'Clone "{name}" failed, exception: {e}') from e
+        if tag_name is not None:
+            tag_cache.set_resolved(tag_config, tag_name)
 
-            log.debug("TODO: Parse for any changes...")
-            # TODO: Check that origin remote exists
+        tag_cache.save()
 
-            p = Path().cwd() / name
-            repo = Repo(p)
-            g = Git(p)
+        return tag_name
 
-            # Fetch all changes from upstream git repo
-            repo.remotes.origin.fetch()
+    def _pull_repo(self, repo_data, clone_options=None, all_refs=False, use_cache=True, fetch=True):
+        """
+        Runs all pull steps for a single repo. Clones the repo if it is not present on disk,
+        fetches from origin and moves the repo to the configured revision.
 
-            # How to handle the repo when a branch is specified
-            if "branch" in revision:
-                log.debug("Handling branch pull case")
-
-                # Extract the sub tag data
-                branch_revision = revision["branch"]
-
-                if not cloned:
-                    try:
-                        latest_remote_sha = str(repo.rev_parse(f"origin/{branch_revision}"))
-                        latest_local_sha = str(repo.head.commit.hexsha)
-
-                        if latest_remote_sha != latest_local_sha:
-                            repo.remotes.origin.pull()
-                    except git.exc.BadName as er:
-                        log.error(er)
-
-                # Ensure the local version of the branch exists and points to the origin ref for that branch
-                repo.create_head(f"{branch_revision}", f"origin/{branch_revision}")
-
-                # Checkout the selected revision
-                # TODO: This only support branches for now
-                repo.heads[branch_revision].checkout()
-
-                log.info(f'Successfully pull repo "{name}" to latest commit on branch "{branch_revision}"')
-                log.info(f"Current git hash on HEAD: {str(repo.head.commit)}")
-            elif "tag" in revision:
-                #
-                # Parse and extract out all relevant config options and determine if they are nested
-                # dicts or single values. The values will later be used as input into each operation.
-                #
-                tag_config = revision["tag"]
-
-                if isinstance(tag_config, str):
-                    # All options should be set to default'
-                    filter_config = []
-                    order_algorithm = OrderAlgorithms.SEMVER
-                    order_config = None
-                    select_config = tag_config
-                    select_method = SelectionMethods.SEMVER
-                elif isinstance(tag_config, dict):
-                    # If "filter" key is not specified then we should not filter anything and keep all values
-                    filter_config = tag_config.get("filter", [])
-
-                    # If we do not have a list, convert it internally first
-                    if isinstance(filter_config, str):
-                        filter_config = [filter_config]
-
-                    if not isinstance(filter_config, list):
-                        raise SubGitConfigException("filter option must be a list of items or a single string")
-
-                    order_config = tag_config.get("order", None)
-                    if order_config is None:
-                        order_algorithm = OrderAlgorithms.SEMVER
-                    else:
-                        order_algorithm = OrderAlgorithms.__members__.get(order_config.upper(), None)
+        Repos with a 'shared_store' clone option is added as a worktree from that shared object
+        database instead of being cloned. Set fetch=False when the refs for the repo already was
+        fetched into the shared object database.
 
-                        if order_algorithm is None:
-                            raise SubGitConfigException(f"Unsupported order algorithm chose: {order_config.upper()}")
+        Tag revisions is resolved through the tag cache of the repo unless use_cache=False.
 
-                    select_config = tag_config.get("select", None)
-                    select_method = None
-                    if select_config is None:
-                        raise SubGitConfigException("select key is required in all tag revisions")
+        Returns a short summary string of the end result for the repo.
+        """
+        name = repo_data["name"]
+        log.info(f'Pulling repo "{name}"')
 
-                    log.debug(f"select_config: {select_config}")
+        repo_path = Path().cwd() / name
+        revision = repo_data["revision"]
+        clone_options = clone_options or {}
 
-                    # We have sub options to extract out
-                    if isinstance(select_config, dict):
-                        select_method_value = select_config["method"]
-                        select_config = select_config["value"]
+        # Fetch the refs needed for the revision from upstream git repo
+        refspec, fetch_kwargs = self._get_fetch_args(revision, clone_options, all_refs)
 
-                        log.debug(f"select_method: {select_method_value}")
+        if not repo_path.exists() and "shared_store" in clone_options:
+            store, _ = self._open_or_init_repo(repo_data, clone_options)
 
-                        select_method = SelectionMethods.__members__.get(select_method_value.upper(), None)
+            if fetch:
+                with self._get_repo_lock(store):
+                    store.remotes.origin.fetch(refspec, **fetch_kwargs)
 
-                        if select_method is None:
-                            raise SubGitConfigException(f"Unsupported select method chosen: {select_method_value.upper()}")
-                    else:
-                        select_method = SelectionMethods.SEMVER
-                else:
-                    raise SubGitConfigException(f"Key revision.tag for repo {name} must be a string or dict object")
+                fetch = False
+
+            # The worktree starts out at any fetched commit, it is moved to the revision below
+            if "branch" in revision:
+                ref_patterns = [f"refs/remotes/origin/{revision['branch']}"]
+            else:
+                ref_patterns = ["refs/remotes/origin", "refs/tags"]
+
+            start_commit = store.git.for_each_ref("--count=1", "--format=%(objectname)", *ref_patterns)
 
-                log.debug(f"{filter_config}")
-                log.debug(f"{order_config}")
-                log.debug(f"{order_algorithm}")
-                log.debug(f"{select_config}")
-                log.debug(f"{select_method}")
+            if not start_commit:
+                raise SubGitRepoException(f"No commit found in origin for repo '{name}'")
 
-                # Main tag parsing logic
+            self._add_worktree(store, repo_path, start_commit)
+            log.info(f'Successfully added repo "{name}" as a worktree from {store.git_dir}')
+        elif not repo_path.exists():
+            clone_kwargs = dict(clone_options)
 
-                git_repo_tags = list(repo.tags)
-                log.debug(f"Raw git tags from git repo {git_repo_tags}")
+            # A branch revision can be cloned directly. Tags must be resolved after the clone
+            # so they will start out from whatever default branch origin HEAD is pointing to.
+            if "branch" in revision:
+                clone_kwargs["branch"] = revision["branch"]
+
+            # Sparse repos is cloned w/o a checkout so that the sparse paths can be configured
+            # before the first checkout, and only the selected paths is ever written to disk.
+            if repo_data.get("sparse", None) and ("branch" in revision or "tag" in revision):
+                clone_kwargs["no_checkout"] = True
+
+            try:
+                # Cloning a repo w/o a specific commit/branch/tag it will clone out whatever default
+                # branch or where the origin HEAD is pointing to. After we clone we can then move our
+                # repo to the correct revision we want.
+                repo = Repo.clone_from(
+                    repo_data["url"],
+                    repo_path,
+                    **clone_kwargs,
+                )
+                log.info(f'Successfully cloned repo "{name}" from remote server')
+            except Exception as e:
+                raise SubGitException(f'Clone "{name}" failed, exception: {e}') from e
+
+        log.debug("TODO: Parse for any changes...")
+        # TODO: Check that origin remote exists
+
+        repo = Repo(repo_path)
+        g = Git(repo_path)
+
+        if fetch:
+            with self._get_repo_lock(repo):
+                repo.remotes.origin.fetch(refspec, **fetch_kwargs)
+
+        # Sparse checkout must be configured before we move to the new revision so that the
+        # checkout only needs to update the files within the sparse paths.
+        self._set_sparse_checkout(repo, repo_data)
+
+        # How to handle the repo when a branch is specified
+        if "branch" in revision:
+            log.debug("Handling branch pull case")
+
+            # Extract the sub tag data
+            branch_revision = revision["branch"]
 
-                filter_output = self._filter(git_repo_tags, filter_config)
+            try:
+                remote_commit = repo.commit(f"origin/{branch_revision}")
+            except (git.exc.BadName, ValueError) as e:
+                raise SubGitRepoException(f"Branch '{branch_revision}' not found in origin for repo '{name}'") from e
+
+            # Everything we need was downloaded by the fetch above, so the local branch is moved to the origin
+            # ref for that branch locally instead of doing a 'git pull' that would fetch everything once more.
+            # It is only moved if that is a fast-forward, local commits that is not in origin is never dropped.
+            if self._is_worktree(repo) and repo.head.is_detached:
+                if self._get_local_commit_count(repo.git):
+                    raise SubGitRepoException("HEAD has commits that is not in any remote branch or tag, push or reset them before pulling")
+            elif branch_revision in repo.heads:
+                local_commit = repo.heads[branch_revision].commit
+
+                if local_commit != remote_commit and not repo.is_ancestor(local_commit, remote_commit):
+                    raise SubGitRepoException(
+                        f"Local branch '{branch_revision}' has commits that is not in 'origin/{branch_revision}', "
+                        "push or reset them before pulling"
+                    )
 
-                # # FIXME: If we choose time as sorting method we must convert the data to a new format
-                # #        that the order algorithm allows.
-                # if order_algorithm == OrderAlgorithms.TIME:
-                #     pass
+            # Create or move the local branch to the origin ref, and checkout it. This works no matter
+            # what branch HEAD was on before.
+            self._checkout_branch(repo, branch_revision, f"origin/{branch_revision}")
 
-                order_output = self._order(filter_output, order_algorithm)
-                select_output = self._select(order_output, select_config, select_method)
-                log.debug(select_output)
+            log.info(f'Successfully pull repo "{name}" to latest commit on branch "{branch_revision}"')
+            log.info(f"Current git hash on HEAD: {str(repo.head.commit)}")
 
-                if not select_output:
-                    raise SubGitRepoException("No git tag could be parsed out with the current repo configuration")
+            summary = f"branch '{branch_revision}' at {repo.head.commit.hexsha}"
+        elif "tag" in revision:
+            # Main tag parsing logic
 
-                log.info(f"Attempting to checkout tag '{select_output}' for repo '{name}'")
+            select_output = self._resolve_local_tag_cached(repo, name, revision["tag"], use_cache)
+            log.debug(select_output)
 
-                # Otherwise atempt to checkout whatever we found. If our selection is still not something valid
-                # inside the git repo, we will get sub exceptions raised by git module.
-                g.checkout(select_output)
+            if not select_output:
+                raise SubGitRepoException("No git tag could be parsed out with the current repo configuration")
 
-                log.info(f"Checked out tag '{select_output}' for repo '{name}'")
-                log.info(f"Current git hash on HEAD: {str(repo.head.commit)}")
-                log.info(f"Current commit summary on HEAD in git repo '{name}': ")
-                log.info(f"  {str(repo.head.commit.summary)}")
+            log.info(f"Attempting to checkout tag '{select_output}' for repo '{name}'")
 
-            # Handle sparse checkout by configure the repo
-            sparse_repo_config = repo_data.get("sparse", None)
+            # Otherwise atempt to checkout whatever we found. If our selection is still not something valid
+            # inside the git repo, we will get sub exceptions raised by git module.
+            g.checkout(select_output)
 
-            if sparse_repo_config:
-                log.info(f"Enable sparse checkout on repo {name}")
+            log.info(f"Checked out tag '{select_output}' for repo '{name}'")
+            log.info(f"Current git hash on HEAD: {str(repo.head.commit)}")
+            log.info(f"Current commit summary on HEAD in git repo '{name}': ")
+            log.info(f"  {str(repo.head.commit.summary)}")
 
-                # Always ensure that sparse is enabled
-                g.sparse_checkout("init")
+            summary = f"tag '{select_output}' at {repo.head.commit.hexsha}"
+        else:
+            # A new worktree has no checkout yet, populate it at the commit it was added at
+            if self._is_worktree(repo) and not repo.git.ls_files("--cached", "--", "."):
+                repo.git.checkout("--detach", "HEAD")
 
-                repos = [
-                    str(path)
-                    for path in sparse_repo_config["paths"]
-                ]
+            summary = f"at {repo.head.commit.hexsha}"
 
-                # Set what paths we defined to be checked out
-                g.sparse_checkout("set", *repos)
+        if repo_data.get("sparse", None):
+            # List all items (files and directories) in the repo
+            items = list(repo_path.iterdir())
 
-                # List all items (files and directories) in the cwd
-                items = list(p.iterdir())
+            # Filter out the '.git' folder
+            visible_items = [
+                item
+                for item in items
+                if item.name != '.git'
+            ]
 
-                # Filter out the '.git' folder
-                visible_items = [
-                    item
-                    for item in items
-                    if item.name != '.git'
-                ]
+            log.debug(f"Visible items after filtering {visible_items}")
 
-                log.debug(f"Visible items after filtering {visible_items}")
+            if len(visible_items) == 0:
+                log.warning("You have sparse checkout enabled but no files was found in the git repo after your filter. Possible that your paths do not match any content in the git repo.")
 
-                if len(visible_items) == 0:
-                    log.warning("You have sparse checkout enabled but no files was found in the git repo after your filter. Possible that your paths do not match any content in the git repo.")
-            else:
-                # By always setting disable as a default, this will automatically revert any repo
-                # that used to have sparse enabled but no longer is ensabled
-                log.debug(f"Disabling sparse checkout on repo {name}")
-                g.sparse_checkout("disable")
+        return summary
 
-    def delete(self, repo_names=None):
+    def delete(self, repo_names=None, wait=False, jobs=None):
         """
         Helper method that recieves a list of repos. Deletes them as long as not one or
         more of them creates a conflict. (e.g repo(s) is not in the config file,
         path(s) is not to a valid git repo or repo(s) is dirty)
+
+        The repos is moved to the trash folder of the workspace, and the files in them is removed
+        in the background unless wait is set.
         """
         self._get_recursive_config_path()
         has_dirty_repos = False
@@ -650,19 +2752,25 @@ class SubGit():
         answer = self.yes_no(f"Are you sure you want to delete the following repos '{repo_choices}'?")
 
         if answer:
-            for path in repo_paths:
-                current_repo = Repo(path)
-
-                if self._check_remote(current_repo):
+            for path, analysis, exception in self._analyze_repos(repo_paths, jobs):
+                if exception:
+                    has_dirty_repos = True
+                    log.critical(f"'{path.name}' could not be checked for changes, {exception}")
+                elif analysis["has_changes"]:
                     has_dirty_repos = True
                     log.critical(f"'{path.name}' has some diff(s) in the local repo or the remote that needs be taken care of before deletion.")
+                    self._log_repo_changes(path, analysis, log.critical)
                 else:
                     good_repos.append(path)
 
             if not has_dirty_repos:
+                trash_paths = []
+
                 for repo in good_repos:
-                    shutil.rmtree(repo)
-                    log.info(f"Successfully removed repo: {path.name}")
+                    trash_paths.extend(self._remove_repo(repo))
+                    log.info(f"Successfully removed repo: {repo.name}")
+
+                self._empty_trash(trash_paths, wait=wait, jobs=jobs)
 
     def reset(self, repo_names=None, hard_flag=None):
         """
@@ -683,13 +2791,14 @@ class SubGit():
         answer = self.yes_no(f"Are you sure you want to reset the following repos '{repo_choices}'?")
 
         if answer:
-            for path in repo_paths:
-                current_repo = Repo(path)
-
-                if self._check_remote(current_repo):
+            for path, analysis, exception in self._analyze_repos(repo_paths):
+                if exception:
+                    log.error(f"'{path.name}' could not be checked for changes, {exception}")
+                elif analysis["has_changes"]:
                     dirty_repos.append(path)
+                    self._log_repo_changes(path, analysis, log.info)
                 else:
-                    log.info(f"{repo.name} is clean")
+                    log.info(f"{path.name} is clean")
 
             if not dirty_repos:
                 log.error("No repos found to reset. Exiting...")
@@ -723,10 +2832,10 @@ class SubGit():
         if not repo_paths:
             return 1
 
-        for path in repo_paths:
-            current_repo = Repo(path)
-
-            if self._check_remote(current_repo):
+        for path, analysis, exception in self._analyze_repos(repo_paths):
+            if exception:
+                log.error(f"'{path.name}' could not be checked for changes, {exception}")
+            elif analysis["has_changes"]:
                 dirty_repos.append(path)
 
         if not dirty_repos:
@@ -779,24 +2888,146 @@ class SubGit():
 
         return working_repos
 
-    def _check_remote(self, repo):
+    def _analyze_repos(self, repo_paths, jobs=None):
         """
-        Takes repo object and name of directory to check. Returns True if repo has either
-        differences in remote and local commits, and/or has any untracked files.
+        Runs _analyze_repo for each repo path in parallel.
+
+        Returns a list of (repo_path, analysis, exception) tuples in the same order as repo_paths.
         """
-        has_remote_difference = False
-        for remote in repo.remotes:
-            for branch in repo.branches:
-                try:
-                    remote_commit = remote.refs[str(branch)].commit
-                    local_commit = repo.heads[str(branch)].commit
-                except IndexError:
-                    has_remote_difference = True
+        worker_count = self._get_worker_count(self._get_config_file(), jobs, len(repo_paths))
+
+        return run_parallel(self._analyze_repo, repo_paths, worker_count)
+
+    def _analyze_repo(self, repo_path):
+        """
+        Finds all local changes in a repo, and how each local branch differs from the remotes, with one
+        'git status' and one 'git for-each-ref' call no matter how many branches and remotes the repo has.
+
+        Returns a dict with:
+
+          dirty_files: Tracked files with uncommited changes
+          untracked_files: Untracked files and directories
+          branches: Dict with the local branch name as key and a dict as value, with:
+            upstream: The upstream branch, or None if no upstream is set
+            ahead, behind: Number of commits the branch is ahead and behind its upstream, or None
+              if that is not known
+            in_sync: If the branch is at the same commit as its upstream, or if no upstream is set,
+              at the same commit as the branch with the same name in every remote that has it
+          has_changes: If there is any dirty or untracked file, or any branch that is not in sync
+        """
+        g = Git(repo_path)
+        dirty_files = []
+        untracked_files = []
+        head_branch = None
+
+        entries = iter(g.status("--porcelain=v2", "--branch", "--untracked-files=normal", "-z").split("\0"))
+
+        for entry in entries:
+            if entry.startswith("# branch.head "):
+                head_branch = entry[len("# branch.head "):]
+            elif entry.startswith("? "):
+                untracked_files.append(entry[2:])
+            elif entry.startswith("1 "):
+                dirty_files.append(entry.split(" ", 8)[8])
+            elif entry.startswith("2 "):
+                dirty_files.append(entry.split(" ", 9)[9])
+
+                # Renames and copies is followed by the original path
+                next(entries, None)
+            elif entry.startswith("u "):
+                dirty_files.append(entry.split(" ", 10)[10])
+
+        output = g.for_each_ref(
+            "--format=%(refname)%00%(objectname)%00%(upstream:short)%00%(upstream:track,nobracket)",
+            "refs/heads",
+            "refs/remotes",
+        )
+
+        local_branches = {}
+        remote_shas = {}
+
+        for line in output.splitlines():
+            ref_name, sha, upstream, track = line.split("\0")
+
+            if ref_name.startswith("refs/heads/"):
+                local_branches[ref_name[len("refs/heads/"):]] = (sha, upstream, track)
+            elif not ref_name.endswith("/HEAD"):
+                # refs/remotes/<remote>/<branch>, keyed on the branch name
+                remote_shas.setdefault(ref_name.split("/", 3)[3], []).append(sha)
+
+        branches = {}
+
+        # The branches in a shared object database belongs to all worktrees, only the branch
+        # checked out in this worktree is compared. A detached HEAD is compared with all remote
+        # branches and tags, as worktrees can follow their branch that way.
+        if (Path(repo_path) / ".git").is_file():
+            local_branches = {
+                branch: branch_refs
+                for branch, branch_refs in local_branches.items()
+                if branch == head_branch
+            }
+
+            if head_branch == "(detached)":
+                local_commit_count = self._get_local_commit_count(g)
+
+                branches["HEAD"] = {
+                    "upstream": None,
+                    "ahead": local_commit_count,
+                    "behind": None,
+                    "in_sync": local_commit_count == 0,
+                }
+
+        for branch, (sha, upstream, track) in local_branches.items():
+            ahead, behind = None, None
+
+            if upstream and track != "gone":
+                ahead_match = re.search(r"ahead (\d+)", track)
+                behind_match = re.search(r"behind (\d+)", track)
+                ahead = int(ahead_match.group(1)) if ahead_match else 0
+                behind = int(behind_match.group(1)) if behind_match else 0
+                in_sync = ahead == 0 and behind == 0
+            elif upstream:
+                in_sync = False
+            else:
+                branch_remote_shas = remote_shas.get(branch, [])
+                in_sync = bool(branch_remote_shas) and all(remote_sha == sha for remote_sha in branch_remote_shas)
+
+            branches[branch] = {
+                "upstream": upstream or None,
+                "ahead": ahead,
+                "behind": behind,
+                "in_sync": in_sync,
+            }
+
+        return {
+            "dirty_files": dirty_files,
+            "untracked_files": untracked_files,
+            "branches": branches,
+            "has_changes": bool(dirty_files or untracked_files or not all(branch["in_sync"] for branch in branches.values())),
+        }
 
-                if (remote_commit != local_commit) or repo.is_dirty(untracked_files=True):
-                    has_remote_difference = True
+    def _log_repo_changes(self, repo_path, analysis, log_func):
+        """
+        Logs a short summary of what differs in a repo from the result of _analyze_repo
+        """
+        if analysis["dirty_files"]:
+            log_func(f" - {repo_path.name}: {len(analysis['dirty_files'])} files with uncommited changes")
+
+        if analysis["untracked_files"]:
+            log_func(f" - {repo_path.name}: {len(analysis['untracked_files'])} untracked files or directories")
+
+        for branch, branch_status in analysis["branches"].items():
+            if branch_status["in_sync"]:
+                continue
 
-        return has_remote_difference
+            if branch_status["ahead"] is not None and not branch_status["upstream"]:
+                log_func(f" - {repo_path.name}: '{branch}' has {branch_status['ahead']} commits that is not in any remote branch or tag")
+            elif branch_status["ahead"] is not None:
+                log_func(f" - {repo_path.name}: branch '{branch}' is {branch_status['ahead']} commits ahead and {branch_status['behind']} behind '{branch_status['upstream']}'")
+            elif branch_status["upstream"]:
+                log_func(f" - {repo_path.name}: branch '{branch}' has an upstream '{branch_status['upstream']}' that is gone")
+            else:
+                log_func(f" - {repo_path.name}: branch '{branch}' differs from the remote")
 
     def _is_valid_repo(self, path):
         """
@@ -822,6 +3053,7 @@ class SubGit():
         in_conf_file = True
         bad_path = []
         valid_repos = True
+        active_repos = set(active_repos)
 
         for repo in repos:
             repo_paths.append(Path().cwd() / repo)
@@ -874,9 +3106,6 @@ class SubGit():
 
         log.debug("Running clean step on data")
 
-        if not isinstance(regex_list, list):
-            raise SubGitConfigException("sequence for clean step must be a list of items")
-
         if not isinstance(regex_list, list):
             raise SubGitConfigException("regex_list for clean step must be a list of items")
 
@@ -884,30 +3113,17 @@ class SubGit():
         if len(regex_list) == 0:
             return sequence
 
-        for item in sequence:
-            for filter_regex in regex_list:
-                if not isinstance(filter_regex, str):
-                    raise SubGitConfigException("ERROR: filter regex must be a string")
-
-                # A empty regex string is not valid
-                if filter_regex.strip() == "":
-                    raise SubGitConfigException("ERROR: Empty regex filter string is not allowed")
-
-                log.debug(f"Filtering item '{str(item)}' against regex '{filter_regex}")
-
-                match_result = re.match(filter_regex, str(item))
+        compiled_filters = compile_filters(regex_list)
 
-                if match_result:
-                    log.debug(f"Filter match result hit: {match_result}")
+        for item in sequence:
+            value = apply_filters(compiled_filters, str(item))
 
-                    # If the regex contains a group that is what we want to extract out and
-                    # add to our filtered output list of results
-                    if len(match_result.groups()) > 0:
-                        filtered_sequence.append(match_result.groups()[0])
-                    else:
-                        filtered_sequence.append(item)
+            if value is None:
+                continue
 
-                    break
+            # If the regex contains a group that is what we want to extract out and
+            # add to our filtered output list of results
+            filtered_sequence.append(item if value == str(item) else value)
 
         log.debug(f"Filter items result: {filtered_sequence}")
 
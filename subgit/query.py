@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+
+# python std lib
+import hashlib
+import json
+import logging
+import re
+from functools import lru_cache
+from pathlib import Path
+
+# 3rd party imports
+from packaging import version
+from packaging.specifiers import InvalidSpecifier, SpecifierSet
+
+# subgit imports
+from subgit.constants import *
+from subgit.enums import *
+from subgit.exceptions import *
+
+log = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=VERSION_CACHE_SIZE)
+def parse_version(value):
+    """
+    Parses a string into a PEP440 version object. The result is cached so each unique value
+    is only parsed once, no matter how many repos or pulls that use the same tag names.
+
+    Returns None if the value is not a valid PEP440 version.
+    """
+    try:
+        return version.Version(value)
+    except version.InvalidVersion:
+        return None
+
+
+def compile_filters(regex_list):
+    """
+    Validates and compiles a list of filter regex strings
+    """
+    if not isinstance(regex_list, list):
+        raise SubGitConfigException("regex_list for clean step must be a list of items")
+
+    compiled_filters = []
+
+    for filter_regex in regex_list:
+        if not isinstance(filter_regex, str):
+            raise SubGitConfigException("ERROR: filter regex must be a string")
+
+        # A empty regex string is not valid
+        if filter_regex.strip() == "":
+            raise SubGitConfigException("ERROR: Empty regex filter string is not allowed")
+
+        try:
+            compiled_filters.append(re.compile(filter_regex))
+        except re.error as e:
+            raise SubGitConfigException(f"ERROR: Invalid filter regex '{filter_regex}': {e}") from e
+
+    return compiled_filters
+
+
+def apply_filters(compiled_filters, value):
+    """
+    Matches the value against each compiled filter in order and stops at the first match.
+
+    If the matching regex contains a group, the content of the first group is returned, otherwise
+    the value itself. Returns None if no filter matches.
+    """
+    for compiled_filter in compiled_filters:
+        match_result = compiled_filter.match(value)
+
+        if match_result:
+            if match_result.re.groups > 0:
+                return match_result.group(1)
+
+            return value
+
+    return None
+
+
+class TagQuery():
+    """
+    Selects one tag out of a list of tag names with the same filter, order and select steps as
+    SubGit._filter, SubGit._order and SubGit._select, but built for repos with a lot of tags.
+
+    - The filter regexes is validated and compiled once when the query is created
+    - Versions is parsed through a shared cache and tags that is not valid PEP440 versions
+      is skipped instead of failing the whole selection
+    - The selection never sorts the tags, it makes a single pass to find the first or last
+      item according to the order algorithm
+    """
+
+    def __init__(self, filter_config, order_algorithm, select_config, select_method):
+        self.compiled_filters = compile_filters(filter_config)
+        self.order_algorithm = order_algorithm
+        self.select_config = select_config
+        self.select_method = select_method
+        self.specifier = None
+
+        if not isinstance(order_algorithm, OrderAlgorithms):
+            raise SubGitConfigException("Unsupported ordering algorithm selected")
+
+        if not isinstance(select_method, SelectionMethods):
+            raise SubGitConfigException("Unsupported select algorithm selected")
+
+        if select_method == SelectionMethods.SEMVER and select_config not in ("first", "last"):
+            try:
+                self.specifier = SpecifierSet(select_config)
+            except InvalidSpecifier:
+                log.warning("WARNING: Invalid SEMVER select query. Falling back to EXCAT matching of value")
+                self.select_method = SelectionMethods.EXACT
+
+    def filter(self, tag_names):
+        """
+        Returns a list of (value, tag_name) tuples for all tags that matches the filter step, where
+        value is the part of the tag name that was extracted by the filter.
+
+        If more then one tag gives the same value only the first tag is kept.
+        """
+        filtered_tags = {}
+
+        for tag_name in tag_names:
+            if self.compiled_filters:
+                value = apply_filters(self.compiled_filters, tag_name)
+
+                if value is None:
+                    continue
+            else:
+                value = tag_name
+
+            filtered_tags.setdefault(value, tag_name)
+
+        return list(filtered_tags.items())
+
+    def _order_key(self, value, tag_name, timestamps):
+        """
+        Returns the key to order a value by, or None if the value can't be ordered
+        """
+        if self.order_algorithm == OrderAlgorithms.SEMVER:
+            return parse_version(value)
+
+        if self.order_algorithm == OrderAlgorithms.TIME:
+            return timestamps.get(tag_name, None)
+
+        return value
+
+    def _pick(self, candidates, last, timestamps):
+        """
+        Picks the first or last (value, tag_name) out of the candidates, as if they would have been
+        ordered with the order algorithm. Items with equal keys keep their input order, the same
+        way a stable sort would.
+        """
+        picked_key = None
+        picked_tag = None
+
+        for value, tag_name in candidates:
+            key = self._order_key(value, tag_name, timestamps)
+
+            if key is None:
+                continue
+
+            if picked_tag is None or (key >= picked_key if last else key < picked_key):
+                picked_key = key
+                picked_tag = tag_name
+
+        return picked_tag
+
+    def select(self, tag_names, timestamps=None):
+        """
+        Runs the filter and selection steps over the tag names.
+
+        Ordering by TIME requires timestamps, a dict with the tag name as key and the time the
+        tag was created as value. Tags without a timestamp is skipped.
+
+        Returns the full name of the selected tag, or None if no tag could be selected.
+        """
+        if self.order_algorithm == OrderAlgorithms.TIME and timestamps is None:
+            raise SubGitConfigException("Ordering tags by TIME requires the creation time of each tag")
+
+        candidates = self.filter(tag_names)
+
+        log.debug(f"Tag query filtered {len(candidates)} tags")
+
+        if not candidates:
+            return None
+
+        if self.select_method == SelectionMethods.EXACT:
+            for value, tag_name in candidates:
+                if value == self.select_config:
+                    return tag_name
+
+            # Query not found in sequence, return None
+            return None
+
+        if self.specifier is None:
+            return self._pick(candidates, self.select_config == "last", timestamps)
+
+        # Run the version specifier against each unique version once, and then pick the
+        # last of the matching tags
+        versions = {
+            value: parse_version(value)
+            for value, _ in candidates
+        }
+        matching_versions = set(
+            self.specifier.filter(
+                {
+                    parsed_version
+                    for parsed_version in versions.values()
+                    if parsed_version is not None
+                },
+            ),
+        )
+
+        return self._pick(
+            [
+                (value, tag_name)
+                for value, tag_name in candidates
+                if versions[value] in matching_versions
+            ],
+            True,
+            timestamps,
+        )
+
+
+class TagCache():
+    """
+    On disk cache of the tag list and tag resolutions for one repo, stored inside the git folder
+    of the repo.
+
+    The cache is only valid for the exact ref state it was built from, which is a hash of the
+    packed-refs file and all loose tag refs. Any change to the tags in the repo, like a fetch that
+    adds or moves a tag, will make the whole cache invalid. Each resolution is also keyed on the
+    revision.tag config that was used, and only the TAG_CACHE_SIZE most recently used configs is kept.
+    """
+
+    def __init__(self, git_dir, common_dir=None, size=TAG_CACHE_SIZE):
+        self.cache_file_path = Path(git_dir) / TAG_CACHE_FILE_NAME
+        self.common_dir = Path(common_dir or git_dir)
+        self.size = size
+        self.ref_state = self._get_ref_state()
+        self.data = self._load()
+
+    def _get_ref_state(self):
+        """
+        Hashes the content of packed-refs and all loose refs under refs/tags
+        """
+        ref_hash = hashlib.sha1()  # nosec-B324
+
+        packed_refs_path = self.common_dir / "packed-refs"
+
+        if packed_refs_path.exists():
+            ref_hash.update(packed_refs_path.read_bytes())
+
+        tags_path = self.common_dir / "refs" / "tags"
+
+        if tags_path.exists():
+            for ref_path in sorted(path for path in tags_path.rglob("*") if path.is_file()):
+                ref_hash.update(ref_path.relative_to(tags_path).as_posix().encode("utf-8"))
+                ref_hash.update(ref_path.read_bytes())
+
+        return ref_hash.hexdigest()
+
+    def _load(self):
+        """
+        Loads the cache file. A missing or broken cache file, or a cache for another ref
+        state, gives an empty cache.
+        """
+        empty_cache = {"refs": self.ref_state, "tags": None, "timestamps": None, "resolved": {}}
+
+        try:
+            with self.cache_file_path.open("r") as stream:
+                data = json.load(stream)
+        except (OSError, ValueError):
+            return empty_cache
+
+        if not isinstance(data, dict) or data.get("refs", None) != self.ref_state:
+            return empty_cache
+
+        return data
+
+    def _get_config_key(self, tag_config):
+        return hashlib.sha1(json.dumps(tag_config, sort_keys=True).encode("utf-8")).hexdigest()  # nosec-B324
+
+    def get_tags(self):
+        """
+        Returns a tuple of (tag_names, timestamps) or None if the tag list is not cached
+        """
+        if self.data["tags"] is None:
+            return None
+
+        return self.data["tags"], self.data["timestamps"]
+
+    def set_tags(self, tag_names, timestamps):
+        self.data["tags"] = tag_names
+        self.data["timestamps"] = timestamps
+
+    def get_resolved(self, tag_config):
+        """
+        Returns the tag name that was resolved for the tag config, or None if it is not cached
+        """
+        resolved = self.data["resolved"]
+        key = self._get_config_key(tag_config)
+
+        if key not in resolved:
+            return None
+
+        # Move the entry last to mark it as the most recently used
+        resolved[key] = resolved.pop(key)
+
+        return resolved[key]
+
+    def set_resolved(self, tag_config, tag_name):
+        resolved = self.data["resolved"]
+        key = self._get_config_key(tag_config)
+
+        resolved.pop(key, None)
+        resolved[key] = tag_name
+
+        # Evict the least recently used configs
+        while len(resolved) > self.size:
+            resolved.pop(next(iter(resolved)))
+
+    def save(self):
+        """
+        Writes the cache file. The cache is only an optimization so a failed write is ignored.
+        """
+        try:
+            with self.cache_file_path.open("w") as stream:
+                json.dump(self.data, stream)
+        except OSError as e:
+            log.debug(f"Unable to write tag cache {self.cache_file_path}: {e}")
+
+
+__all__ = [
+    "TagCache",
+    "TagQuery",
+    "apply_filters",
+    "compile_filters",
+    "parse_version",
+]
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+# python std lib
+import logging
+import os
+import shutil
+import subprocess  # nosec-B404
+import tempfile
+import threading
+from contextlib import contextmanager
+from itertools import zip_longest
+from pathlib import Path
+from urllib.parse import urlparse
+
+log = logging.getLogger(__name__)
+
+
+def get_url_host(url):
+    """
+    Returns the host name of a git remote url, or an empty string for local repos.
+
+    Supports the url formats that git supports:
+
+      ssh://git@github.com:22/org/repo.git -> github.com
+      https://github.com/org/repo.git -> github.com
+      git@github.com:org/repo.git -> github.com
+      file:///path/to/repo.git or /path/to/repo.git -> ''
+    """
+    if not url:
+        return ""
+
+    if "://" in url:
+        return (urlparse(url).hostname or "").lower()
+
+    # scp like syntax, [user@]host:path. A colon after the first slash is a local path.
+    host, separator, _ = url.partition(":")
+
+    if not separator or "/" in host:
+        return ""
+
+    return host.rpartition("@")[2].lower()
+
+
+def interleave_by_host(items, get_host):
+    """
+    Reorders items so that items for different hosts is mixed as much as possible, while the
+    items for each host keeps their order. This keeps the workers busy with other hosts while
+    one host is at its connection limit.
+    """
+    items_by_host = {}
+
+    for item in items:
+        items_by_host.setdefault(get_host(item), []).append(item)
+
+    return [
+        item
+        for host_items in zip_longest(*items_by_host.values())
+        for item in host_items
+        if item is not None
+    ]
+
+
+class HostLimiter():
+    """
+    Limits how many operations can run against the same remote host at the same time.
+
+    Local repos, with an empty host name, is never limited.
+    """
+
+    def __init__(self, host_jobs):
+        self.host_jobs = host_jobs
+        self.semaphores = {}
+        self.lock = threading.Lock()
+
+    def _get_semaphore(self, host):
+        with self.lock:
+            if host not in self.semaphores:
+                self.semaphores[host] = threading.BoundedSemaphore(self.host_jobs)
+
+            return self.semaphores[host]
+
+    @contextmanager
+    def limit(self, host):
+        if not host or not self.host_jobs:
+            yield
+            return
+
+        with self._get_semaphore(host):
+            yield
+
+
+@contextmanager
+def ssh_multiplexing():
+    """
+    Sets GIT_SSH_COMMAND for the duration of the context so that all git operations over ssh to
+    the same host shares one authenticated connection through an ssh ControlMaster.
+
+    Any GIT_SSH_COMMAND that is already set is kept and the ControlMaster options is appended to it.
+    All master connections is closed and the sockets is removed when the context exits.
+    """
+    socket_dir = Path(tempfile.mkdtemp(prefix="subgit-ssh-"))
+    original_ssh_command = os.environ.get("GIT_SSH_COMMAND", None)
+
+    # %C is a hash of the connection details, which keeps the socket path short and unique per host
+    os.environ["GIT_SSH_COMMAND"] = " ".join([
+        original_ssh_command or "ssh",
+        "-o ControlMaster=auto",
+        f"-o ControlPath={socket_dir}/%C",
+        "-o ControlPersist=120",
+    ])
+
+    log.debug(f"Using ssh multiplexing with GIT_SSH_COMMAND: {os.environ['GIT_SSH_COMMAND']}")
+
+    try:
+        yield socket_dir
+    finally:
+        if original_ssh_command is None:
+            del os.environ["GIT_SSH_COMMAND"]
+        else:
+            os.environ["GIT_SSH_COMMAND"] = original_ssh_command
+
+        for socket_path in socket_dir.iterdir():
+            try:
+                # The host argument is required by ssh, but the explicit control path decides the connection
+                subprocess.run(
+                    ["ssh", "-o", f"ControlPath={socket_path}", "-O", "exit", "subgit"],
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                    timeout=10,
+                    check=False,
+                )  # nosec-B603 B607
+            except (OSError, subprocess.TimeoutExpired) as e:
+                log.debug(f"Unable to close ssh master connection {socket_path}: {e}")
+
+        shutil.rmtree(socket_dir, ignore_errors=True)
+
+
+__all__ = [
+    "HostLimiter",
+    "get_url_host",
+    "interleave_by_host",
+    "ssh_multiplexing",
+]
@@ -1,12 +1,14 @@
 # -*- coding: utf-8 -*-
 
 # python std lib
+import json
 
 # rediscluster imports
 from subgit.core import SubGit
 
 # 3rd party imports
 import pytest
+from git import Repo
 
 
 @pytest.fixture()
@@ -15,3 +17,99 @@ def subgit(tmpdir, *args, **kwargs):
     conf_file = tmpdir.join(".subgit.yml")
 
     return SubGit(config_file_path=conf_file, *args, **kwargs)
+
+
+@pytest.fixture()
+def workspace(subgit, monkeypatch):
+    """
+    All repos is cloned relative to cwd, so run the test from within the folder of the config file
+    """
+    monkeypatch.chdir(subgit.subgit_config_file_path.parent)
+
+    return subgit.subgit_config_file_path.parent
+
+
+@pytest.fixture()
+def git_env(monkeypatch):
+    """
+    Sets a git identity so commits can be made in tests w/o depending on the global git config
+    """
+    for key in ("GIT_AUTHOR_NAME", "GIT_COMMITTER_NAME"):
+        monkeypatch.setenv(key, "subgit")
+
+    for key in ("GIT_AUTHOR_EMAIL", "GIT_COMMITTER_EMAIL"):
+        monkeypatch.setenv(key, "subgit@example.com")
+
+
+@pytest.fixture()
+def remote_repo(tmp_path, git_env):
+    """
+    Creates a local bare git repo that can be used as a 'remote' over file:// by subgit.
+
+    The repo has two branches, master and develop, and the tags 1.0.0, 1.1.0 and v2.0.0
+    """
+    work_path = tmp_path / "remote-work"
+    work_path.mkdir()
+
+    repo = Repo.init(work_path, initial_branch="master")
+
+    for file_name in ("README.md", "src/main.py", "docs/index.md"):
+        file_path = work_path / file_name
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_text(file_name)
+
+    repo.index.add(["README.md", "src/main.py", "docs/index.md"])
+    repo.index.commit("Initial commit")
+    repo.create_tag("1.0.0")
+
+    (work_path / "src/main.py").write_text("1.1.0")
+    repo.index.add(["src/main.py"])
+    repo.index.commit("Release 1.1.0")
+    repo.create_tag("1.1.0")
+
+    (work_path / "src/main.py").write_text("2.0.0")
+    repo.index.add(["src/main.py"])
+    repo.index.commit("Release 2.0.0")
+    repo.create_tag("v2.0.0")
+
+    repo.create_head("develop")
+    repo.heads.develop.checkout()
+    (work_path / "src/develop.py").write_text("develop")
+    repo.index.add(["src/develop.py"])
+    repo.index.commit("Develop work")
+    repo.heads.master.checkout()
+
+    bare_path = tmp_path / "remote.git"
+    bare_repo = repo.clone(bare_path, bare=True)
+
+    # Allow partial clones and fetching of any commit sha like most git hosting services do
+    with bare_repo.config_writer() as config:
+        config.set_value("uploadpack", "allowFilter", "true")
+        config.set_value("uploadpack", "allowAnySHA1InWant", "true")
+
+    return bare_path
+
+
+def write_config(subgit, config):
+    with subgit.subgit_config_file_path.open(mode="w") as file:
+        file.write(json.dumps(config, indent=2))
+
+
+def commit_to_remote(remote_path, branch, file_name, content):
+    """
+    Adds a new commit on the given branch in a bare remote repo, by making it in a temporary clone
+    """
+    work_path = remote_path.parent / f"{remote_path.stem}-{branch}-update"
+
+    if work_path.exists():
+        repo = Repo(work_path)
+        repo.remotes.origin.pull()
+    else:
+        repo = Repo.clone_from(remote_path.as_uri(), work_path, branch=branch)
+
+    (work_path / file_name).write_text(content)
+    repo.index.add([file_name])
+    commit = repo.index.commit(f"Update {file_name}")
+    repo.remotes.origin.push(branch)
+
+    return commit.hexsha
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+
+# python std lib
+import json
+import os
+import shutil
+import time
+
+# subgit imports
+import subgit.config as subgit_config
+from subgit.config import SubGitConfig, load_config, parse_label_selector
+from subgit.constants import CONFIG_CACHE_DIR_NAME
+from subgit.exceptions import SubGitConfigException
+
+# 3rd party imports
+import pytest
+
+
+def write_old_file(path, data):
+    """
+    Writes a config file with a modification time old enough for it to be cached
+    """
+    path.write_text(json.dumps(data))
+    old_time = time.time() - 60
+    os.utime(path, (old_time, old_time))
+
+
+def test_config_index():
+    config = SubGitConfig({
+        "timeout": 30,
+        "repos": [
+            {"name": "a", "url": "a.git"},
+            {"name": "b", "url": "b.git", "enable": False},
+            {"name": "c", "url": "c.git"},
+        ],
+    })
+
+    assert config["timeout"] == 30
+    assert config.get_repo("b")["url"] == "b.git"
+    assert config.get_repo("missing") is None
+    assert config.active_repos == ["a", "c"]
+    assert config.is_active("a")
+    assert not config.is_active("b")
+    assert not config.is_active("missing")
+    assert [repo_data["name"] for repo_data in config.get_repos(["c", "a", "missing"])] == ["a", "c"]
+
+    assert SubGitConfig(None).repos == []
+    assert config.repos == config["repos"]
+
+    for bad_config in (
+        "foobar",
+        {"repos": "foobar"},
+        {"repos": [{"url": "a.git"}]},
+        {"repos": [{"name": "a"}, {"name": "a"}]},
+        {"repos": [{"name": "a", "revision": "master"}]},
+    ):
+        with pytest.raises(SubGitConfigException):
+            SubGitConfig(bad_config)
+
+
+def test_load_config_cache(tmp_path, mocker):
+    config_path = tmp_path / ".subgit.yml"
+    cache_dir = tmp_path / CONFIG_CACHE_DIR_NAME
+
+    write_old_file(config_path, {"repos": [{"name": "a", "url": "a.git"}]})
+
+    assert load_config(config_path).active_repos == ["a"]
+    assert len(list(cache_dir.iterdir())) == 1
+
+    # The cached config is used w/o parsing the YAML
+    yaml_load = mocker.patch("subgit.config.yaml.load", side_effect=AssertionError("YAML was parsed"))
+    assert load_config(config_path).active_repos == ["a"]
+    mocker.stop(yaml_load)
+
+    # A changed config file is parsed again
+    write_old_file(config_path, {"repos": [{"name": "a", "url": "a.git"}, {"name": "b", "url": "b.git"}]})
+    assert load_config(config_path).active_repos == ["a", "b"]
+
+    # A recently modified config file is never cached
+    shutil.rmtree(cache_dir)
+    config_path.write_text(json.dumps({"repos": []}))
+    assert load_config(config_path).active_repos == []
+    assert not cache_dir.exists()
+
+    # Configs that can't be stored as JSON is not cached
+    config_path.write_text("repos: []\ncreated: 2024-01-01\n")
+    old_time = time.time() - 60
+    os.utime(config_path, (old_time, old_time))
+    assert load_config(config_path)["created"].year == 2024
+    assert not cache_dir.exists()
+
+
+def test_load_config_include(tmp_path, mocker):
+    config_path = tmp_path / ".subgit.yml"
+    shard_dir = tmp_path / "conf.d"
+    shard_dir.mkdir()
+
+    write_old_file(config_path, {
+        "include": ["conf.d", "extra.yml"],
+        "repos": [{"name": "main", "url": "main.git"}],
+    })
+    write_old_file(shard_dir / "10-backend.yml", {"repos": [{"name": "api", "url": "api.git"}, {"name": "old", "url": "old.git", "enable": False}]})
+    write_old_file(shard_dir / "20-frontend.yaml", {"repos": [{"name": "web", "url": "web.git", "groups": ["frontend"]}]})
+    (shard_dir / "README.md").write_text("Not a config file")
+    write_old_file(tmp_path / "extra.yml", {"repos": [{"name": "tools", "url": "tools.git"}]})
+
+    config = load_config(config_path)
+    assert config.active_repos == ["main", "api", "web", "tools"]
+    assert config.repo_index["web"]["shard"] == str(shard_dir / "20-frontend.yaml")
+    assert config.repo_index["web"]["url"] == "web.git"
+    assert config.select(groups=["frontend"]) == ["web"]
+
+    # With the name to shard index in place, only the shard of the used repo is loaded
+    load_shard = mocker.spy(subgit_config, "_load_shard")
+    config = load_config(config_path)
+
+    assert config.get_repo("api")["url"] == "api.git"
+    assert [call.args[0] for call in load_shard.call_args_list] == [str(shard_dir / "10-backend.yml")]
+
+    assert [repo_data["name"] for repo_data in config.repos] == ["main", "api", "old", "web", "tools"]
+    assert load_shard.call_count == 3
+
+    # A changed shard updates the index
+    write_old_file(shard_dir / "20-frontend.yaml", {"repos": [{"name": "web", "url": "web.git"}, {"name": "app", "url": "app.git"}]})
+    assert load_config(config_path).active_repos == ["main", "api", "web", "app", "tools"]
+
+    for bad_shard in ({"repos": [{"name": "main"}]}, {"repos": [], "timeout": 10}, ["foo"]):
+        write_old_file(tmp_path / "extra.yml", bad_shard)
+
+        with pytest.raises(SubGitConfigException):
+            load_config(config_path)
+
+    write_old_file(config_path, {"include": "missing.d"})
+
+    with pytest.raises(SubGitConfigException):
+        load_config(config_path)
+
+
+def test_config_select():
+    config = SubGitConfig({
+        "repos": [
+            {"name": "api", "groups": ["backend"], "labels": {"tier": 1, "lang": "python"}},
+            {"name": "worker", "groups": ["backend", "jobs"], "labels": {"tier": 2}},
+            {"name": "web", "groups": ["frontend"], "labels": {"tier": 1, "public": True}},
+            {"name": "old", "groups": ["backend"], "enable": False},
+            {"name": "docs"},
+        ],
+    })
+
+    assert config.select() == ["api", "worker", "web", "docs"]
+    assert config.select(groups=["backend"]) == ["api", "worker"]
+    assert config.select(groups=["jobs", "frontend"]) == ["worker", "web"]
+    assert config.select(labels=[parse_label_selector("tier=1")]) == ["api", "web"]
+    assert config.select(labels=[parse_label_selector("tier=1"), parse_label_selector("lang")]) == ["api"]
+    assert config.select(labels=[parse_label_selector("public=true")]) == ["web"]
+    assert config.select(groups=["backend"], labels=[parse_label_selector("tier = 2")]) == ["worker"]
+    assert config.select(names=["web", "docs"], labels=[parse_label_selector("tier")]) == ["web"]
+    assert config.select(groups=["missing"]) == []
+
+    with pytest.raises(SubGitConfigException):
+        parse_label_selector("=1")
+
+    for bad_repo in ({"name": "a", "groups": "backend"}, {"name": "a", "labels": ["tier"]}, {"name": "a", "labels": {"tier": [1]}}):
+        with pytest.raises(SubGitConfigException):
+            SubGitConfig({"repos": [bad_repo]})
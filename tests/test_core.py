@@ -229,3 +229,20 @@ def test_repo_pull_dict(subgit, mocker):
     # del data
 
     # TODO: more pull dict() tests
+
+
+def test_select_repos(subgit):
+    with subgit.subgit_config_file_path.open(mode="w") as file:
+        file.write(json.dumps({
+            "repos": [
+                {"name": "api", "url": "api.git", "groups": ["backend"], "labels": {"tier": 1}},
+                {"name": "web", "url": "web.git", "groups": ["frontend"], "labels": {"tier": 1}},
+            ],
+        }))
+
+    assert subgit.select_repos(labels=["tier=1"]) == ["api", "web"]
+    assert subgit.select_repos(["web"], labels=["tier=1"]) == ["web"]
+    assert subgit.select_repos(groups=["backend"]) == ["api"]
+
+    with pytest.raises(SubGitConfigException):
+        subgit.select_repos(groups=["missing"])
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+# python std lib
+import shutil
+from pathlib import Path
+
+# subgit imports
+from subgit.exceptions import SubGitConfigException
+from tests.conftest import commit_to_remote, write_config
+
+# 3rd party imports
+import pytest
+from git import Repo
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setenv("SUBGIT_CACHE_DIR", str(cache_dir))
+
+    return cache_dir
+
+
+def test_get_mirror_path(subgit, cache_dir, monkeypatch):
+    mirror_path = subgit._get_mirror_path("git@github.com:Grokzen/pykwalify.git")
+
+    assert mirror_path.parent == cache_dir
+    assert mirror_path.name.startswith("pykwalify-")
+    assert mirror_path != subgit._get_mirror_path("git@gitlab.com:Grokzen/pykwalify.git")
+
+    monkeypatch.delenv("SUBGIT_CACHE_DIR")
+    monkeypatch.setenv("XDG_CACHE_HOME", str(cache_dir))
+
+    assert subgit._get_object_cache_dir() == cache_dir / "subgit" / "objects"
+
+
+def test_cache_update_and_pull(subgit, workspace, remote_repo, cache_dir):
+    write_config(subgit, {
+        "object_cache": True,
+        "repos": [
+            {"name": "cached", "url": remote_repo.as_uri(), "revision": {"branch": "master"}},
+            {"name": "locked", "url": remote_repo.as_uri(), "revision": {"tag": "<2.0.0"}},
+        ],
+    })
+
+    mirror_path = subgit._get_mirror_path(remote_repo.as_uri())
+
+    assert subgit.cache_update(None) == 0
+    assert Repo(mirror_path).bare
+    assert [path.name for path in cache_dir.iterdir()] == [mirror_path.name]
+
+    # A new commit in the remote is fetched into the mirror
+    new_sha = commit_to_remote(remote_repo, "master", "new_file", "content")
+
+    assert subgit.cache_update(["cached"]) == 0
+    assert Repo(mirror_path).heads.master.commit.hexsha == new_sha
+
+    assert subgit.pull(["cached"]) == 0
+    assert subgit.pull(["locked"], remote_tags=True) == 0
+
+    # Both repos has the same url so the alternates is in their shared object database
+    for name in ("cached", "locked"):
+        alternates_path = Path(Repo(workspace / name).common_dir) / "objects" / "info" / "alternates"
+        assert alternates_path.read_text().strip() == str(mirror_path / "objects")
+
+    assert Repo(workspace / "cached").head.commit.hexsha == new_sha
+
+    # Objects is borrowed from the mirror so the clone has no objects of its own
+    assert "in-pack: 0" in Repo(workspace / "cached").git.count_objects("-v").splitlines()
+
+
+def test_mirror_keeps_unreachable_objects(subgit, workspace, remote_repo, cache_dir):
+    remote = Repo(remote_repo)
+
+    write_config(subgit, {
+        "object_cache": True,
+        "repos": [
+            {"name": "feature", "url": remote_repo.as_uri(), "revision": {"branch": "feature"}},
+        ],
+    })
+
+    feature_sha = commit_to_remote(remote_repo, "master", "feature_file", "content")
+    remote.create_head("feature", feature_sha)
+    remote.git.reset("--soft", "HEAD~1")
+
+    mirror_path = subgit._get_mirror_path(remote_repo.as_uri())
+
+    assert subgit.cache_update(None) == 0
+    assert subgit.pull(["feature"]) == 0
+
+    mirror = Repo(mirror_path)
+    assert mirror.git.config("--get", "gc.auto") == "0"
+    assert mirror.git.config("--get", "gc.pruneExpire") == "never"
+
+    # The branch is removed from the remote and pruned from the mirror, but gc keeps its objects
+    remote.delete_head("feature", force=True)
+    remote.git.gc("--prune=now")
+
+    assert subgit.cache_update(None) == 0
+    assert "feature" not in [head.name for head in mirror.heads]
+
+    mirror.git.gc()
+    assert Repo(workspace / "feature").git.fsck("--connectivity-only") == ""
+    assert Repo(workspace / "feature").head.commit.hexsha == feature_sha
+
+    # Mirrors created w/o the config gets it on the next update
+    mirror.git.config("gc.auto", "1")
+    assert subgit.cache_update(None) == 0
+    assert mirror.git.config("--get", "gc.auto") == "0"
+
+
+def test_pull_dissociate(subgit, workspace, remote_repo, cache_dir):
+    write_config(subgit, {
+        "object_cache": True,
+        "clone": {"dissociate": True},
+        "repos": [
+            {"name": "cloned", "url": str(remote_repo), "revision": {"branch": "master"}},
+            {"name": "main", "url": remote_repo.as_uri(), "revision": {"branch": "master"}},
+            {"name": "tag", "url": remote_repo.as_uri(), "revision": {"tag": "<2.0.0"}},
+        ],
+    })
+
+    assert subgit.cache_update(None) == 0
+    assert subgit.pull(["cloned", "main", "tag"]) == 0
+
+    # The repos keeps working w/o the object cache
+    shutil.rmtree(cache_dir)
+
+    for name in ("cloned", "main", "tag"):
+        repo = Repo(workspace / name)
+        assert not (Path(repo.common_dir) / "objects" / "info" / "alternates").exists()
+        assert repo.git.fsck("--connectivity-only") == ""
+
+
+def test_pull_without_object_cache(subgit, workspace, remote_repo, cache_dir):
+    write_config(subgit, {
+        "repos": [
+            {"name": "plain", "url": remote_repo.as_uri(), "revision": {"branch": "master"}},
+        ],
+    })
+
+    assert subgit.cache_update(None) == 0
+    assert subgit.pull(["plain"]) == 0
+    assert not (workspace / "plain" / ".git" / "objects" / "info" / "alternates").exists()
+
+    with pytest.raises(SubGitConfigException):
+        subgit._get_object_cache_enabled({"object_cache": "yes"})
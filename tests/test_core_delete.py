@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+# subgit imports
+from subgit.constants import TRASH_DIR_NAME
+from tests.conftest import write_config
+
+# 3rd party imports
+from git import Repo
+
+
+def test_analyze_repo(subgit, workspace, remote_repo):
+    write_config(subgit, {
+        "repos": [
+            {"name": "repo", "url": remote_repo.as_uri(), "revision": {"branch": "master"}},
+        ],
+    })
+
+    assert subgit.pull(["repo"]) == 0
+
+    repo_path = workspace / "repo"
+    analysis = subgit._analyze_repo(repo_path)
+
+    assert analysis == {
+        "dirty_files": [],
+        "untracked_files": [],
+        "branches": {
+            "master": {"upstream": "origin/master", "ahead": 0, "behind": 0, "in_sync": True},
+        },
+        "has_changes": False,
+    }
+
+    repo = Repo(repo_path)
+    (repo_path / "README.md").write_text("changed")
+    (repo_path / "new file.txt").write_text("new")
+    (repo_path / "src" / "main.py").write_text("committed")
+    repo.index.add(["src/main.py"])
+    repo.index.commit("Local commit")
+    repo.git.mv("docs/index.md", "docs/moved.md")
+    repo.create_head("feature")
+
+    analysis = subgit._analyze_repo(repo_path)
+
+    assert sorted(analysis["dirty_files"]) == ["README.md", "docs/moved.md"]
+    assert analysis["untracked_files"] == ["new file.txt"]
+    assert analysis["branches"]["master"] == {"upstream": "origin/master", "ahead": 1, "behind": 0, "in_sync": False}
+    assert analysis["branches"]["feature"] == {"upstream": None, "ahead": None, "behind": None, "in_sync": False}
+    assert analysis["has_changes"]
+
+
+def test_delete_and_reset_checks_changes(subgit, workspace, remote_repo):
+    write_config(subgit, {
+        "repos": [
+            {"name": "clean", "url": remote_repo.as_uri(), "revision": {"branch": "master"}},
+            {"name": "changed", "url": str(remote_repo), "revision": {"branch": "develop"}},
+        ],
+    })
+
+    assert subgit.pull(["clean", "changed"]) == 0
+
+    (workspace / "changed" / "README.md").write_text("changed")
+    subgit.answer_yes = True
+
+    # No repo is deleted as long as any of them has changes
+    subgit.delete(["clean", "changed"], wait=True)
+    assert (workspace / "clean").exists()
+    assert (workspace / "changed").exists()
+
+    assert subgit.reset(["clean", "changed"], hard_flag=True) == 0
+    assert not Repo(workspace / "changed").is_dirty()
+
+    subgit.delete(["clean", "changed"], wait=True)
+    assert not (workspace / "clean").exists()
+    assert not (workspace / "changed").exists()
+
+
+def test_delete_moves_repos_to_trash(subgit, workspace, remote_repo, mocker):
+    write_config(subgit, {
+        "repos": [
+            {"name": "main", "url": remote_repo.as_uri(), "revision": {"branch": "master"}},
+            {"name": "dev", "url": str(remote_repo), "revision": {"branch": "develop"}},
+        ],
+    })
+
+    assert subgit.pull(["main", "dev"]) == 0
+
+    trash_dir = workspace / TRASH_DIR_NAME
+    popen = mocker.patch("subgit.core.Popen")
+    subgit.answer_yes = True
+
+    # The repo is gone from the workspace right away and its files is removed in the background
+    subgit.delete(["main"])
+    assert not (workspace / "main").exists()
+
+    trash_paths = list(trash_dir.iterdir())
+    assert len(trash_paths) == 1
+    assert (trash_paths[0] / "main" / ".git").is_dir()
+    assert popen.call_count == 1
+    assert popen.call_args.args[0][3:] == [str(trash_paths[0])]
+
+    # The same name can be pulled again before the old files is removed
+    assert subgit.pull(["main"]) == 0
+    assert Repo(workspace / "main").head.commit == Repo(remote_repo).heads.master.commit
+
+    # Waiting removes the repo and anything left in the trash from earlier deletes
+    subgit.delete(["dev"], wait=True)
+    assert not (workspace / "dev").exists()
+    assert list(trash_dir.iterdir()) == []
+    assert popen.call_count == 1
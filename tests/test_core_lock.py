@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+
+# python std lib
+
+# subgit imports
+from tests.conftest import commit_to_remote, write_config
+
+# 3rd party imports
+from git import Repo
+from ruamel import yaml
+
+
+def test_resolve_tag(subgit):
+    tags = ["v1.0.0", "v1.1.0", "v2.0.0", "foo"]
+
+    # The selected value is mapped back to the full tag name
+    assert subgit._resolve_tag("foo", {"filter": "v(.*)", "select": "<2.0.0"}, tags) == "v1.1.0"
+    assert subgit._resolve_tag("foo", {"filter": "v(.*)", "select": "last"}, tags) == "v2.0.0"
+    assert subgit._resolve_tag("foo", {"filter": "bar", "select": "last"}, tags) is None
+
+
+def test_lock_and_pull_locked(subgit, workspace, remote_repo):
+    remote = Repo(remote_repo)
+
+    write_config(subgit, {
+        "repos": [
+            {"name": "branch", "url": remote_repo.as_uri(), "revision": {"branch": "master"}},
+            {"name": "tag", "url": remote_repo.as_uri(), "revision": {"tag": {"filter": "v(.*)", "select": "last"}}},
+            {"name": "commit", "url": remote_repo.as_uri(), "revision": {"commit": remote.tags["1.0.0"].commit.hexsha}},
+        ],
+    })
+
+    assert subgit.lock(None) == 0
+
+    lock_file_path = workspace / ".subgit.lock"
+
+    with open(lock_file_path, "r") as stream:
+        lock_data = yaml.load(stream, Loader=yaml.Loader)
+
+    assert [entry["name"] for entry in lock_data["repos"]] == ["branch", "tag", "commit"]
+    assert lock_data["repos"][0]["ref"] == "refs/heads/master"
+    assert lock_data["repos"][0]["sha"] == remote.heads.master.commit.hexsha
+    assert lock_data["repos"][1]["ref"] == "refs/tags/v2.0.0"
+    assert lock_data["repos"][1]["sha"] == remote.tags["v2.0.0"].commit.hexsha
+
+    locked_master_sha = remote.heads.master.commit.hexsha
+
+    # New commits in the remote after locking should not be pulled
+    commit_to_remote(remote_repo, "master", "new_file", "content")
+
+    assert subgit.pull(["branch", "tag", "commit"], locked=True) == 0
+
+    branch_repo = Repo(workspace / "branch")
+    assert branch_repo.head.commit.hexsha == locked_master_sha
+    assert branch_repo.active_branch.name == "master"
+    assert branch_repo.git.rev_parse("--is-shallow-repository") == "true"
+
+    assert Repo(workspace / "tag").head.commit == remote.tags["v2.0.0"].commit
+    assert Repo(workspace / "commit").head.commit == remote.tags["1.0.0"].commit
+
+    # Locking a single repo only updates that entry
+    assert subgit.lock(["branch"]) == 0
+    assert subgit.pull(["branch"], locked=True) == 0
+    assert branch_repo.head.commit == remote.heads.master.commit
+    assert Repo(workspace / "tag").head.commit == remote.tags["v2.0.0"].commit
+
+
+def test_pull_locked_missing_entry(subgit, workspace, remote_repo):
+    write_config(subgit, {
+        "repos": [
+            {"name": "branch", "url": remote_repo.as_uri(), "revision": {"branch": "master"}},
+        ],
+    })
+
+    assert subgit.pull(["branch"], locked=True) == 1
+    assert not (workspace / "branch").exists()
+
+    assert subgit.lock(None) == 0
+
+    # If the url changes the lock entry is outdated
+    write_config(subgit, {
+        "repos": [
+            {"name": "branch", "url": f"{remote_repo.as_uri()}/", "revision": {"branch": "master"}},
+        ],
+    })
+
+    assert subgit.pull(["branch"], locked=True) == 1
+
+
+def test_lock_missing_branch(subgit, workspace, remote_repo):
+    write_config(subgit, {
+        "repos": [
+            {"name": "branch", "url": remote_repo.as_uri(), "revision": {"branch": "missing"}},
+        ],
+    })
+
+    assert subgit.lock(None) == 1
+    assert not (workspace / ".subgit.lock").exists()
+
+
+def test_lock_short_commit(subgit, workspace, remote_repo):
+    remote = Repo(remote_repo)
+    sha = remote.tags["1.0.0"].commit.hexsha
+
+    write_config(subgit, {
+        "repos": [
+            {"name": "commit", "url": remote_repo.as_uri(), "revision": {"commit": sha[:10]}},
+        ],
+    })
+
+    # A short sha can't be resolved against the remote
+    assert subgit.lock(None) == 1
+    assert not (workspace / ".subgit.lock").exists()
+
+    # Once cloned the short sha is expanded from the local commits
+    assert subgit.pull(["commit"]) == 0
+    assert subgit.lock(None) == 0
+    assert subgit._get_lock_file()["repos"][0]["sha"] == sha
+
+
+def test_pull_locked_failure_removes_new_repo(subgit, workspace, remote_repo, mocker):
+    write_config(subgit, {
+        "repos": [
+            {"name": "branch", "url": remote_repo.as_uri(), "revision": {"branch": "master"}},
+        ],
+    })
+
+    subgit._dump_lock_file({
+        "repos": [
+            {"name": "branch", "url": remote_repo.as_uri(), "sha": "0" * 40},
+        ],
+    })
+
+    assert subgit.pull(["branch"], locked=True) == 1
+    assert not (workspace / "branch").exists()
+    assert subgit._plan_repo({"name": "branch", "url": remote_repo.as_uri(), "revision": {"branch": "master"}})["action"] == "clone"
+
+    # A failed remote tag pull of a new repo is removed too
+    write_config(subgit, {
+        "repos": [
+            {"name": "branch", "url": remote_repo.as_uri(), "revision": {"tag": "<2.0.0"}},
+        ],
+    })
+
+    mocker.patch.object(subgit, "_resolve_remote_tag", return_value=("1.1.0", "0" * 40))
+
+    assert subgit.pull(["branch"], remote_tags=True, skip_unchanged=False) == 1
+    assert not (workspace / "branch").exists()
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+# python std lib
+from pathlib import Path
+
+# subgit imports
+from subgit.constants import DEFAULT_PERFORMANCE_OPTIONS
+from subgit.exceptions import SubGitConfigException
+from tests.conftest import write_config
+
+# 3rd party imports
+import pytest
+from git import Repo
+
+
+def test_get_performance_options(subgit):
+    repo_data = {"name": "foo", "performance": {"checkout_workers": 4}}
+
+    assert subgit._get_performance_options({}, {"name": "foo"}) is None
+    assert subgit._get_performance_options({"performance": {"fsmonitor": True}}, repo_data) == {"fsmonitor": True, "checkout_workers": 4}
+
+    performance_options = subgit._get_performance_options({}, repo_data, DEFAULT_PERFORMANCE_OPTIONS)
+    assert performance_options["checkout_workers"] == 4
+    assert performance_options["commit_graph"] is True
+    assert "fsmonitor" not in performance_options
+
+    # Options set to false in the config is kept
+    assert subgit._get_performance_options({"performance": {"fsmonitor": False}}, repo_data, DEFAULT_PERFORMANCE_OPTIONS)["fsmonitor"] is False
+
+    for bad_config in ("yes", {"foo": True}, {"checkout_workers": -1}, {"checkout_workers": True}, {"commit_graph": "yes"}):
+        with pytest.raises(SubGitConfigException):
+            subgit._get_performance_options({}, {"name": "foo", "performance": bad_config})
+
+
+def test_pull_applies_performance_config(subgit, workspace, remote_repo):
+    write_config(subgit, {
+        "performance": {"untracked_cache": True, "checkout_workers": 4},
+        "repos": [
+            {"name": "fast", "url": remote_repo.as_uri(), "revision": {"branch": "master"}, "performance": {"preload_index": False}},
+            {"name": "plain", "url": remote_repo.as_uri(), "revision": {"branch": "master"}},
+        ],
+    })
+
+    assert subgit.pull(["fast"]) == 0
+
+    repo = Repo(workspace / "fast")
+    assert repo.git.config("--get", "core.untrackedCache") == "true"
+    assert repo.git.config("--get", "core.preloadIndex") == "false"
+    assert repo.git.config("--get", "checkout.workers") == "4"
+
+    write_config(subgit, {
+        "repos": [
+            {"name": "plain", "url": remote_repo.as_uri(), "revision": {"branch": "master"}},
+        ],
+    })
+
+    assert subgit.pull(["plain"]) == 0
+    assert Repo(workspace / "plain").git.config("--get", "core.untrackedCache", with_exceptions=False) == ""
+
+
+def test_optimize(subgit, workspace, remote_repo):
+    write_config(subgit, {
+        "performance": {"checkout_workers": 2},
+        "repos": [
+            {"name": "repo", "url": remote_repo.as_uri(), "revision": {"branch": "master"}},
+            {"name": "missing", "url": remote_repo.as_uri(), "revision": {"branch": "master"}},
+        ],
+    })
+
+    assert subgit.pull(["repo"]) == 0
+    assert subgit.optimize(None) == 0
+
+    repo = Repo(workspace / "repo")
+    assert repo.git.config("--get", "core.commitGraph") == "true"
+    assert repo.git.config("--get", "fetch.writeCommitGraph") == "true"
+    assert repo.git.config("--get", "checkout.workers") == "2"
+
+    # Options that is off by default is not written, so the global git config still applies
+    assert repo.git.config("--local", "--get", "core.fsmonitor", with_exceptions=False) == ""
+
+    # Both repos has the same url so the objects is in the shared object database
+    objects_path = Path(repo.common_dir) / "objects"
+    assert (objects_path / "info" / "commit-graph").exists() or (objects_path / "info" / "commit-graphs").exists()
+    assert (objects_path / "pack" / "multi-pack-index").exists()
+
+    # Missing repos is skipped
+    assert not (workspace / "missing").exists()
+    assert subgit.optimize(["foo"]) == 1
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+# python std lib
+import json
+
+# subgit imports
+from subgit.constants import TAG_CACHE_FILE_NAME
+from subgit.exceptions import SubGitConfigException
+from tests.conftest import commit_to_remote, write_config
+
+# 3rd party imports
+import pytest
+from git import Repo
+
+
+def test_plan(subgit, workspace, remote_repo, capsys):
+    remote = Repo(remote_repo)
+
+    write_config(subgit, {
+        "repos": [
+            {"name": "unchanged", "url": remote_repo.as_uri(), "revision": {"branch": "master"}},
+            {"name": "update", "url": remote_repo.as_uri(), "revision": {"branch": "develop"}},
+            {"name": "dirty", "url": remote_repo.as_uri(), "revision": {"branch": "master"}},
+            {"name": "clone", "url": remote_repo.as_uri(), "revision": {"tag": "<2.0.0"}},
+            {"name": "missing", "url": remote_repo.as_uri(), "revision": {"branch": "missing"}},
+        ],
+    })
+
+    assert subgit.pull(["unchanged", "update", "dirty"]) == 0
+
+    new_sha = commit_to_remote(remote_repo, "develop", "new_file", "content")
+    (workspace / "dirty" / "README.md").write_text("changed")
+    capsys.readouterr()
+
+    assert subgit.plan(None, output_format="json") == 1
+
+    plan = {plan_entry["name"]: plan_entry for plan_entry in json.loads(capsys.readouterr().out)}
+
+    assert plan["unchanged"]["action"] == "unchanged"
+    assert plan["unchanged"]["current_sha"] == remote.heads.master.commit.hexsha
+    assert plan["update"]["action"] == "update"
+    assert plan["update"]["target_sha"] == new_sha
+    assert plan["update"]["ref"] == "refs/heads/develop"
+    assert plan["dirty"]["action"] == "dirty"
+    assert "README.md" in plan["dirty"]["message"]
+    assert plan["clone"]["action"] == "clone"
+    assert plan["clone"]["target_sha"] == remote.tags["1.1.0"].commit.hexsha
+    assert plan["missing"]["action"] == "error"
+
+    # Nothing is changed on disk
+    assert not (workspace / "clone").exists()
+    assert Repo(workspace / "update").head.commit.hexsha != new_sha
+
+    assert subgit.plan(["unchanged", "update", "clone"]) == 0
+
+    output = capsys.readouterr().out
+    assert "1 to clone, 1 to update, 1 unchanged, 0 rejected" in output
+
+    with pytest.raises(SubGitConfigException):
+        subgit.plan(None, output_format="xml")
+
+
+def test_plan_tag_order_time(subgit, workspace, remote_repo, capsys):
+    write_config(subgit, {
+        "repos": [
+            {"name": "time", "url": remote_repo.as_uri(), "revision": {"tag": {"order": "time", "select": "last"}}},
+        ],
+    })
+
+    assert subgit.pull(["time"]) == 0
+
+    tag_cache_path = workspace / "time" / ".git" / TAG_CACHE_FILE_NAME
+    tag_cache_path.unlink()
+    capsys.readouterr()
+
+    assert subgit.plan(None, output_format="json") == 0
+
+    plan_entry = json.loads(capsys.readouterr().out)[0]
+    assert plan_entry["action"] == "unchanged"
+    assert plan_entry["target_sha"] == Repo(workspace / "time").head.commit.hexsha
+    assert "from local tags" in plan_entry["message"]
+
+    # The tag cache in the repo is not written by plan
+    assert not tag_cache_path.exists()
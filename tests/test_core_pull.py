@@ -0,0 +1,559 @@
+# -*- coding: utf-8 -*-
+
+# python std lib
+import os
+import threading
+
+# subgit imports
+import subgit.core as subgit_core
+from subgit.core import iter_parallel, run_parallel
+from subgit.exceptions import SubGitConfigException, SubGitRepoException
+from tests.conftest import commit_to_remote, write_config
+
+# 3rd party imports
+import pytest
+from git import Remote, Repo
+
+
+def test_run_parallel_keeps_order():
+    def work(item):
+        if item == 3:
+            raise ValueError("bad item")
+
+        return item * 2
+
+    results = run_parallel(work, [1, 2, 3, 4], 2)
+
+    assert [item for item, _, _ in results] == [1, 2, 3, 4]
+    assert [result for _, result, _ in results] == [2, 4, None, 8]
+    assert isinstance(results[2][2], ValueError)
+
+    assert run_parallel(work, [], 4) == []
+
+
+def test_iter_parallel():
+    release = threading.Event()
+    taken = []
+
+    def items():
+        for item in range(100):
+            taken.append(item)
+            yield item
+
+    def work(item):
+        # Item 0 is blocked until item 1 has been yielded
+        if item == 0:
+            release.wait(5)
+
+        return item
+
+    results = iter_parallel(work, items(), 2, ordered=False)
+
+    first_item = next(results)[0]
+    assert first_item != 0
+
+    # Only a small window of items is taken from the input ahead of the caller
+    assert len(taken) <= 5
+
+    release.set()
+
+    assert sorted([first_item] + [item for item, _, _ in results]) == list(range(100))
+    assert [item for item, _, _ in iter_parallel(work, range(10), 3)] == list(range(10))
+
+
+def test_get_worker_count(subgit, mocker):
+    mocker.patch("os.cpu_count", return_value=1)
+    assert subgit._get_worker_count({}) == 8
+    assert subgit._get_worker_count({}, repo_count=3) == 3
+
+    mocker.patch("os.cpu_count", return_value=16)
+    assert subgit._get_worker_count({}) == 32
+    assert subgit._get_worker_count({"jobs": 3}, repo_count=100) == 3
+
+    assert subgit._get_worker_count({"jobs": 3}) == 3
+    assert subgit._get_worker_count({"jobs": 3}, "5") == 5
+
+    with pytest.raises(SubGitConfigException):
+        subgit._get_worker_count({}, "0")
+
+    with pytest.raises(SubGitConfigException):
+        subgit._get_worker_count({"jobs": "many"})
+
+
+def test_pull_parallel(subgit, workspace, remote_repo, mocker):
+    write_config(subgit, {
+        "jobs": 2,
+        "repos": [
+            {"name": "first", "url": remote_repo.as_uri(), "revision": {"branch": "master"}},
+            {"name": "second", "url": remote_repo.as_uri(), "revision": {"branch": "develop"}},
+            {"name": "third", "url": remote_repo.as_uri(), "revision": {"tag": "<2.0.0"}},
+        ],
+    })
+
+    subgit.answer_yes = True
+    assert subgit.pull(None) == 0
+
+    assert Repo(workspace / "first").active_branch.name == "master"
+    assert Repo(workspace / "second").active_branch.name == "develop"
+    assert Repo(workspace / "third").head.commit == Repo(remote_repo).tags["1.1.0"].commit
+
+    # A second pull moves the branch to the new commit in the remote
+    new_sha = commit_to_remote(remote_repo, "master", "new_file", "content")
+
+    assert subgit.pull(["first"], jobs=1) == 0
+    assert Repo(workspace / "first").head.commit.hexsha == new_sha
+
+    # Names given more than once is only pulled once
+    pull_repo = mocker.spy(subgit, "_pull_repo")
+
+    assert subgit.pull(["second", "first", "second"], skip_unchanged=False) == 0
+    assert sorted(call.args[0]["name"] for call in pull_repo.call_args_list) == ["first", "second"]
+
+
+def test_pull_dirty_repo_aborts_before_any_work(subgit, workspace, remote_repo):
+    write_config(subgit, {
+        "repos": [
+            {"name": "first", "url": remote_repo.as_uri(), "revision": {"branch": "master"}},
+        ],
+    })
+
+    assert subgit.pull(["first"]) == 0
+
+    with (workspace / "first" / "README.md").open("a") as stream:
+        stream.write("dirty")
+
+    commit_to_remote(remote_repo, "master", "new_file", "content")
+    sha_before = Repo(workspace / "first").head.commit.hexsha
+
+    assert subgit.pull(["first"]) == 1
+    assert Repo(workspace / "first").head.commit.hexsha == sha_before
+
+
+def test_pull_failed_repo_returns_error(subgit, workspace, remote_repo):
+    write_config(subgit, {
+        "repos": [
+            {"name": "good", "url": remote_repo.as_uri(), "revision": {"branch": "master"}},
+            {"name": "bad", "url": (workspace / "missing.git").as_uri(), "revision": {"branch": "master"}},
+        ],
+    })
+
+    assert subgit.pull(["good", "bad"]) == 1
+
+    # A failing repo do not stop the other repos from being pulled
+    assert os.path.exists(workspace / "good" / "README.md")
+
+
+def test_get_clone_options(subgit):
+    repo_data = {"name": "foo", "clone": {"depth": 10}}
+
+    assert subgit._get_clone_options({}, {"name": "foo"}) == {}
+    assert subgit._get_clone_options({"clone": {"depth": 1, "filter": "blob:none"}}, repo_data) == {
+        "depth": 10,
+        "filter": "blob:none",
+    }
+
+    # A repo can turn off a global option
+    assert subgit._get_clone_options(
+        {"clone": {"single_branch": True}},
+        {"name": "foo", "clone": {"single_branch": False}},
+    ) == {}
+
+    for bad_clone_config in ({"depth": 0}, {"depth": "1"}, {"single_branch": "yes"}, {"dissociate": 1}, {"filter": ""}, {"foo": 1}):
+        with pytest.raises(SubGitConfigException):
+            subgit._get_clone_options({"clone": bad_clone_config}, {"name": "foo"})
+
+
+def test_pull_shallow_single_branch_partial(subgit, workspace, remote_repo):
+    write_config(subgit, {
+        "clone": {
+            "depth": 1,
+            "single_branch": True,
+        },
+        "repos": [
+            {"name": "branch", "url": remote_repo.as_uri(), "revision": {"branch": "develop"}, "clone": {"filter": "blob:none"}},
+            {"name": "tag", "url": remote_repo.as_uri(), "revision": {"tag": "<2.0.0"}},
+        ],
+    })
+
+    assert subgit.pull(["branch", "tag"]) == 0
+
+    branch_repo = Repo(workspace / "branch")
+    assert branch_repo.git.rev_parse("--is-shallow-repository") == "true"
+    assert [ref.name for ref in branch_repo.remotes.origin.refs] == ["origin/develop"]
+    assert branch_repo.git.config("remote.origin.partialclonefilter") == "blob:none"
+    assert len(list(branch_repo.iter_commits())) == 1
+
+    tag_repo = Repo(workspace / "tag")
+    assert tag_repo.git.rev_parse("--is-shallow-repository") == "true"
+    assert tag_repo.head.commit == Repo(remote_repo).tags["1.1.0"].commit
+
+    # Changing branch on a single branch clone must still fetch the new branch
+    write_config(subgit, {
+        "clone": {
+            "depth": 1,
+            "single_branch": True,
+        },
+        "repos": [
+            {"name": "branch", "url": remote_repo.as_uri(), "revision": {"branch": "master"}},
+        ],
+    })
+
+    assert subgit.pull(["branch"]) == 0
+    assert branch_repo.active_branch.name == "master"
+    assert branch_repo.head.commit == Repo(remote_repo).heads.master.commit
+
+
+def test_pull_sparse(subgit, workspace, remote_repo):
+    def repo_config(sparse):
+        config = {"name": "sparse", "url": remote_repo.as_uri(), "revision": {"branch": "master"}}
+
+        if sparse:
+            config["sparse"] = sparse
+
+        write_config(subgit, {"repos": [config]})
+
+    def visible_items():
+        return sorted(item.name for item in (workspace / "sparse").iterdir() if item.name != ".git")
+
+    repo_config({"paths": ["src/"]})
+    assert subgit.pull(["sparse"]) == 0
+    assert visible_items() == ["src"]
+
+    repo = Repo(workspace / "sparse")
+    assert repo.git.sparse_checkout("list") == "src/"
+    assert repo.git.status("--porcelain") == ""
+
+    # Changing the paths updates the existing checkout
+    repo_config({"paths": ["docs/", "*.md"]})
+    assert subgit.pull(["sparse"]) == 0
+    assert visible_items() == ["README.md", "docs"]
+
+    # Cone mode only takes directories
+    repo_config({"paths": ["src"], "cone": True})
+    assert subgit.pull(["sparse"]) == 0
+    assert visible_items() == ["README.md", "src"]
+    assert repo.git.config("core.sparseCheckoutCone") == "true"
+
+    # Removing the sparse block restores the full checkout
+    repo_config(None)
+    assert subgit.pull(["sparse"]) == 0
+    assert visible_items() == ["README.md", "docs", "src"]
+
+
+def test_pull_sparse_tag(subgit, workspace, remote_repo):
+    write_config(subgit, {
+        "repos": [
+            {"name": "sparse", "url": remote_repo.as_uri(), "revision": {"tag": "<2.0.0"}, "sparse": {"paths": ["src/"]}},
+        ],
+    })
+
+    assert subgit.pull(["sparse"]) == 0
+
+    repo = Repo(workspace / "sparse")
+    assert repo.head.commit == Repo(remote_repo).tags["1.1.0"].commit
+    assert sorted(item.name for item in (workspace / "sparse").iterdir()) == [".git", "src"]
+    assert (workspace / "sparse" / "src" / "main.py").read_text() == "1.1.0"
+
+
+def test_pull_tag_order_time(subgit, workspace, remote_repo):
+    remote = Repo(remote_repo)
+
+    # Annotated tags created out of version order, 0.8.1 is the newest tag in the repo
+    for tag_name, tag_date, commit in (("0.8.0", "2020-01-01T00:00:00", "1.0.0"), ("0.8.1", "2030-01-01T00:00:00", "1.1.0")):
+        remote.git.tag("-a", tag_name, "-m", tag_name, commit, env={"GIT_COMMITTER_DATE": tag_date})
+
+    write_config(subgit, {
+        "repos": [
+            {"name": "time", "url": remote_repo.as_uri(), "revision": {"tag": {"order": "time", "select": "last"}}},
+        ],
+    })
+
+    assert subgit.pull(["time"]) == 0
+    assert Repo(workspace / "time").head.commit == remote.tags["1.1.0"].commit
+
+    tag_names, timestamps = subgit._get_local_tags(Repo(workspace / "time"))
+    assert tag_names[0] == "0.8.0"
+    assert tag_names[-1] == "0.8.1"
+    assert timestamps["0.8.1"] == 1893456000
+
+    # The remote can't order tags by time, so the repo is always pulled and locked from the local clone
+    assert subgit._get_unchanged_sha({"name": "time", "revision": {"tag": {"order": "time", "select": "last"}}}) is None
+    assert subgit.lock(["time"]) == 0
+    assert subgit._get_lock_file()["repos"][0]["ref"] == "refs/tags/0.8.1"
+    assert subgit._get_lock_file()["repos"][0]["sha"] == remote.tags["1.1.0"].commit.hexsha
+
+
+def test_pull_remote_tags(subgit, workspace, remote_repo, mocker):
+    remote = Repo(remote_repo)
+
+    write_config(subgit, {
+        "repos": [
+            {"name": "tag", "url": remote_repo.as_uri(), "revision": {"tag": "<2.0.0"}},
+            # Another form of the url, so the repos do not share an object database and tags
+            {"name": "sparse", "url": str(remote_repo), "revision": {"tag": {"filter": "v(.*)", "select": "last"}}, "sparse": {"paths": ["src/"]}},
+        ],
+    })
+
+    pull_repo = mocker.spy(subgit, "_pull_repo")
+
+    assert subgit.pull(["tag", "sparse"], remote_tags=True) == 0
+    assert pull_repo.call_count == 0
+
+    repo = Repo(workspace / "tag")
+    assert repo.head.is_detached
+    assert repo.head.commit == remote.tags["1.1.0"].commit
+    assert repo.git.rev_parse("--is-shallow-repository") == "true"
+    assert [tag.name for tag in repo.tags] == ["1.1.0"]
+
+    sparse_repo = Repo(workspace / "sparse")
+    assert sparse_repo.head.commit == remote.tags["v2.0.0"].commit
+    assert sorted(item.name for item in (workspace / "sparse").iterdir()) == [".git", "src"]
+
+    # A new tag in the remote moves the repo to that tag with a shallow fetch
+    new_sha = commit_to_remote(remote_repo, "master", "new_file", "content")
+    remote.create_tag("1.2.0", ref=new_sha)
+
+    assert subgit.pull(["tag"], remote_tags=True) == 0
+    assert repo.head.commit.hexsha == new_sha
+    assert repo.git.rev_parse("--is-shallow-repository") == "true"
+
+
+def test_pull_tag_cache(subgit, workspace, remote_repo, mocker):
+    remote = Repo(remote_repo)
+
+    write_config(subgit, {
+        "repos": [
+            {"name": "tag", "url": remote_repo.as_uri(), "revision": {"tag": "<2.0.0"}},
+        ],
+    })
+
+    assert subgit.pull(["tag"]) == 0
+
+    get_local_tags = mocker.spy(subgit, "_get_local_tags")
+
+    # Nothing has changed so the tag is taken from the cache
+    assert subgit.pull(["tag"], skip_unchanged=False) == 0
+    assert get_local_tags.call_count == 0
+
+    assert subgit.pull(["tag"], skip_unchanged=False, use_cache=False) == 0
+    assert get_local_tags.call_count == 1
+
+    # A new tag in the remote changes the ref state of the repo
+    new_sha = commit_to_remote(remote_repo, "master", "new_file", "content")
+    remote.create_tag("1.2.0", ref=new_sha)
+
+    assert subgit.pull(["tag"]) == 0
+    assert get_local_tags.call_count == 2
+    assert Repo(workspace / "tag").head.commit.hexsha == new_sha
+
+
+def test_pull_skips_unchanged_repos(subgit, workspace, remote_repo, mocker):
+    write_config(subgit, {
+        "repos": [
+            {"name": "branch", "url": remote_repo.as_uri(), "revision": {"branch": "master"}},
+            {"name": "tag", "url": remote_repo.as_uri(), "revision": {"tag": "<2.0.0"}},
+        ],
+    })
+
+    assert subgit.pull(["branch", "tag"]) == 0
+
+    pull_repo = mocker.spy(subgit, "_pull_repo")
+
+    assert subgit._get_unchanged_sha({"name": "missing", "revision": {"branch": "master"}}) is None
+    assert subgit.pull(["branch", "tag"]) == 0
+    assert pull_repo.call_count == 0
+
+    # Only the repo where the remote has moved is pulled
+    new_sha = commit_to_remote(remote_repo, "master", "new_file", "content")
+
+    assert subgit.pull(["branch", "tag"]) == 0
+    assert [call.args[0]["name"] for call in pull_repo.call_args_list] == ["branch"]
+    assert Repo(workspace / "branch").head.commit.hexsha == new_sha
+
+    # A repo on another branch than the configured one is never skipped
+    Repo(workspace / "branch").git.checkout("-b", "other")
+
+    assert subgit.pull(["branch", "tag"]) == 0
+    assert pull_repo.call_count == 2
+    assert Repo(workspace / "branch").active_branch.name == "master"
+
+    # Skipping can be turned off
+    assert subgit.pull(["branch", "tag"], skip_unchanged=False) == 0
+    assert pull_repo.call_count == 4
+
+
+def test_pull_branch_single_fetch(subgit, workspace, remote_repo, mocker):
+    write_config(subgit, {
+        "repos": [
+            {"name": "branch", "url": remote_repo.as_uri(), "revision": {"branch": "master"}},
+        ],
+    })
+
+    assert subgit.pull(["branch"]) == 0
+
+    repo = Repo(workspace / "branch")
+    repo.git.checkout("develop")
+
+    new_sha = commit_to_remote(remote_repo, "master", "new_file", "content")
+
+    remote_pull = mocker.spy(Remote, "pull")
+    remote_fetch = mocker.spy(Remote, "fetch")
+
+    # The configured branch is updated even if HEAD is on another branch
+    assert subgit.pull(["branch"]) == 0
+    assert remote_pull.call_count == 0
+    assert remote_fetch.call_count == 1
+    assert repo.active_branch.name == "master"
+    assert repo.head.commit.hexsha == new_sha
+    assert repo.heads.master.tracking_branch().name == "origin/master"
+
+    # A local branch with commits that is not in origin is never moved, both when it is only ahead
+    # and when it has diverged from origin
+    (workspace / "branch" / "local_file").write_text("local")
+    repo.index.add(["local_file"])
+    local_sha = repo.index.commit("Local commit").hexsha
+
+    assert subgit.pull(["branch"]) == 1
+    assert repo.head.commit.hexsha == local_sha
+
+    commit_to_remote(remote_repo, "master", "other_file", "content")
+
+    assert subgit.pull(["branch"]) == 1
+    assert repo.head.commit.hexsha == local_sha
+    assert (workspace / "branch" / "local_file").exists()
+
+
+def test_pull_missing_branch(subgit, workspace, remote_repo):
+    write_config(subgit, {
+        "repos": [
+            {"name": "branch", "url": remote_repo.as_uri(), "revision": {"branch": "master"}},
+        ],
+    })
+
+    assert subgit.pull(["branch"]) == 0
+
+    write_config(subgit, {
+        "repos": [
+            {"name": "branch", "url": remote_repo.as_uri(), "revision": {"branch": "missing"}},
+        ],
+    })
+
+    assert subgit.pull(["branch"]) == 1
+
+
+def test_get_fetch_args(subgit):
+    assert subgit._get_fetch_args({"branch": "main"}, {}) == (
+        ["+refs/heads/main:refs/remotes/origin/main"],
+        {"no_tags": True},
+    )
+    assert subgit._get_fetch_args({"tag": "last"}, {"depth": 1}) == (
+        ["+refs/tags/*:refs/tags/*"],
+        {"depth": 1},
+    )
+    assert subgit._get_fetch_args({"commit": "abc"}, {}) == (None, {})
+    assert subgit._get_fetch_args({"branch": "main"}, {}, all_refs=True)[0] == [
+        "+refs/heads/*:refs/remotes/origin/*",
+        "+refs/tags/*:refs/tags/*",
+    ]
+
+
+def test_fetch_narrow_refs(subgit, workspace, remote_repo):
+    write_config(subgit, {
+        "repos": [
+            {"name": "branch", "url": remote_repo.as_uri(), "revision": {"branch": "master"}},
+        ],
+    })
+
+    assert subgit.pull(["branch"]) == 0
+
+    Repo(remote_repo).create_head("feature", "master")
+    Repo(remote_repo).create_tag("3.0.0", "master")
+    new_sha = commit_to_remote(remote_repo, "master", "new_file", "content")
+
+    repo = Repo(workspace / "branch")
+
+    assert subgit.fetch(["branch"]) == 0
+    assert repo.remotes.origin.refs.master.commit.hexsha == new_sha
+    assert "origin/feature" not in [ref.name for ref in repo.remotes.origin.refs]
+    assert "3.0.0" not in repo.tags
+
+    assert subgit.fetch(["branch", "missing"], all_refs=True) == 0
+    assert "origin/feature" in [ref.name for ref in repo.remotes.origin.refs]
+    assert "3.0.0" in repo.tags
+
+    assert subgit.fetch(["missing"]) == 1
+
+
+def test_fetch_failures_and_timeout(subgit, workspace, remote_repo):
+    # Each repo uses another form of the url so they do not share an object database and remote config
+    write_config(subgit, {
+        "repos": [
+            {"name": "good", "url": remote_repo.as_uri(), "revision": {"branch": "master"}},
+            {"name": "broken", "url": str(remote_repo), "revision": {"branch": "master"}},
+            {"name": "slow", "url": f"{remote_repo}/", "revision": {"branch": "master"}},
+        ],
+    })
+
+    assert subgit.pull(["good", "broken", "slow"]) == 0
+
+    Repo(workspace / "broken").remotes.origin.set_url((workspace / "missing.git").as_uri())
+
+    # A remote that never answers
+    Repo(workspace / "slow").git.config("remote.origin.url", "ext::sleep 2")
+    Repo(workspace / "slow").git.config("protocol.ext.allow", "always")
+
+    new_sha = commit_to_remote(remote_repo, "master", "new_file", "content")
+
+    # One failed repo do not stop the others from being fetched
+    assert subgit.fetch(None, jobs=3, timeout="0.5") == 1
+    assert Repo(workspace / "good").remotes.origin.refs.master.commit.hexsha == new_sha
+
+    with pytest.raises(SubGitRepoException, match="timed out"):
+        subgit.fetch_repo({"name": "slow", "revision": {"branch": "master"}}, timeout=0.5)
+
+    for bad_timeout in ("soon", "0", -1):
+        with pytest.raises(SubGitConfigException):
+            subgit._get_timeout({}, bad_timeout)
+
+    assert subgit._get_timeout({"timeout": 30}) == 30
+    assert subgit._get_timeout({"timeout": 30}, "5") == 5
+    assert subgit._get_timeout({}) is None
+
+
+def test_pull_host_jobs_and_ssh_multiplex(subgit, workspace, remote_repo, mocker):
+    write_config(subgit, {
+        "host_jobs": 1,
+        "ssh_multiplex": True,
+        "repos": [
+            {"name": "first", "url": remote_repo.as_uri(), "revision": {"branch": "master"}},
+            {"name": "second", "url": remote_repo.as_uri(), "revision": {"branch": "develop"}},
+        ],
+    })
+
+    ssh_multiplexing = mocker.spy(subgit_core, "ssh_multiplexing")
+
+    # The unchanged check, the fetch into the shared object database and the pull shares one session
+    assert subgit.pull(["first", "second"]) == 0
+    assert ssh_multiplexing.call_count == 1
+    assert "GIT_SSH_COMMAND" not in os.environ
+
+    assert subgit.pull(["first", "second"], skip_unchanged=False) == 0
+    assert ssh_multiplexing.call_count == 2
+
+    def get_host(repo_data):
+        return subgit_core.get_url_host(repo_data["url"])
+
+    results = subgit._run_remote_parallel({"host_jobs": 1}, get_host, [
+        {"name": "a", "url": "git@a.example.com:a.git"},
+        {"name": "b", "url": "git@b.example.com:b.git"},
+        {"name": "c", "url": "git@a.example.com:c.git"},
+    ], 3)
+
+    assert [result for _, result, _ in results] == ["a.example.com", "b.example.com", "a.example.com"]
+
+    for bad_config in ({"host_jobs": 0}, {"host_jobs": "2"}):
+        with pytest.raises(SubGitConfigException):
+            subgit._run_remote_parallel(bad_config, get_host, [], 1)
+
+    with pytest.raises(SubGitConfigException):
+        subgit._ssh_multiplexing({"ssh_multiplex": "yes"})
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+# python std lib
+from pathlib import Path
+
+# subgit imports
+from tests.conftest import commit_to_remote, write_config
+
+# 3rd party imports
+from git import Remote, Repo
+
+
+def test_pull_shares_object_database(subgit, workspace, remote_repo, mocker):
+    remote = Repo(remote_repo)
+
+    write_config(subgit, {
+        "repos": [
+            {"name": "main", "url": remote_repo.as_uri(), "revision": {"branch": "master"}},
+            {"name": "dev", "url": remote_repo.as_uri(), "revision": {"branch": "develop"}},
+            {"name": "release", "url": remote_repo.as_uri(), "revision": {"tag": "<2.0.0"}, "sparse": {"paths": ["src/"]}},
+        ],
+    })
+
+    store_path = subgit._get_shared_store_path(remote_repo.as_uri())
+    fetch = mocker.spy(Remote, "fetch")
+
+    assert subgit.pull(["main", "dev", "release"]) == 0
+
+    # One fetch into the shared object database serves all repos
+    assert fetch.call_count == 1
+    assert store_path.parent == workspace / ".subgit" / "repos"
+
+    for name in ("main", "dev", "release"):
+        assert (workspace / name / ".git").is_file()
+        assert Path(Repo(workspace / name).common_dir).resolve() == store_path.resolve()
+
+    assert Repo(workspace / "main").head.commit == remote.heads.master.commit
+    assert Repo(workspace / "dev").head.commit == remote.heads.develop.commit
+    assert Repo(workspace / "release").head.commit == remote.tags["1.1.0"].commit
+    assert sorted(item.name for item in (workspace / "release").iterdir()) == [".git", "src"]
+
+    # A new commit is fetched once and checked out in the repo that tracks the branch
+    new_sha = commit_to_remote(remote_repo, "master", "new_file", "content")
+    fetch.reset_mock()
+
+    assert subgit.pull(["main", "dev", "release"]) == 0
+    assert fetch.call_count == 1
+    assert Repo(workspace / "main").head.commit.hexsha == new_sha
+    assert Repo(workspace / "dev").head.commit == remote.heads.develop.commit
+
+    for repo_status in subgit.iter_repo_status():
+        assert repo_status["cloned"]
+        assert repo_status["last_fetch"] is not None
+        assert not repo_status["dirty"]
+
+
+def test_pull_locked_worktree(subgit, workspace, remote_repo):
+    write_config(subgit, {
+        "repos": [
+            {"name": "main", "url": remote_repo.as_uri(), "revision": {"branch": "master"}},
+            {"name": "dev", "url": remote_repo.as_uri(), "revision": {"branch": "develop"}},
+        ],
+    })
+
+    assert subgit.lock() == 0
+    assert subgit.pull(["main", "dev"], locked=True) == 0
+
+    store_path = subgit._get_shared_store_path(remote_repo.as_uri())
+
+    for name, branch in (("main", "master"), ("dev", "develop")):
+        repo = Repo(workspace / name)
+        assert Path(repo.common_dir).resolve() == store_path.resolve()
+        assert repo.active_branch.name == branch
+        assert not repo.is_dirty(untracked_files=True)
+
+
+def test_delete_removes_shared_object_database_with_last_worktree(subgit, workspace, remote_repo):
+    write_config(subgit, {
+        "repos": [
+            {"name": "main", "url": remote_repo.as_uri(), "revision": {"branch": "master"}},
+            {"name": "dev", "url": remote_repo.as_uri(), "revision": {"branch": "develop"}},
+        ],
+    })
+
+    assert subgit.pull(["main", "dev"]) == 0
+
+    store_path = subgit._get_shared_store_path(remote_repo.as_uri())
+    subgit.answer_yes = True
+
+    subgit.delete(["main"], wait=True)
+    assert not (workspace / "main").exists()
+    assert store_path.exists()
+    assert [path.name for path in (store_path / "worktrees").iterdir()] == ["dev"]
+
+    subgit.delete(["dev"], wait=True)
+    assert not (workspace / "dev").exists()
+    assert not store_path.exists()
+
+
+def test_shared_object_database_with_sparse_worktree(subgit, workspace, remote_repo):
+    remote = Repo(remote_repo)
+
+    write_config(subgit, {
+        "repos": [
+            {"name": "main", "url": remote_repo.as_uri(), "revision": {"branch": "master"}},
+            {"name": "sparse", "url": remote_repo.as_uri(), "revision": {"tag": "<2.0.0"}, "sparse": {"paths": ["src/"]}},
+        ],
+    })
+
+    assert subgit.pull(["main", "sparse"]) == 0
+
+    # Sparse checkout moves core.bare out of the config of the shared object database
+    store_path = subgit._get_shared_store_path(remote_repo.as_uri())
+    assert Repo(workspace / "sparse").git.config("--get", "extensions.worktreeConfig") == "true"
+    assert subgit._open_shared_store(store_path).git.rev_parse("--is-bare-repository") == "true"
+
+    subgit.answer_yes = True
+    subgit.delete(["main"], wait=True)
+    assert not (workspace / "main").exists()
+    assert [path.name for path in (store_path / "worktrees").iterdir()] == ["sparse"]
+
+    assert subgit.pull(["main", "sparse"]) == 0
+    assert Repo(workspace / "main").head.commit == remote.heads.master.commit
+    assert sorted(item.name for item in (workspace / "sparse").iterdir()) == [".git", "src"]
+
+    subgit.delete(["main"], wait=True)
+    assert subgit.pull(["main"], remote_tags=True) == 0
+
+    subgit.delete(["main"], wait=True)
+    assert subgit.lock() == 0
+    assert subgit.pull(["main", "sparse"], locked=True) == 0
+    assert Repo(workspace / "main").active_branch.name == "master"
+
+
+def test_pull_worktrees_on_same_branch(subgit, workspace, remote_repo):
+    write_config(subgit, {
+        "repos": [
+            {"name": "a", "url": remote_repo.as_uri(), "revision": {"branch": "master"}},
+            {"name": "b", "url": remote_repo.as_uri(), "revision": {"branch": "master"}},
+        ],
+    })
+
+    assert subgit.pull(["a", "b"]) == 0
+
+    # Only one worktree can have the branch checked out, the other follows it with a detached HEAD
+    repos = [Repo(workspace / "a"), Repo(workspace / "b")]
+    assert sorted(repo.head.is_detached for repo in repos) == [False, True]
+
+    new_sha = commit_to_remote(remote_repo, "master", "src/new.py", "content")
+
+    assert subgit.pull(["a", "b"]) == 0
+
+    for repo in repos:
+        assert repo.head.commit.hexsha == new_sha
+        assert not repo.is_dirty(untracked_files=True)
+        assert (Path(repo.working_dir) / "src" / "new.py").exists()
+
+    assert subgit.pull(["a", "b"], skip_unchanged=False) == 0
+    assert subgit.plan(["a", "b"]) == 0
+
+    # Local commits on the detached HEAD is never dropped
+    detached_repo = next(repo for repo in repos if repo.head.is_detached)
+    (Path(detached_repo.working_dir) / "local_file").write_text("local")
+    detached_repo.index.add(["local_file"])
+    local_sha = detached_repo.index.commit("Local commit").hexsha
+
+    assert subgit.pull(["a", "b"], skip_unchanged=False) == 1
+    assert detached_repo.head.commit.hexsha == local_sha
+
+    subgit.answer_yes = True
+    subgit.delete(["a", "b"], wait=True)
+    assert (workspace / "a").exists()
+    assert (workspace / "b").exists()
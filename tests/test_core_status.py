@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+# python std lib
+import json
+
+# subgit imports
+from tests.conftest import commit_to_remote, write_config
+
+# 3rd party imports
+from git import Repo
+
+
+def test_repo_status(subgit, workspace, remote_repo, capsys, mocker):
+    remote = Repo(remote_repo)
+
+    write_config(subgit, {
+        "repos": [
+            {"name": "branch", "url": remote_repo.as_uri(), "revision": {"branch": "master"}},
+            {"name": "tag", "url": remote_repo.as_uri(), "revision": {"tag": {"select": {"value": "1.1.0", "method": "exact"}}}},
+            {"name": "commit", "url": remote_repo.as_uri(), "revision": {"commit": remote.tags["1.0.0"].commit.hexsha[:8]}},
+            {"name": "missing", "url": remote_repo.as_uri(), "revision": {"branch": "master"}},
+        ],
+    })
+
+    assert subgit.pull(["branch", "tag", "commit"]) == 0
+
+    Repo(workspace / "commit").git.checkout(remote.tags["1.0.0"].commit.hexsha)
+
+    commit_to_remote(remote_repo, "master", "new_file", "content")
+    Repo(workspace / "branch").remotes.origin.fetch()
+    (workspace / "branch" / "README.md").write_text("changed")
+    capsys.readouterr()
+
+    repo_status = mocker.spy(subgit, "_get_repo_status")
+
+    assert subgit.repo_status(jobs=2) == 0
+    assert repo_status.call_count == 4
+
+    output = capsys.readouterr().out
+    blocks = output.strip().split("\n\n")
+
+    # Printed in config order no matter the order the repos was read in
+    assert [block.splitlines()[0] for block in blocks] == ["branch", "tag", "commit", "missing"]
+
+    assert "Repo is dirty? Yes" in blocks[0]
+    assert "branch exists in origin? True" in blocks[0]
+    assert "has newer commit in origin? True" in blocks[0]
+    assert "commits ahead/behind origin: 0/1" in blocks[0]
+    assert "Last pull/fetch: Repo has not" not in blocks[0]
+
+    assert "Repo is dirty? No" in blocks[1]
+    assert f"commit hash: {remote.tags['1.1.0'].commit.hexsha}" in blocks[1]
+    assert "commit message: 'Release 1.1.0'" in blocks[1]
+
+    assert "HEAD at commit? Yes" in blocks[2]
+
+    assert "Cloned: No" in blocks[3]
+
+
+def test_repo_status_jsonl(subgit, workspace, remote_repo, capsys):
+    remote = Repo(remote_repo)
+
+    write_config(subgit, {
+        "repos": [
+            {"name": "branch", "url": remote_repo.as_uri(), "revision": {"branch": "master"}},
+            {"name": "missing", "url": remote_repo.as_uri(), "revision": {"branch": "master"}},
+        ],
+    })
+
+    assert subgit.pull(["branch"]) == 0
+
+    pulled_sha = remote.heads.master.commit.hexsha
+    commit_to_remote(remote_repo, "master", "new_file", "content")
+    Repo(workspace / "branch").remotes.origin.fetch()
+    capsys.readouterr()
+
+    assert subgit.repo_status(output_format="jsonl") == 0
+
+    lines = capsys.readouterr().out.splitlines()
+    repo_status = {
+        status["name"]: status
+        for status in map(json.loads, lines)
+    }
+
+    assert len(lines) == 2
+    assert repo_status["branch"]["cloned"] is True
+    assert repo_status["branch"]["dirty"] is False
+    assert repo_status["branch"]["head"] == pulled_sha
+    assert repo_status["branch"]["head_branch"] == "master"
+    assert repo_status["branch"]["upstream"] == "origin/master"
+    assert repo_status["branch"]["ahead"] == 0
+    assert repo_status["branch"]["behind"] == 1
+    assert repo_status["branch"]["last_fetch"] is not None
+    assert repo_status["branch"]["refs"]["refs/heads/master"]["sha"] == pulled_sha
+    assert repo_status["branch"]["error"] is None
+    assert repo_status["missing"]["cloned"] is False
+
+
+def test_repo_status_ahead_behind(subgit, workspace, remote_repo):
+    write_config(subgit, {
+        "repos": [
+            {"name": "develop", "url": remote_repo.as_uri(), "revision": {"branch": "develop"}},
+        ],
+    })
+
+    assert subgit.pull(["develop"]) == 0
+
+    repo_status = subgit._get_repo_status({"name": "develop", "revision": {"branch": "develop"}})
+    assert (repo_status["branch_ahead"], repo_status["branch_behind"]) == (0, 0)
+
+    # Counted against origin/develop even when another branch is checked out
+    repo = Repo(workspace / "develop")
+    (workspace / "develop" / "local_file").write_text("local")
+    repo.index.add(["local_file"])
+    repo.index.commit("Local work")
+    repo.git.checkout("master")
+
+    commit_to_remote(remote_repo, "develop", "new_file", "content")
+    commit_to_remote(remote_repo, "develop", "new_file", "more content")
+    repo.remotes.origin.fetch()
+
+    repo_status = subgit._get_repo_status({"name": "develop", "revision": {"branch": "develop"}})
+    assert (repo_status["branch_ahead"], repo_status["branch_behind"]) == (1, 2)
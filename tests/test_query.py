@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+# python std lib
+import random
+
+# subgit imports
+from subgit.enums import *
+from subgit.exceptions import *
+from subgit.query import TagCache, TagQuery, apply_filters, compile_filters, parse_version
+
+# 3rd party imports
+import pytest
+
+
+def test_parse_version():
+    assert str(parse_version("v1.0.0")) == "1.0.0"
+    assert parse_version("foo") is None
+
+    # Same value is only parsed once
+    assert parse_version("1.2.3") is parse_version("1.2.3")
+
+
+def test_compile_and_apply_filters():
+    assert compile_filters([]) == []
+
+    for bad_regex_list in (None, "v(.*)", [1], [""], ["("]):
+        with pytest.raises(SubGitConfigException):
+            compile_filters(bad_regex_list)
+
+    compiled_filters = compile_filters([r"v([0-9].[0-9].[0-9])", r"[0-9].[0-9]"])
+
+    assert apply_filters(compiled_filters, "v1.0.0") == "1.0.0"
+    assert apply_filters(compiled_filters, "1.0") == "1.0"
+    assert apply_filters(compiled_filters, "foo") is None
+
+
+def test_tag_query_semver():
+    tags = ["v1.0.0", "v1.1.0", "v2.0.0rc1", "v2.0.0", "v0.9.0", "foo", "latest"]
+    random.shuffle(tags)
+
+    def select(select_config, filter_config=None):
+        query = TagQuery(filter_config or [], OrderAlgorithms.SEMVER, select_config, SelectionMethods.SEMVER)
+        return query.select(tags)
+
+    # Tags that is not valid versions is skipped instead of failing
+    assert select("last") == "v2.0.0"
+    assert select("first") == "v0.9.0"
+    assert select("<2.0.0") == "v1.1.0"
+    assert select(">=3.0.0") is None
+
+    # Pre releases is only selected if asked for
+    assert select("<2.0.0rc2") == "v2.0.0rc1"
+
+    assert select("<2.0.0", [r"v(1\..*)"]) == "v1.1.0"
+    assert select("last", [r"v(0\..*)"]) == "v0.9.0"
+
+    assert TagQuery([], OrderAlgorithms.SEMVER, "last", SelectionMethods.SEMVER).select([]) is None
+
+
+def test_tag_query_alphabetical_and_exact():
+    tags = ["b", "c", "a"]
+
+    assert TagQuery([], OrderAlgorithms.ALPHABETICAL, "last", SelectionMethods.SEMVER).select(tags) == "c"
+    assert TagQuery([], OrderAlgorithms.ALPHABETICAL, "first", SelectionMethods.SEMVER).select(tags) == "a"
+    assert TagQuery([], OrderAlgorithms.ALPHABETICAL, "b", SelectionMethods.EXACT).select(tags) == "b"
+    assert TagQuery([], OrderAlgorithms.ALPHABETICAL, "d", SelectionMethods.EXACT).select(tags) is None
+
+    # Invalid semver select query falls back to exact matching
+    assert TagQuery([], OrderAlgorithms.SEMVER, "b", SelectionMethods.SEMVER).select(tags) == "b"
+
+
+def test_tag_query_time():
+    tags = ["1.0.0", "0.8.1", "0.8.0", "foo"]
+    timestamps = {"1.0.0": 1609459200, "0.8.1": 1669852800, "0.8.0": 1577836800}
+
+    def select(select_config, filter_config=None):
+        query = TagQuery(filter_config or [], OrderAlgorithms.TIME, select_config, SelectionMethods.SEMVER)
+        return query.select(tags, timestamps)
+
+    assert select("last") == "0.8.1"
+    assert select("first") == "0.8.0"
+    assert select("<1.0.0", [r"([0-9]\.[0-9]\.[0-9])"]) == "0.8.1"
+
+    with pytest.raises(SubGitConfigException):
+        TagQuery([], OrderAlgorithms.TIME, "last", SelectionMethods.SEMVER).select(tags)
+
+
+def test_tag_query_matches_pipeline(subgit):
+    """
+    The query engine must select the same tag as running the _filter, _order and _select steps
+    """
+    tags = [f"{major}.{minor}.{patch}" for major in range(3) for minor in range(10) for patch in range(10)]
+    random.shuffle(tags)
+
+    for select_config in ("last", "first", ">=1.5.0", "<2.0.0", "~=1.3.0"):
+        order_output = subgit._order(subgit._filter(tags, [r"[0-9]\.[0-9]\.[0-9]"]), OrderAlgorithms.SEMVER)
+        expected = subgit._select(order_output, select_config, SelectionMethods.SEMVER)
+
+        query = TagQuery([r"[0-9]\.[0-9]\.[0-9]"], OrderAlgorithms.SEMVER, select_config, SelectionMethods.SEMVER)
+        assert query.select(tags) == expected
+
+
+def test_tag_query_bad_config():
+    with pytest.raises(SubGitConfigException):
+        TagQuery([], 123, "last", SelectionMethods.SEMVER)
+
+    with pytest.raises(SubGitConfigException):
+        TagQuery([], OrderAlgorithms.SEMVER, "last", 123)
+
+
+def test_tag_cache(tmp_path):
+    (tmp_path / "refs" / "tags").mkdir(parents=True)
+    (tmp_path / "packed-refs").write_text("abc refs/tags/1.0.0\n")
+
+    tag_cache = TagCache(tmp_path, size=2)
+    assert tag_cache.get_tags() is None
+    assert tag_cache.get_resolved("last") is None
+
+    tag_cache.set_tags(["1.0.0"], {"1.0.0": 1})
+    tag_cache.set_resolved("last", "1.0.0")
+    tag_cache.set_resolved({"select": "first"}, "1.0.0")
+    tag_cache.save()
+
+    tag_cache = TagCache(tmp_path, size=2)
+    assert tag_cache.get_tags() == (["1.0.0"], {"1.0.0": 1})
+    assert tag_cache.get_resolved("last") == "1.0.0"
+
+    # The least recently used config is evicted
+    tag_cache.set_resolved("<1.0.0", "0.9.0")
+    assert tag_cache.get_resolved({"select": "first"}) is None
+    assert tag_cache.get_resolved("last") == "1.0.0"
+    tag_cache.save()
+
+    # A new loose tag invalidates the whole cache
+    (tmp_path / "refs" / "tags" / "1.1.0").write_text("def\n")
+
+    tag_cache = TagCache(tmp_path, size=2)
+    assert tag_cache.get_tags() is None
+    assert tag_cache.get_resolved("last") is None
+
+    # A broken cache file is ignored
+    tag_cache.cache_file_path.write_text("{")
+    assert TagCache(tmp_path).get_tags() is None
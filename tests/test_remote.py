@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+# python std lib
+import os
+import threading
+import time
+
+# subgit imports
+from subgit.core import run_parallel
+from subgit.remote import HostLimiter, get_url_host, interleave_by_host, ssh_multiplexing
+
+
+def test_get_url_host():
+    assert get_url_host("git@github.com:Grokzen/pykwalify.git") == "github.com"
+    assert get_url_host("GitHub.com:Grokzen/pykwalify.git") == "github.com"
+    assert get_url_host("ssh://git@gitlab.example.com:2222/group/repo.git") == "gitlab.example.com"
+    assert get_url_host("https://user@github.com/dynamist/subgit.git") == "github.com"
+    assert get_url_host("file:///tmp/remote.git") == ""
+    assert get_url_host("/tmp/remote.git") == ""
+    assert get_url_host("./repos/foo:bar") == ""
+    assert get_url_host(None) == ""
+
+
+def test_interleave_by_host():
+    items = ["a1", "a2", "a3", "b1", "c1", "c2"]
+
+    assert interleave_by_host(items, lambda item: item[0]) == ["a1", "b1", "c1", "a2", "c2", "a3"]
+    assert interleave_by_host([], lambda item: item[0]) == []
+
+
+def test_host_limiter():
+    host_limiter = HostLimiter(2)
+    running = {"a": 0, "b": 0, "": 0}
+    max_running = {"a": 0, "b": 0, "": 0}
+    lock = threading.Lock()
+
+    def work(host):
+        with host_limiter.limit(host):
+            with lock:
+                running[host] += 1
+                max_running[host] = max(max_running[host], running[host])
+
+            time.sleep(0.05)
+
+            with lock:
+                running[host] -= 1
+
+    run_parallel(work, ["a"] * 6 + ["b"] * 6 + [""] * 6, 18)
+
+    assert max_running["a"] == 2
+    assert max_running["b"] == 2
+
+    # Local repos is never limited
+    assert max_running[""] > 2
+
+
+def test_ssh_multiplexing(monkeypatch):
+    monkeypatch.setenv("GIT_SSH_COMMAND", "ssh -i key")
+
+    with ssh_multiplexing() as socket_dir:
+        assert socket_dir.is_dir()
+        assert os.environ["GIT_SSH_COMMAND"].startswith("ssh -i key -o ControlMaster=auto")
+        assert f"ControlPath={socket_dir}/%C" in os.environ["GIT_SSH_COMMAND"]
+
+    assert os.environ["GIT_SSH_COMMAND"] == "ssh -i key"
+    assert not socket_dir.exists()
+
+    monkeypatch.delenv("GIT_SSH_COMMAND")
+
+    with ssh_multiplexing():
+        assert "GIT_SSH_COMMAND" in os.environ
+
+    assert "GIT_SSH_COMMAND" not in os.environ